@@ -1,12 +1,33 @@
 # --- 1. Import Libraries ---
 import logging
+import math
 import time
 import asyncio
+import itertools
 import aiohttp
 import os
-from typing import List
-from fastapi import APIRouter, Request, BackgroundTasks, status, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, PlainTextResponse
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, status, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from app.core.config import (
+    ECHO_RATE_LIMIT_ALGORITHM, HTTP_CLIENT_DNS_TTL_SECONDS, HTTP_CLIENT_KEEPALIVE_SECONDS, HTTP_CLIENT_MAX_CONNECTIONS,
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST, HTTP_CLIENT_TIMEOUT_SECONDS, LOG_CONSOLE_LEVEL, LOG_FILE_BACKUP_COUNT, LOG_FILE_LEVEL, LOG_FILE_MAX_BYTES, LOG_QUEUE_MAX_SIZE, LOG_WS_BATCH_INTERVAL_MS,
+    LOG_WS_LEVEL, LOG_WS_MAX_PENDING, LOG_WS_SAMPLE_RATE, METRICS_INTERVAL_MS, SIMULATION_CALLER_CONCURRENCY, THROTTLE_CONCURRENCY, THROTTLE_DEAD_LETTER_MAX, THROTTLE_DURABLE_QUEUE_COMMIT_WINDOW_MS, THROTTLE_DURABLE_QUEUE_MAX_SIZE,
+    THROTTLE_DURABLE_QUEUE_PATH, THROTTLE_MAX_RETRIES, THROTTLE_QUEUE_BACKEND, THROTTLE_QUEUE_MAX_SIZE,
+    THROTTLE_QUEUE_OVERFLOW, THROTTLE_QUEUE_SPILL_PATH, THROTTLE_RETRY_BASE_SECONDS, THROTTLE_RETRY_MAX_SECONDS,
+    THROTTLE_RETRY_RATE_PER_MINUTE, WS_CLIENT_OVERFLOW, WS_CLIENT_QUEUE_MAX, WS_MAX_FRAME_BYTES, WS_SEND_TIMEOUT_SECONDS,
+)
+from app.core.broadcast import ConnectionManager
+from app.core.durable_queue import create_request_queue
+from app.core.http_client import BoundedSpawner, HttpClient
+from app.core.log_pipeline import BatchingHandler, LogPipeline
+from app.core.log_reader import complete_end, iter_range, line_filter, tail_lines
+from app.core.metrics import LatencyHistogram, MetricsPublisher
+from app.core.ratelimit import ALGORITHMS, LeakyBucketPacer, create_rate_limiter
+from app.core.retry import DelayQueue, backoff_delay, parse_retry_after
 
 # --- 2. FastAPI Router Setup ---
 # สร้าง Router สำหรับจัดกลุ่ม API ที่เกี่ยวกับการจำลอง
@@ -16,50 +37,10 @@ router = APIRouter(
 )
 
 # --- 3. WebSocket & Control Logic ---
-# คลาสสำหรับจัดการการเชื่อมต่อ WebSocket ทั้งหมด
-class ConnectionManager:
-    def __init__(self):
-        # เก็บรายการ WebSocket ที่เชื่อมต่ออยู่
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        # เมื่อมี client ใหม่เชื่อมต่อเข้ามา
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        # เมื่อ client ตัดการเชื่อมต่อ
-        self.active_connections.remove(websocket)
-
-    async def broadcast_json(self, data: dict):
-        # ส่งข้อมูล (JSON) ไปยังทุก client ที่เชื่อมต่ออยู่
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(data)
-            except Exception:
-                pass
-
-# สร้าง instance ของ ConnectionManager เพื่อใช้งาน
-manager = ConnectionManager()
-
-# คลาสสำหรับจัดการ Log ที่จะส่งข้อมูลผ่าน WebSocket
-class WebSocketLogHandler(logging.Handler):
-    def __init__(self, manager: ConnectionManager):
-        super().__init__()
-        self.manager = manager
-        self.formatter = None
-
-    # เมื่อมี Log เกิดขึ้น, ฟังก์ชันนี้จะถูกเรียก
-    def emit(self, record: logging.LogRecord):
-        if self.formatter:
-            # จัดรูปแบบ Log ให้อยู่ในรูป JSON
-            log_entry = {
-                "timestamp": self.formatter.formatTime(record, self.formatter.datefmt),
-                "level": record.levelname,
-                "message": record.getMessage()
-            }
-            # ส่ง Log ไปยัง client ผ่าน WebSocket
-            asyncio.create_task(self.manager.broadcast_json(log_entry))
+# จัดการการเชื่อมต่อ WebSocket ทั้งหมด: แต่ละ client มีคิวและ task ส่งข้อมูลของตัวเอง client ที่ช้าจึงไม่ถ่วงคนอื่น
+# manager = ช่อง log ดิบ (/ws/logs), metrics_manager = ช่องสรุป metrics (/ws/metrics)
+manager = ConnectionManager(WS_CLIENT_QUEUE_MAX, WS_CLIENT_OVERFLOW, WS_SEND_TIMEOUT_SECONDS, WS_MAX_FRAME_BYTES)
+metrics_manager = ConnectionManager(WS_CLIENT_QUEUE_MAX, WS_CLIENT_OVERFLOW, WS_SEND_TIMEOUT_SECONDS, WS_MAX_FRAME_BYTES)
 
 # สร้าง Event เพื่อเป็นสัญญาณให้ Task ต่างๆ หยุดทำงาน
 simulation_stop_event = asyncio.Event()
@@ -71,11 +52,32 @@ THROTTLE_LIMIT = 4096       # ลิมิตของ Throttle Service (ส่
 CALL_SCHEDULE = {1: 16, 2: 256, 3: 4096, 4: 65536}
 LOG_FILE = 'simulation.log' # ชื่อไฟล์สำหรับบันทึก Log
 
-request_queue = asyncio.Queue() # คิวสำหรับพัก request ที่เข้ามา
-# ตัวแปรสำหรับนับจำนวน request ของ Echo Service
-echo_request_counts = {'count': 0, 'window_start_time': time.time()}
+# คิวสำหรับพัก request ที่เข้ามา: ในหน่วยความจำ (จำกัดขนาด; เมื่อเต็มทำตาม THROTTLE_QUEUE_OVERFLOW)
+# หรือบนดิสก์ (THROTTLE_QUEUE_BACKEND=sqlite) ซึ่ง request ที่ตอบ 202 ไปแล้วจะไม่หายเมื่อ restart
+request_queue = create_request_queue(
+    THROTTLE_QUEUE_BACKEND, THROTTLE_QUEUE_MAX_SIZE, THROTTLE_QUEUE_OVERFLOW, THROTTLE_QUEUE_SPILL_PATH,
+    THROTTLE_DURABLE_QUEUE_PATH, THROTTLE_DURABLE_QUEUE_MAX_SIZE, THROTTLE_DURABLE_QUEUE_COMMIT_WINDOW_MS / 1000,
+)
+# request ที่รอส่งซ้ำ เรียงตามเวลาที่ครบกำหนด: (receipt ของคิว, data, ครั้งที่จะส่ง)
+retry_queue = DelayQueue()
+# ช่องเวลาของการส่งซ้ำ (ไม่เกิน THROTTLE_RETRY_RATE_PER_MINUTE)
+retry_pacer = LeakyBucketPacer(THROTTLE_RETRY_RATE_PER_MINUTE / 60)
+# request ที่ส่งซ้ำครบแล้วยังไม่สำเร็จ (เก็บล่าสุดไม่เกิน THROTTLE_DEAD_LETTER_MAX รายการ)
+dead_letters = deque(maxlen=THROTTLE_DEAD_LETTER_MAX)
+# Rate limiter ของ Echo Service (เลือก algorithm ได้: fixed_window, token_bucket, gcra, sliding_log, sliding_counter)
+ECHO_LIMITER_KEY = "echo"
+echo_limiter = create_rate_limiter(ECHO_RATE_LIMIT_ALGORITHM, ECHO_RATE_LIMIT, 60)
+# HTTP client ที่ Caller และ Throttle Processor ใช้ร่วมกัน: pool connection แบบ keep-alive ที่จำกัดขนาด
+http_client = HttpClient(
+    HTTP_CLIENT_MAX_CONNECTIONS, HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST, HTTP_CLIENT_KEEPALIVE_SECONDS,
+    HTTP_CLIENT_DNS_TTL_SECONDS, HTTP_CLIENT_TIMEOUT_SECONDS,
+)
+# จำกัดจำนวน request ของ Caller ที่ยิงพร้อมกัน (แทนการสร้าง task ทั้งนาทีในครั้งเดียว)
+caller_spawner = BoundedSpawner(SIMULATION_CALLER_CONCURRENCY)
 # ตัวแปรสำหรับเก็บ Task ของ Throttle Processor
 THROTTLE_PROCESSOR_TASK = None
+# Task ของ Caller (run_simulation_logic) ที่ยังทำงานอยู่ แยกจาก request เพื่อไม่ให้ uvicorn รอมันก่อนเริ่ม shutdown
+SIMULATION_TASKS = set()
 
 # --- 5. Logger Setup ---
 # หากมีไฟล์ Log เก่าอยู่ ให้ลบทิ้งเมื่อเริ่มโปรแกรม
@@ -87,75 +89,272 @@ logger = logging.getLogger("simulation_logger")
 logger.setLevel(logging.INFO)
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 
-# Handler สำหรับแสดง Log บน Console
+# Handler สำหรับแสดง Log บน Console (uvicorn แสดง access log ของตัวเองอยู่แล้ว)
 ch = logging.StreamHandler()
 ch.setFormatter(formatter)
-logger.addHandler(ch)
+ch.setLevel(LOG_CONSOLE_LEVEL)
+ch.addFilter(lambda record: record.name != "uvicorn.access")
 
-# Handler สำหรับบันทึก Log ลงไฟล์
-fh = logging.FileHandler(LOG_FILE)
+# Handler สำหรับบันทึก Log ลงไฟล์ (หมุนไฟล์เมื่อเกิน LOG_FILE_MAX_BYTES เพื่อให้อ่านผ่าน /logs ได้เร็ว)
+fh = RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding="utf-8")
 fh.setFormatter(formatter)
-logger.addHandler(fh)
+fh.setLevel(LOG_FILE_LEVEL)
 
-# Handler สำหรับส่ง Log ผ่าน WebSocket
-ws_handler = WebSocketLogHandler(manager)
+# Handler สำหรับส่ง Log ผ่าน WebSocket: รวม log เป็นชุด ส่ง 1 frame ทุก LOG_WS_BATCH_INTERVAL_MS
+# ทำงานเฉพาะเมื่อมี client เปิด /ws/logs อยู่ และสุ่มเก็บ log ระดับ INFO ตาม LOG_WS_SAMPLE_RATE
+ws_handler = BatchingHandler(
+    manager.broadcast_json, LOG_WS_BATCH_INTERVAL_MS / 1000, LOG_WS_MAX_PENDING, LOG_WS_LEVEL,
+    sample_rate=LOG_WS_SAMPLE_RATE, has_receivers=lambda: bool(manager.clients),
+)
 ws_handler.setFormatter(formatter)
-logger.addHandler(ws_handler)
+
+# logger เพียงแค่ใส่ record ลงคิว การ format และเขียนไปยังทุกปลายทางทำใน thread ของ QueueListener
+log_pipeline = LogPipeline([ch, fh, ws_handler], LOG_QUEUE_MAX_SIZE)
+log_pipeline.attach(logger)
 
 # ทำให้ Log การเข้าถึงของ Uvicorn ถูกส่งไปที่ WebSocket และไฟล์ด้วย
 uvicorn_access_logger = logging.getLogger("uvicorn.access")
-uvicorn_access_logger.addHandler(ws_handler)
-uvicorn_access_logger.addHandler(fh)
+log_pipeline.attach(uvicorn_access_logger)
 
 # --- 6. Background Tasks ---
 
+class ThrottleStats:
+    """Counts what the throttle processor forwarded and compares the achieved rate with the quota."""
+
+    def __init__(self, quota_per_minute: int, concurrency: int):
+        self.quota_per_minute = quota_per_minute
+        self.concurrency = concurrency
+        self.reset()
+
+    def reset(self) -> None:
+        self.started_at = time.monotonic()
+        self.sent = 0
+        self.succeeded = 0
+        self.rejected = 0
+        self.failed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_latency_ms = 0.0
+        self.statuses: Dict[int, int] = {}
+        # latency ของ request ที่เสร็จในรอบ metrics ปัจจุบัน (ล้างทุกครั้งที่ส่ง snapshot)
+        self.interval_latency = LatencyHistogram()
+        # เวลาที่ส่งของแต่ละ request ใน 60 วินาทีล่าสุด (ไม่เกิน quota ต่อนาทีเพราะมี pacer คุมอยู่)
+        self._recent: deque = deque()
+
+    def on_send(self) -> None:
+        now = time.monotonic()
+        self.sent += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self._recent.append(now)
+
+    def on_done(self, status_code: Optional[int], latency_ms: float) -> None:
+        self.in_flight -= 1
+        self.total_latency_ms += latency_ms
+        self.interval_latency.record(latency_ms)
+        if status_code is not None:
+            self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+        if status_code is None:
+            self.failed += 1
+        elif status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            self.rejected += 1
+        else:
+            self.succeeded += 1
+
+    def sent_last_minute(self) -> int:
+        boundary = time.monotonic() - 60
+        while self._recent and self._recent[0] <= boundary:
+            self._recent.popleft()
+        return len(self._recent)
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started_at
+        last_minute = self.sent_last_minute()
+        completed = self.sent - self.in_flight
+        return {
+            "quota_per_minute": self.quota_per_minute,
+            "concurrency": self.concurrency,
+            "sent": self.sent,
+            "succeeded": self.succeeded,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_size": request_queue.qsize(),
+            "queue": request_queue.stats(),
+            "retry_queue_size": len(retry_queue),
+            "dead_letter_size": len(dead_letters),
+            "sent_last_minute": last_minute,
+            "quota_utilization": round(last_minute / self.quota_per_minute, 4),
+            "average_per_minute": round(self.sent / elapsed * 60, 1) if elapsed > 0 else 0.0,
+            "average_latency_ms": round(self.total_latency_ms / completed, 3) if completed else 0.0,
+        }
+
+
+throttle_stats = ThrottleStats(THROTTLE_LIMIT, THROTTLE_CONCURRENCY)
+
+# รวบรวมตัวเลขสำหรับ snapshot ของ /ws/metrics (counters เป็นยอดสะสม MetricsPublisher คำนวณต่อวินาทีให้)
+def collect_metrics() -> dict:
+    queue_stats = request_queue.stats()
+    latency = throttle_stats.interval_latency.snapshot()
+    throttle_stats.interval_latency.reset()
+    return {
+        "counters": {
+            "queued": queue_stats["enqueued"],
+            "queue_rejected": queue_stats["rejected"],
+            "forwarded": throttle_stats.sent,
+            "status_200": throttle_stats.statuses.get(200, 0),
+            "status_429": throttle_stats.statuses.get(429, 0),
+            "failed": throttle_stats.failed,
+            "retried": throttle_stats.retried,
+            "dead_lettered": throttle_stats.dead_lettered,
+        },
+        "gauges": {
+            "queue_depth": request_queue.qsize(),
+            "in_flight": throttle_stats.in_flight,
+            "retry_queue": len(retry_queue),
+            "dead_letters": len(dead_letters),
+            "quota_per_minute": THROTTLE_LIMIT,
+            "sent_last_minute": throttle_stats.sent_last_minute(),
+            "http_in_flight": http_client.tracer.in_flight,
+            "http_waiting_for_connection": http_client.tracer.waiting,
+            "caller_active": caller_spawner.active,
+        },
+        "latency_ms": latency,
+    }
+
+async def publish_metrics(snapshot: dict):
+    if metrics_manager.clients:
+        await metrics_manager.broadcast_json(snapshot)
+
+metrics_publisher = MetricsPublisher(collect_metrics, publish_metrics, METRICS_INTERVAL_MS / 1000)
+
+# ตัดสินใจหลังส่งไม่สำเร็จ: ส่งซ้ำภายหลัง (backoff หรือตาม Retry-After) หรือย้ายไป dead-letter queue
+def schedule_retry(receipt, data: dict, attempt: int, status_code: Optional[int], error: Optional[str], retry_after: Optional[float]) -> bool:
+    call_id = data.get('id', 'N/A')
+    if attempt > THROTTLE_MAX_RETRIES:
+        dead_letters.append({
+            "id": call_id, "data": data, "attempts": attempt, "last_status": status_code,
+            "last_error": error, "dead_at": time.time(),
+        })
+        throttle_stats.dead_lettered += 1
+        logger.error(f"[Throttle] ID {call_id} failed after {attempt} attempts. Moved to dead-letter queue.")
+        return False
+    delay = backoff_delay(attempt, THROTTLE_RETRY_BASE_SECONDS, THROTTLE_RETRY_MAX_SECONDS)
+    if retry_after is not None:
+        # ห้ามส่งก่อนเวลาที่ Echo บอก ส่วน jitter ช่วยไม่ให้ทุกตัวกลับมาพร้อมกันในวินาทีเดียว
+        delay = max(delay, retry_after + delay * 0.1)
+    # จองช่องส่งซ้ำถัดไป: รายการที่รอส่งซ้ำอยู่ n รายการ = รอประมาณ n / อัตราการส่งซ้ำ
+    delay = max(delay, retry_pacer.reserve())
+    retry_queue.push((receipt, data, attempt + 1), delay)
+    throttle_stats.retried += 1
+    logger.warning(f"[Throttle] Retrying ID {call_id} in {delay:.2f}s (attempt {attempt + 1}/{THROTTLE_MAX_RETRIES + 1}).")
+    return True
+
+# ส่ง request 1 รายการไปยัง Echo Service (ทำงานเป็น task แยก หลายตัวพร้อมกันได้)
+async def forward_to_echo(session: aiohttp.ClientSession, base_url: str, receipt, data: dict, attempt: int, in_flight: asyncio.Semaphore):
+    call_id = data.get('id', 'N/A')
+    status_code = None
+    error = None
+    retry_after = None
+    start = time.perf_counter()
+    throttle_stats.on_send()
+    try:
+        logger.info(f"[Throttle] Forwarding ID {call_id} to Echo Service.")
+        async with session.post(f"{base_url}api/v1/simulation/echo", json=data, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            status_code = response.status
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            logger.info(f"[Throttle] Response for ID {call_id} from Echo Service: {response.status}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error = repr(e)
+        logger.error(f"[Throttle] Failed to send request for ID {call_id}: {error}")
+    finally:
+        throttle_stats.on_done(status_code, (time.perf_counter() - start) * 1000)
+        in_flight.release()
+
+    # 429, 5xx และ error ระหว่างเชื่อมต่อ ส่งซ้ำได้ ส่วน status อื่นถือว่าจบแล้ว
+    retryable = status_code is None or status_code == status.HTTP_429_TOO_MANY_REQUESTS or status_code >= 500
+    if retryable and simulation_stop_event.is_set():
+        # กำลังหยุด (หรือแอปกำลังปิด และ Echo ซึ่งอยู่ใน process เดียวกันปิดรับ connection แล้ว):
+        # ไม่ส่งซ้ำหรือย้ายไป dead-letter และไม่ ack คิวบนดิสก์จะเก็บไว้ส่งใหม่
+        request_queue.release(receipt, data)
+        return
+    if retryable and schedule_retry(receipt, data, attempt, status_code, error, retry_after):
+        # ยังไม่เรียก task_done: item นี้ยังไม่เสร็จจนกว่าการส่งซ้ำจะจบ
+        return
+    # ack: คิวบนดิสก์จะลบรายการนี้ออก (ถ้า process ตายก่อนถึงตรงนี้ รายการจะถูกส่งใหม่หลัง restart)
+    request_queue.task_done(receipt)
+
 # Task ที่ทำงานเบื้องหลังเพื่อดึง request จากคิวและส่งต่อไปยัง Echo Service
 async def throttle_processor(base_url: str):
-    """Task that reads requests from the queue and forwards them to the echo service based on the quota."""
-    sent_count = 0
-    window_start_time = time.time()
-    logger.info("Throttle processor started.")
-
-    async with aiohttp.ClientSession() as session:
-        # ทำงานวนไปเรื่อยๆ จนกว่าจะได้รับสัญญาณให้หยุด
-        while not simulation_stop_event.is_set():
-            current_time = time.time()
-            # รีเซ็ตตัวนับทุกๆ 60 วินาที (1 นาที)
-            if current_time - window_start_time >= 60:
-                sent_count = 0
-                window_start_time = current_time
-
-            # ถ้ายังส่ง request ได้ไม่เกินลิมิต (THROTTLE_LIMIT)
-            if sent_count < THROTTLE_LIMIT:
-                try:
-                    # พยายามดึง item จากคิว รอไม่เกิน 1 วินาที
-                    data = await asyncio.wait_for(request_queue.get(), timeout=1.0)
-                    if simulation_stop_event.is_set(): 
-                        request_queue.task_done()
-                        break
-                    
-                    call_id = data.get('id', 'N/A')
-                    logger.info(f"[Throttle] Forwarding ID {call_id} to Echo Service.")
-                    
-                    # ส่ง request ต่อไปยัง /echo endpoint
-                    async with session.post(f"{base_url}api/v1/simulation/echo", json=data, timeout=10) as response:
-                        logger.info(f"[Throttle] Response for ID {call_id} from Echo Service: {response.status}")
-
-                    sent_count += 1
-                    request_queue.task_done()
-                except asyncio.TimeoutError:
-                    # ถ้าไม่มี item ในคิวใน 1 วินาที ก็ทำรอบต่อไป
-                    continue
-                except aiohttp.ClientError as e:
-                    logger.error(f"[Throttle] Failed to send request for ID {data.get('id', 'N/A')}: {e}")
-            else:
-                # ถ้าส่งครบลิมิตแล้ว ให้รอจนกว่าจะครบนาที
-                sleep_time = max(0, 60 - (current_time - window_start_time))
-                try:
-                    await asyncio.wait_for(simulation_stop_event.wait(), timeout=sleep_time)
-                except asyncio.TimeoutError:
-                    pass
-    logger.warning("[Throttle] Processor has been stopped.")
+    """Task that reads requests from the queue and forwards them to the echo service based on the quota.
+
+    Sends are paced evenly across the minute (one every 60 / THROTTLE_LIMIT seconds) and
+    run concurrently as separate tasks, at most THROTTLE_CONCURRENCY at a time, so the
+    throughput is bounded by the quota rather than by the echo round-trip time.
+    """
+    pacer = LeakyBucketPacer(THROTTLE_LIMIT / 60)
+    retry_pacer.reset()
+    in_flight = asyncio.Semaphore(THROTTLE_CONCURRENCY)
+    tasks = set()
+    throttle_stats.reset()
+    last_report = time.monotonic()
+    logger.info(f"Throttle processor started (quota {THROTTLE_LIMIT}/min, concurrency {THROTTLE_CONCURRENCY}).")
+
+    # ใช้ connection ซ้ำจาก pool ที่ใช้ร่วมกัน (in-flight ไม่เกิน THROTTLE_CONCURRENCY จึงใช้ connection ไม่เกินนั้น)
+    session = http_client.session
+    # ทำงานวนไปเรื่อยๆ จนกว่าจะได้รับสัญญาณให้หยุด
+    while not simulation_stop_event.is_set():
+        # รายงาน throughput เทียบกับ quota ทุกๆ 1 นาที
+        if time.monotonic() - last_report >= 60:
+            last_report = time.monotonic()
+            sent = throttle_stats.sent_last_minute()
+            logger.info(f"[Throttle] Sent {sent}/{THROTTLE_LIMIT} in the last minute ({sent / THROTTLE_LIMIT:.0%} of quota).")
+        # request ที่ถึงเวลาส่งซ้ำได้ก่อน request ใหม่
+        item = retry_queue.pop_due()
+        if item is None:
+            wait_time = 1.0
+            next_retry = retry_queue.next_delay()
+            if next_retry is not None:
+                wait_time = min(wait_time, next_retry)
+            try:
+                # พยายามดึง item จากคิว รอไม่เกิน 1 วินาที (หรือจนถึงเวลาส่งซ้ำรายการถัดไป)
+                receipt, data = await asyncio.wait_for(request_queue.get(), timeout=wait_time)
+                item = (receipt, data, 1)
+            except asyncio.TimeoutError:
+                # ถ้าไม่มี item ในคิว ก็ทำรอบต่อไป
+                continue
+        receipt, data, attempt = item
+        if simulation_stop_event.is_set():
+            # ยังไม่ได้ส่ง จึงไม่ ack (ไม่งั้นคิวบนดิสก์จะลบรายการนี้ทิ้ง)
+            request_queue.release(receipt, data)
+            break
+
+        # รอถึงช่วงเวลาส่งของตัวเอง (กระจายเท่าๆ กันทั้งนาที แทนการส่งรวดเดียวแล้วหยุดรอ)
+        await pacer.wait()
+        # ถ้ามี request ค้างอยู่ครบ THROTTLE_CONCURRENCY แล้ว ให้รอจนมีตัวใดตัวหนึ่งเสร็จ
+        await in_flight.acquire()
+        task = asyncio.create_task(forward_to_echo(session, base_url, receipt, data, attempt, in_flight))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    # รอ request ที่ส่งออกไปแล้วให้ได้คำตอบก่อนจบ
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    logger.warning(f"[Throttle] Processor has been stopped. Stats: {throttle_stats.snapshot()}")
+
+# เรียกตอนปิดแอป: หยุด Caller และ Throttle Processor แล้วรอให้จบก่อนปิดคิวและ HTTP client
+async def shutdown_simulation():
+    simulation_stop_event.set()
+    if SIMULATION_TASKS:
+        await asyncio.gather(*SIMULATION_TASKS, return_exceptions=True)
+    await caller_spawner.join()
+    if THROTTLE_PROCESSOR_TASK is not None and not THROTTLE_PROCESSOR_TASK.done():
+        await asyncio.gather(THROTTLE_PROCESSOR_TASK, return_exceptions=True)
 
 # ฟังก์ชันสำหรับยิง request 1 ครั้งและบันทึกผล
 async def call_and_log(session, url, payload):
@@ -173,7 +372,6 @@ async def call_and_log(session, url, payload):
 async def run_single_minute(session, base_url, minute, num_calls, start_id):
     """Uses call_and_log to log each call separately."""
     logger.info(f"\n--- [Caller] Minute {minute} starting: sending {num_calls} calls ---")
-    tasks = []
     for i in range(num_calls):
         if simulation_stop_event.is_set():
             logger.warning(f"[Caller] Stopping minute {minute} task creation.")
@@ -183,55 +381,55 @@ async def run_single_minute(session, base_url, minute, num_calls, start_id):
         payload = {"id": call_id, "data": f"This is call number {call_id}"}
         url = f"{base_url}api/v1/simulation/throttle"
         
-        # สร้าง Task สำหรับยิง request แต่ละครั้ง
-        task = asyncio.create_task(call_and_log(session, url, payload))
-        tasks.append(task)
-    
-    if tasks:
-        # รอให้ request ทั้งหมดในนาทีนี้ทำงานเสร็จ
-        await asyncio.gather(*tasks)
+        # สร้าง Task สำหรับยิง request แต่ละครั้ง (ถ้ามีค้างครบ SIMULATION_CALLER_CONCURRENCY แล้วจะรอให้มีตัวเสร็จก่อน)
+        await caller_spawner.spawn(call_and_log(session, url, payload))
+
+    # รอให้ request ทั้งหมดในนาทีนี้ทำงานเสร็จ
+    await caller_spawner.join()
 
 # ตรรกะหลักในการจำลองสถานการณ์ ทำหน้าที่เป็น "ผู้เรียก" (Caller)
 async def run_simulation_logic(base_url: str, mode: int = 0):
     """Main logic for firing requests according to the defined schedule."""
     logger.info(f"=== [Caller] Starting simulation mode {mode} ===")
+    simulation_start_time = time.time()
     
-    # เคลียร์คิวเผื่อมีของเก่าค้างอยู่
-    while not request_queue.empty():
-        request_queue.get_nowait()
-        request_queue.task_done()
-
-    async with aiohttp.ClientSession() as session:
-        call_id_counter = 1
-        # เลือกตารางการยิง request ตาม mode ที่รับมา
-        schedule = CALL_SCHEDULE if mode == 0 else {mode: CALL_SCHEDULE.get(mode, 0)}
-
-        # วนลูปตามตารางเวลา
-        for minute, num_calls in schedule.items():
-            if simulation_stop_event.is_set(): break
-            
-            # เรียกฟังก์ชันเพื่อยิง request ตามจำนวนของนาทีนั้นๆ
-            await run_single_minute(session, base_url, minute, num_calls, call_id_counter)
-            call_id_counter += num_calls
-
-            if simulation_stop_event.is_set(): break
-            
-            # รอให้ครบ 1 นาทีก่อนจะเริ่มนาทีถัดไป
-            elapsed_minute_time = (time.time() - echo_request_counts['window_start_time']) % 60
-            wait_time = max(0, 60 - elapsed_minute_time)
-            if wait_time > 0:
-                try:
-                    await asyncio.wait_for(simulation_stop_event.wait(), timeout=wait_time)
-                except asyncio.TimeoutError:
-                    pass
+    # เคลียร์คิวเผื่อมีของเก่าค้างอยู่ (ยกเว้นคิวบนดิสก์ ซึ่งของที่ค้างคือ request ที่รับไว้แล้วก่อน restart)
+    if not request_queue.durable:
+        await request_queue.clear()
+
+    # ใช้ session และ connection pool เดียวกับ Throttle Processor แทนการเปิด session ใหม่ทุกครั้ง
+    session = http_client.session
+    call_id_counter = 1
+    # เลือกตารางการยิง request ตาม mode ที่รับมา
+    schedule = CALL_SCHEDULE if mode == 0 else {mode: CALL_SCHEDULE.get(mode, 0)}
+
+    # วนลูปตามตารางเวลา
+    for minute, num_calls in schedule.items():
+        if simulation_stop_event.is_set(): break
+        
+        # เรียกฟังก์ชันเพื่อยิง request ตามจำนวนของนาทีนั้นๆ
+        await run_single_minute(session, base_url, minute, num_calls, call_id_counter)
+        call_id_counter += num_calls
+
+        if simulation_stop_event.is_set(): break
+        
+        # รอให้ครบ 1 นาทีก่อนจะเริ่มนาทีถัดไป
+        elapsed_minute_time = (time.time() - simulation_start_time) % 60
+        wait_time = max(0, 60 - elapsed_minute_time)
+        if wait_time > 0:
+            try:
+                await asyncio.wait_for(simulation_stop_event.wait(), timeout=wait_time)
+            except asyncio.TimeoutError:
+                pass
 
     if simulation_stop_event.is_set():
         logger.warning("=== [Caller] Simulation was stopped by user ===")
     else:
         logger.info(f"=== [Caller] Simulation mode {mode} completed ===")
     
-    # ส่งสัญญาณว่าการจำลองจบแล้วผ่าน WebSocket
-    await manager.broadcast_json({"level": "SYSTEM", "message": "SIMULATION_ENDED"})
+    # ส่งสัญญาณว่าการจำลองจบแล้วผ่าน WebSocket (ทั้งช่อง log และช่อง metrics)
+    for channel in (manager, metrics_manager):
+        await channel.broadcast_json({"level": "SYSTEM", "message": "SIMULATION_ENDED"})
 
 
 # --- 7. API Endpoints ---
@@ -240,47 +438,103 @@ async def run_simulation_logic(base_url: str, mode: int = 0):
 @router.post("/echo", status_code=status.HTTP_200_OK)
 async def echo_service_endpoint(request: Request):
     """Echo Service that returns an ID and message based on conditions."""
-    global echo_request_counts
-    current_time = time.time()
     data = await request.json()
     call_id = data.get('id', 'N/A')
 
-    # ใช้ Lock เพื่อป้องกันการนับพลาดเมื่อมี request เข้ามาพร้อมกัน
-    async with asyncio.Lock():
-        # รีเซ็ตตัวนับทุกๆ 60 วินาที
-        if current_time - echo_request_counts['window_start_time'] >= 60:
-            echo_request_counts = {'count': 1, 'window_start_time': current_time}
-        else:
-            echo_request_counts['count'] += 1
-        count = echo_request_counts['count']
-        
-        logger.info(f"[Echo] Received ID {call_id}. Current capacity: {count}/{ECHO_RATE_LIMIT}.")
-        
-        # ถ้าจำนวน request เกินลิมิต
-        if count > ECHO_RATE_LIMIT:
-            logger.warning(f"[Echo] Exceeding limit for ID {call_id}. Returning 429.")
-            # ตอบกลับด้วยสถานะ 429 Too Many Requests
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={"message": "Exceeding Limit", "id": call_id}
-            )
-        
-        # ถ้าไม่เกินลิมิต ตอบกลับข้อมูลเดิมไป
-        logger.info(f"[Echo] Echoing back data for ID {call_id}.")
-        return JSONResponse(status_code=status.HTTP_200_OK, content=data)
+    # allow() ไม่มี await อยู่ข้างใน จึงไม่มี request อื่นแทรกระหว่างอ่าน/เขียนสถานะ (ไม่ต้องใช้ asyncio.Lock)
+    decision = echo_limiter.allow(ECHO_LIMITER_KEY)
+    used = ECHO_RATE_LIMIT - decision.remaining
+    logger.info(f"[Echo] Received ID {call_id}. Current capacity: {used}/{ECHO_RATE_LIMIT} ({echo_limiter.algorithm}).")
+
+    # ถ้าจำนวน request เกินลิมิต
+    if not decision.allowed:
+        logger.warning(f"[Echo] Exceeding limit for ID {call_id}. Returning 429.")
+        # ตอบกลับด้วยสถานะ 429 Too Many Requests พร้อมบอกเวลาที่ควรรอ
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"message": "Exceeding Limit", "id": call_id},
+            headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))},
+        )
+
+    # ถ้าไม่เกินลิมิต ตอบกลับข้อมูลเดิมไป
+    logger.info(f"[Echo] Echoing back data for ID {call_id}.")
+    return JSONResponse(
+        status_code=status.HTTP_200_OK, content=data,
+        headers={"X-RateLimit-Remaining": str(decision.remaining)},
+    )
+
+# Endpoint สำหรับดู/เปลี่ยน algorithm ของ rate limiter ของ Echo Service
+@router.get("/echo/limiter")
+async def get_echo_limiter():
+    return {**echo_limiter.stats(), "available": list(ALGORITHMS)}
+
+@router.put("/echo/limiter")
+async def set_echo_limiter(algorithm: str):
+    global echo_limiter
+    if algorithm not in ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"Unknown algorithm. Choose from: {', '.join(ALGORITHMS)}")
+    echo_limiter = create_rate_limiter(algorithm, ECHO_RATE_LIMIT, 60)
+    logger.info(f"[Echo] Rate limit algorithm set to {algorithm}.")
+    return echo_limiter.stats()
+
+# Endpoint สำหรับดู throughput ที่ Throttle Service ส่งต่อได้จริงเทียบกับ quota
+@router.get("/throttle/stats")
+async def get_throttle_stats():
+    return throttle_stats.snapshot()
+
+# Endpoint สำหรับดูการใช้ connection pool ของ HTTP client (ใช้ซ้ำ/สร้างใหม่, เวลารอ connection) และจำนวน request ของ Caller ที่ค้าง
+@router.get("/http/stats")
+async def get_http_stats():
+    return {"pool": http_client.stats(), "caller": caller_spawner.stats()}
+
+# Endpoint สำหรับดู request ที่ส่งไม่สำเร็จจนหมดจำนวนครั้งที่ส่งซ้ำได้ (ล่าสุดก่อน)
+@router.get("/throttle/dead-letters")
+async def get_dead_letters(limit: int = Query(100, ge=1, le=THROTTLE_DEAD_LETTER_MAX)):
+    items = list(itertools.islice(reversed(dead_letters), limit))
+    return {"total": len(dead_letters), "max_size": dead_letters.maxlen, "data": items}
+
+# Endpoint สำหรับนำ request ใน dead-letter queue กลับเข้าคิวเพื่อส่งใหม่
+@router.post("/throttle/dead-letters/requeue")
+async def requeue_dead_letters():
+    count = 0
+    while dead_letters:
+        try:
+            await request_queue.put(dead_letters[0]["data"])
+        except asyncio.QueueFull:
+            break
+        dead_letters.popleft()
+        count += 1
+    logger.info(f"[Throttle] Requeued {count} dead-lettered requests.")
+    return {"requeued": count, "remaining": len(dead_letters)}
+
+@router.delete("/throttle/dead-letters")
+async def clear_dead_letters():
+    count = len(dead_letters)
+    dead_letters.clear()
+    return {"cleared": count}
 
 # Endpoint ของ Throttle Service ที่ทำหน้าที่รับ request แล้วนำไปใส่คิว
 @router.post("/throttle", status_code=status.HTTP_202_ACCEPTED)
 async def throttle_service_endpoint(request: Request):
     data = await request.json()
-    await request_queue.put(data)
+    try:
+        await request_queue.put(data)
+    except asyncio.QueueFull:
+        # คิวเต็ม: บอกให้ลองใหม่หลังจากเวลาที่คิวปัจจุบันน่าจะส่งหมด (ส่งได้ THROTTLE_LIMIT ครั้ง/นาที)
+        retry_after = max(1, math.ceil(request_queue.qsize() * 60 / THROTTLE_LIMIT))
+        logger.warning(f"[Throttle] Queue full ({request_queue.qsize()}). Rejecting ID {data.get('id', 'N/A')}.")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"message": "Throttle queue is full", "id": data.get('id')},
+            headers={"Retry-After": str(retry_after)},
+        )
     logger.info(f"[Throttle] Queued ID {data.get('id', 'N/A')}. Queue size: {request_queue.qsize()}")
     # ตอบกลับทันทีว่ารับเรื่องแล้ว (202 Accepted)
     return {"message": "Request queued", "id": data.get('id')}
 
 # Endpoint สำหรับเริ่มการจำลอง
 @router.post("/start-simulation", status_code=status.HTTP_202_ACCEPTED)
-async def start_simulation(request: Request, background_tasks: BackgroundTasks, mode: int = 0):
+async def start_simulation(request: Request, mode: int = 0):
     global THROTTLE_PROCESSOR_TASK
     base_url = str(request.base_url)
 
@@ -291,8 +545,11 @@ async def start_simulation(request: Request, background_tasks: BackgroundTasks,
     if THROTTLE_PROCESSOR_TASK is None or THROTTLE_PROCESSOR_TASK.done():
         THROTTLE_PROCESSOR_TASK = asyncio.create_task(throttle_processor(base_url=base_url))
     
-    # สั่งให้ `run_simulation_logic` ทำงานเบื้องหลัง
-    background_tasks.add_task(run_simulation_logic, base_url=base_url, mode=mode)
+    # สั่งให้ `run_simulation_logic` ทำงานเบื้องหลัง (เป็น task แยก ไม่ใช่ BackgroundTasks ซึ่ง uvicorn จะรอให้จบ
+    # ก่อนเริ่ม shutdown ทำให้ Throttle Processor ส่งไปยัง port ที่ปิดแล้วได้นานถึง 1 นาที)
+    task = asyncio.create_task(run_simulation_logic(base_url=base_url, mode=mode))
+    SIMULATION_TASKS.add(task)
+    task.add_done_callback(SIMULATION_TASKS.discard)
     return {"message": f"Simulation started in background with mode={mode}."}
 
 # Endpoint สำหรับหยุดการจำลอง
@@ -306,14 +563,11 @@ async def stop_simulation():
     
     # ล้าง request ที่ค้างอยู่ในคิวทั้งหมด
     logger.info("[System] Clearing any remaining requests in the queue...")
-    cleared_count = 0
-    while not request_queue.empty():
-        try:
-            request_queue.get_nowait()
-            request_queue.task_done()
-            cleared_count += 1
-        except asyncio.QueueEmpty:
-            break
+    cleared_count = await request_queue.clear()
+    # request ที่รอส่งซ้ำก็นับเป็น item ของคิวที่ยังไม่เสร็จ
+    for receipt, *_ in retry_queue.drain():
+        request_queue.task_done(receipt)
+        cleared_count += 1
     if cleared_count > 0:
         logger.info(f"[System] Cleared {cleared_count} items from the request queue.")
 
@@ -321,6 +575,9 @@ async def stop_simulation():
     if os.path.exists(LOG_FILE):
         try:
             open(LOG_FILE, 'w').close()
+            for i in range(1, LOG_FILE_BACKUP_COUNT + 1):
+                if os.path.exists(f"{LOG_FILE}.{i}"):
+                    os.remove(f"{LOG_FILE}.{i}")
             logger.info(f"Log file '{LOG_FILE}' has been cleared.")
         except IOError as e:
             logger.error(f"Could not clear log file: {e}")
@@ -336,14 +593,70 @@ async def websocket_endpoint(websocket: WebSocket):
         # รอรับข้อมูล (แต่ในเคสนี้เราใช้แค่ส่งอย่างเดียว)
         while True:
             await websocket.receive_text()
-    except WebSocketDisconnect:
-        # ถ้า client ตัดการเชื่อมต่อ ให้ออกจาก manager
+    except (WebSocketDisconnect, RuntimeError):
+        # client ตัดการเชื่อมต่อ หรือ socket ถูกปิดไปแล้ว (เช่น ถูก evict เพราะรับข้อมูลไม่ทัน)
+        pass
+    finally:
         manager.disconnect(websocket)
 
+# Endpoint สำหรับดูสถานะของ log pipeline (ความลึกคิว และจำนวน log ที่ถูกทิ้งเมื่อมี log มากเกินไป)
+@router.get("/logs/stats")
+async def get_log_stats():
+    return log_pipeline.stats()
+
+# Endpoint สำหรับดูสุขภาพของการเชื่อมต่อ WebSocket (คิวค้าง, frame ที่ถูกรวม/ทิ้ง, client ที่ถูกตัด)
+@router.get("/ws/connections")
+async def get_ws_connections():
+    return {"logs": manager.stats(), "metrics": metrics_manager.stats()}
+
+# Endpoint WebSocket สำหรับรับสรุป metrics ทุก METRICS_INTERVAL_MS (แทนการรับ log ทุกบรรทัด)
+@router.websocket("/ws/metrics")
+async def websocket_metrics_endpoint(websocket: WebSocket):
+    await metrics_manager.connect(websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        metrics_manager.disconnect(websocket)
+
+# Endpoint สำหรับดู snapshot ล่าสุดของ metrics
+@router.get("/metrics")
+async def get_metrics():
+    return metrics_publisher.last_snapshot or {}
+
+# Endpoint สำหรับปรับสัดส่วนการสุ่ม log ที่ส่งทาง /ws/logs (WARNING ขึ้นไปส่งทั้งหมดเสมอ)
+@router.put("/logs/stream")
+async def set_log_stream(sample_rate: float = Query(..., ge=0.0, le=1.0)):
+    ws_handler.sample_rate = sample_rate
+    return log_pipeline.stats()
+
 # Endpoint สำหรับดึงข้อมูล Log ทั้งหมดจากไฟล์
+# - offset / max_bytes: อ่านเป็นช่วง (ตัดที่ขอบบรรทัด) แล้วใช้ X-Next-Offset เป็น offset ของครั้งถัดไปเพื่อ tail ต่อ
+# - tail: เอา N บรรทัดสุดท้าย (หลังกรอง)
+# - level / call_id: กรองตามระดับ log และ ID ของ request
 @router.get("/logs", response_class=PlainTextResponse)
-async def get_logs():
+async def get_logs(
+    offset: int = Query(0, ge=0),
+    max_bytes: Optional[int] = Query(None, ge=1),
+    tail: Optional[int] = Query(None, ge=1, le=100000),
+    level: Optional[str] = None,
+    call_id: Optional[int] = None,
+):
     if not os.path.exists(LOG_FILE):
         return PlainTextResponse("Log file not found.", status_code=404)
-    with open(LOG_FILE, 'r', encoding='utf-8') as f:
-        return PlainTextResponse(f.read())
\ No newline at end of file
+    if level and not isinstance(logging.getLevelName(level.upper()), int):
+        raise HTTPException(status_code=400, detail=f"Unknown log level: {level}")
+    match = line_filter(level, call_id)
+    media_type = "text/plain; charset=utf-8"
+
+    # อ่านไฟล์ใน threadpool ทั้งหมด ไม่ block event loop
+    if tail is not None:
+        lines, end = await run_in_threadpool(tail_lines, LOG_FILE, tail, match)
+        return Response(b"".join(lines), media_type=media_type, headers={"X-Next-Offset": str(end)})
+    start, end = await run_in_threadpool(complete_end, LOG_FILE, offset, max_bytes)
+    # generator แบบ sync: StreamingResponse จะดึงทีละ chunk ใน threadpool
+    return StreamingResponse(
+        iter_range(LOG_FILE, start, end, match), media_type=media_type, headers={"X-Next-Offset": str(end)},
+    )
\ No newline at end of file
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+
+from app.api.user import avatar_pipeline
+from app.core.storage import storage_initializer
+from app.db.database import engine, pool_stats
+
+router = APIRouter(prefix="/api/v1/system", tags=["System"])
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    # สถิติเป็นของ process นี้เท่านั้น เมื่อรัน uvicorn หลาย worker แต่ละ worker มี pool ของตัวเอง
+    return pool_stats(engine)
+
+
+@router.get("/avatar-variants")
+async def get_avatar_variant_stats():
+    return avatar_pipeline.stats()
+
+
+@router.get("/storage")
+async def get_storage_status():
+    # สถานะการเตรียม storage ตอนเริ่มแอป (pending / initializing / ready / failed)
+    return storage_initializer.stats()
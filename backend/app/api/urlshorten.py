@@ -1,162 +1,451 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from app.api.auth import oauth2_scheme
+from app.core.cache import TTLCache
+from app.core.config import (
+    AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS, AUDIT_QUEUE_MAX_SIZE, AUDIT_QUEUE_POLICY,
+    BULK_CHUNK_SIZE, BULK_MAX_ITEMS, CLICK_FLUSH_INTERVAL_SECONDS, REDIRECT_CACHE_MAX_AGE, REDIRECT_STATUS_CODE,
+    SHORT_KEY_BLOCK_SIZE, SHORT_KEY_STRATEGY, SHORT_KEY_WORKER_ID, URL_CACHE_MAX_SIZE, URL_CACHE_TTL_SECONDS,
+)
+from app.core.keygen import create_key_generator
+from app.core.pagination import decode_cursor, json_array_stream, next_cursor
 from app.core.security import decode_access_token
-from app.db.database import SessionLocal
+from app.db.audit_writer import AuditWriter
+from app.db.click_counter import ClickCounter
+from app.db.database import SessionLocal, engine, get_db
+from app.db.key_allocator import allocate_key_block
 from app.db.url_models import URLShorten, URLShortenAudit
 from app.schemas.urlshorten import URLShortenCreate, URLShortenUpdate, URLShortenResponse,URLShortenAuditResponse
-import string
 from fastapi import Response
-import random
 from fastapi.security import HTTPAuthorizationCredentials
 
 router = APIRouter(prefix="/api/v1/urlshorten", tags=["URL Shorten"])
+# router สำหรับ redirect จริง (ไม่มี prefix เพื่อให้ลิงก์สั้นที่สุด)
+redirect_router = APIRouter(tags=["Redirect"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# cache สำหรับ short_key -> URLShortenResponse เพื่อลดการ query ซ้ำของ key ยอดนิยม
+url_cache = TTLCache(maxsize=URL_CACHE_MAX_SIZE, ttl=URL_CACHE_TTL_SECONDS)
+# cache สำหรับ redirect เก็บแค่ short_key -> (id, original_url)
+redirect_cache = TTLCache(maxsize=URL_CACHE_MAX_SIZE, ttl=URL_CACHE_TTL_SECONDS)
+
+_url_table = URLShorten.__table__
+# query ที่ดึงเฉพาะคอลัมน์ที่ redirect ต้องใช้ SQLAlchemy จะ compile ครั้งเดียวแล้ว cache ไว้
+_redirect_lookup = select(_url_table.c.id, _url_table.c.original_url).where(
+    _url_table.c.short_key == bindparam("short_key")
+)
+
+# กลยุทธ์สร้าง short_key ที่ไม่ซ้ำโดยไม่ต้อง SELECT ก่อน INSERT (random / block / snowflake)
+key_generator = create_key_generator(
+    SHORT_KEY_STRATEGY, allocator=allocate_key_block, block_size=SHORT_KEY_BLOCK_SIZE, worker_id=SHORT_KEY_WORKER_ID,
+)
+# จำนวนครั้งที่ลองใหม่เมื่อ INSERT ชน unique index (เช่น ชนกับ short_key ที่ผู้ใช้ตั้งเอง)
+MAX_KEY_ATTEMPTS = 5
+
+def invalidate_short_key(short_key: str):
+    url_cache.discard(short_key)
+    redirect_cache.discard(short_key)
+
+def _evict_flushed_urls(batch):
+    # clicks ใน cache เป็นค่าก่อน flush ให้โหลดใหม่จากฐานข้อมูลครั้งถัดไป
+    for item in url_cache.values():
+        if item.id in batch:
+            url_cache.discard(item.short_key)
+
+# สะสม clicks ไว้ในหน่วยความจำแล้วเขียนลงฐานข้อมูลเป็นชุดตามรอบเวลา
+click_counter = ClickCounter(flush_interval=CLICK_FLUSH_INTERVAL_SECONDS, on_flush=_evict_flushed_urls)
+
+# audit log ถูกส่งเข้าคิวแล้วเขียนเป็นชุดเบื้องหลัง ไม่ต้อง commit แยกในทุก request
+audit_writer = AuditWriter(
+    max_queue=AUDIT_QUEUE_MAX_SIZE, batch_size=AUDIT_BATCH_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL_SECONDS, policy=AUDIT_QUEUE_POLICY,
+)
 
 async def get_current_user(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
     token_str = token.credentials
     user = decode_access_token(token_str)
     return user
 
-def generate_short_key(length=8):
-    chars = string.ascii_letters + string.digits
-    return ''.join(random.choice(chars) for _ in range(length))
+def with_pending_clicks(url) -> URLShortenResponse:
+    # clicks ที่บันทึกแล้ว + clicks ที่ยังรอ flush
+    response = url if isinstance(url, URLShortenResponse) else URLShortenResponse.from_orm(url)
+    return response.copy(update={"clicks": (response.clicks or 0) + click_counter.pending(response.id)})
 
-def log_audit(db: Session, action: str, user: str, short_key: str = None):
-    audit = URLShortenAudit(
-        action=action,
-        performed_by=user,
-        performed_at=datetime.utcnow(),
-        short_key=short_key  # บันทึก short_key ด้วย
-    )
-    db.add(audit)
-    db.commit()
+async def log_audit(action: str, user: str, short_key: str = None):
+    await audit_writer.submit(action, user, short_key=short_key)  # บันทึก short_key ด้วย
 
 
 @router.post("/", response_model=URLShortenResponse)
 async def create_url(
     data: URLShortenCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: str = Depends(get_current_user)
 ):
-    key = generate_short_key()
-    while db.query(URLShorten).filter(URLShorten.short_key == key).first():
-        key = generate_short_key()
-
-    new_url = URLShorten(
-        original_url=str(data.original_url),
-        short_key=key,
-        created_at=datetime.utcnow(),
-        clicks=0,
-        created_by=user
-    )
-    db.add(new_url)
-    db.commit()
-    db.refresh(new_url)
+    for _ in range(MAX_KEY_ATTEMPTS):
+        key = await key_generator.next_key()
+        new_url = URLShorten(
+            original_url=str(data.original_url),
+            short_key=key,
+            created_at=datetime.utcnow(),
+            clicks=0,
+            created_by=user
+        )
+        db.add(new_url)
+        try:
+            await db.commit()
+            break
+        except IntegrityError:
+            # key ชนกับที่มีอยู่แล้ว (unique index เป็นตัวตัดสิน) ให้สร้าง key ใหม่
+            await db.rollback()
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate a unique short key")
+    await db.refresh(new_url)
 
-    log_audit(db, "CREATE", user, short_key=key)  # ส่ง short_key ด้วย
+    await log_audit("CREATE", user, short_key=key)  # ส่ง short_key ด้วย
 
     return new_url
 
 
+async def _read_bulk_items(request: Request) -> List:
+    # รองรับทั้ง JSON array และ NDJSON (หนึ่ง object ต่อบรรทัด อ่านทีละ chunk)
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        return items
+
+    items = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                items.append(line)
+        if len(items) > BULK_MAX_ITEMS:
+            break
+    if buffer.strip():
+        items.append(buffer)
+    return items
+
+
+def _bulk_result_line(row) -> bytes:
+    return (json.dumps({
+        "id": row.id,
+        "original_url": row.original_url,
+        "short_key": row.short_key,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": None,
+        "clicks": 0,
+        "created_by": row.created_by,
+        "updated_by": None,
+    }) + "\n").encode()
+
+
+@router.post("/bulk")
+async def bulk_create_urls(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: str = Depends(get_current_user)
+):
+    """Creates many URLs (and their CREATE audit rows) in one transaction and streams NDJSON results."""
+    raw_items = await _read_bulk_items(request)
+    if len(raw_items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+
+    # ตรวจสอบทุกรายการก่อน รายการที่ผิดจะถูกรายงานกลับโดยไม่ทำให้ทั้งชุดล้ม
+    errors = {}
+    valid = []
+    for index, raw in enumerate(raw_items):
+        try:
+            item = json.loads(raw) if isinstance(raw, bytes) else raw
+            valid.append((index, URLShortenCreate(**item)))
+        except (ValueError, TypeError, ValidationError) as e:
+            errors[index] = str(e)
+
+    now = datetime.utcnow()
+    # ใช้ Core insert (ไม่ผ่าน ORM unit of work) เพื่อให้ driver ส่งเป็น executemany / INSERT ... RETURNING
+    insert_urls = insert(_url_table).returning(
+        _url_table.c.id, _url_table.c.original_url, _url_table.c.short_key,
+        _url_table.c.created_at, _url_table.c.created_by,
+    )
+    for _ in range(MAX_KEY_ATTEMPTS):
+        keys = await key_generator.generate_many(len(valid))
+        rows = []
+        try:
+            for offset in range(0, len(valid), BULK_CHUNK_SIZE):
+                chunk = valid[offset:offset + BULK_CHUNK_SIZE]
+                chunk_keys = keys[offset:offset + BULK_CHUNK_SIZE]
+                result = await db.execute(insert_urls, [
+                    {"original_url": str(item.original_url), "short_key": key,
+                     "created_at": now, "clicks": 0, "created_by": user}
+                    for (_, item), key in zip(chunk, chunk_keys)
+                ])
+                rows.extend(result.all())
+                await db.execute(insert(URLShortenAudit.__table__), [
+                    {"action": "CREATE", "performed_by": user, "performed_at": now, "short_key": key}
+                    for key in chunk_keys
+                ])
+            await db.commit()
+            break
+        except IntegrityError:
+            # มี key ชนกับของเดิม ยกเลิกทั้งชุดแล้วสร้าง key ใหม่ทั้งหมด
+            await db.rollback()
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate unique short keys")
+
+    # RETURNING ไม่รับประกันลำดับ จับคู่ผลลัพธ์กลับด้วย short_key ที่ไม่ซ้ำ
+    rows_by_key = {row.short_key: row for row in rows}
+    results = {index: rows_by_key[key] for (index, _), key in zip(valid, keys)}
+
+    def stream():
+        # ส่งออกทีละชุดเพื่อลดจำนวน chunk ที่ต้องเขียนลง socket
+        for offset in range(0, len(raw_items), BULK_CHUNK_SIZE):
+            lines = []
+            for index in range(offset, min(offset + BULK_CHUNK_SIZE, len(raw_items))):
+                if index in errors:
+                    lines.append((json.dumps({"index": index, "error": errors[index]}) + "\n").encode())
+                else:
+                    lines.append(_bulk_result_line(results[index]))
+            yield b"".join(lines)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _audit_query(action, performed_by, performed_from, performed_to):
+    query = select(URLShortenAudit).order_by(URLShortenAudit.performed_at.desc(), URLShortenAudit.id.desc())
+    if action:
+        query = query.where(URLShortenAudit.action == action)
+    if performed_by:
+        query = query.where(URLShortenAudit.performed_by == performed_by)
+    if performed_from:
+        query = query.where(URLShortenAudit.performed_at >= performed_from)
+    if performed_to:
+        query = query.where(URLShortenAudit.performed_at < performed_to)
+    return query
+
+
+def _audit_json(audit: URLShortenAudit) -> dict:
+    return {
+        "id": audit.id, "action": audit.action, "performed_by": audit.performed_by,
+        "performed_at": audit.performed_at, "short_key": audit.short_key,
+    }
+
+
 @router.get("/audit", response_model=List[URLShortenAuditResponse])
-async def get_audit_logs(db: Session = Depends(get_db)):
-    logs = db.query(URLShortenAudit).order_by(URLShortenAudit.performed_at.desc()).all()
+async def get_audit_logs(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    action: Optional[str] = None,
+    performed_by: Optional[str] = None,
+    performed_from: Optional[datetime] = None,
+    performed_to: Optional[datetime] = None,
+    stream: bool = Query(False, description="Stream every matching row as one JSON array (export)"),
+    db: AsyncSession = Depends(get_db)
+):
+    query = _audit_query(action, performed_by, performed_from, performed_to)
+
+    if stream:
+        async def export():
+            # session ของ dependency ถูกปิดก่อนส่ง response จึงเปิด session ของตัวเอง
+            async with SessionLocal() as export_db:
+                rows = await export_db.stream_scalars(query.execution_options(yield_per=1000))
+                async for chunk in json_array_stream(rows, _audit_json):
+                    yield chunk
+        return StreamingResponse(export(), media_type="application/json")
+
+    # keyset pagination บน (performed_at, id) ไม่ต้อง OFFSET
+    if cursor:
+        performed_at, audit_id = decode_cursor(cursor)
+        query = query.where(tuple_(URLShortenAudit.performed_at, URLShortenAudit.id) < (performed_at, audit_id))
+    logs = (await db.scalars(query.limit(limit))).all()
+    response.headers["X-Next-Cursor"] = next_cursor(logs, limit, "performed_at") or ""
     return logs
 
+@router.get("/stats")
+async def get_stats():
+    return {
+        "cache": url_cache.stats(),
+        "redirect_cache": redirect_cache.stats(),
+        "clicks": click_counter.stats(),
+        "audit": audit_writer.stats(),
+    }
+
+def _url_json(url: URLShorten) -> dict:
+    return {
+        "id": url.id, "original_url": url.original_url, "short_key": url.short_key,
+        "created_at": url.created_at, "updated_at": url.updated_at,
+        "clicks": (url.clicks or 0) + click_counter.pending(url.id),
+        "created_by": url.created_by, "updated_by": url.updated_by,
+    }
+
+
 @router.get("/", response_model=List[URLShortenResponse])
-async def get_all_urls(db: Session = Depends(get_db)):
-    return db.query(URLShorten).order_by(URLShorten.created_at.desc()).all()
+async def get_all_urls(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    created_by: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    stream: bool = Query(False, description="Stream every matching row as one JSON array (export)"),
+    db: AsyncSession = Depends(get_db)
+):
+    query = select(URLShorten).order_by(URLShorten.created_at.desc(), URLShorten.id.desc())
+    if created_by:
+        query = query.where(URLShorten.created_by == created_by)
+    if created_from:
+        query = query.where(URLShorten.created_at >= created_from)
+    if created_to:
+        query = query.where(URLShorten.created_at < created_to)
+
+    if stream:
+        async def export():
+            async with SessionLocal() as export_db:
+                rows = await export_db.stream_scalars(query.execution_options(yield_per=1000))
+                async for chunk in json_array_stream(rows, _url_json):
+                    yield chunk
+        return StreamingResponse(export(), media_type="application/json")
+
+    # keyset pagination บน (created_at, id) ไม่ต้อง OFFSET
+    if cursor:
+        created_at, url_id = decode_cursor(cursor)
+        query = query.where(tuple_(URLShorten.created_at, URLShorten.id) < (created_at, url_id))
+    urls = (await db.scalars(query.limit(limit))).all()
+    response.headers["X-Next-Cursor"] = next_cursor(urls, limit, "created_at") or ""
+    return [with_pending_clicks(url) for url in urls]
 
 
 @router.get("/id/{url_id}", response_model=URLShortenResponse)
-async def get_url_by_id(url_id: int, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    url = db.query(URLShorten).filter(URLShorten.id == url_id).first()
-    if not url:
-        raise HTTPException(status_code=404, detail="URL not found")
-    return url
+async def get_url_by_id(url_id: int, db: AsyncSession = Depends(get_db), user: str = Depends(get_current_user)):
+    async with click_counter.reading():
+        url = await db.get(URLShorten, url_id)
+        if not url:
+            raise HTTPException(status_code=404, detail="URL not found")
+        return with_pending_clicks(url)
 
 @router.get("/{short_key}", response_model=URLShortenResponse)
-async def get_url_by_short_key(short_key: str, db: Session = Depends(get_db)):
-    url = db.query(URLShorten).filter(URLShorten.short_key == short_key).first()
-    if not url:
-        raise HTTPException(status_code=404, detail="Short URL not found")
-    url.clicks += 1
-    db.commit()
-    db.refresh(url)
-    return url
+async def get_url_by_short_key(short_key: str, db: AsyncSession = Depends(get_db)):
+    cached = url_cache.get(short_key)
+    if cached is not None:
+        # นับ click ในหน่วยความจำ แล้วให้ click_counter เขียนเป็นชุดภายหลัง
+        click_counter.add(cached.id)
+        return with_pending_clicks(cached)
+
+    # อ่านจากฐานข้อมูลและนับ clicks ที่รอ flush ในช่วงเดียวกัน ไม่ให้ flush มาแทรก (ไม่งั้นจะนับ batch ที่กำลัง flush ซ้ำ)
+    async with click_counter.reading():
+        url = await db.scalar(select(URLShorten).where(URLShorten.short_key == short_key))
+        if not url:
+            raise HTTPException(status_code=404, detail="Short URL not found")
+        cached = URLShortenResponse.from_orm(url)
+        url_cache.set(short_key, cached)
+        click_counter.add(cached.id)
+        return with_pending_clicks(cached)
 
 
 @router.put("/id/{url_id}", response_model=URLShortenResponse)
 async def update_url(
     url_id: int,
     data: URLShortenUpdate,  # ต้องเพิ่ม short_key ใน schema URLShortenUpdate ด้วย
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: str = Depends(get_current_user)
 ):
-    url = db.query(URLShorten).filter(URLShorten.id == url_id).first()
+    url = await db.get(URLShorten, url_id)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
 
-    # ตรวจสอบว่ามี short_key ใหม่ และตรวจสอบว่าซ้ำหรือไม่
+    old_short_key = url.short_key
+
+    # short_key ใหม่ซ้ำหรือไม่ให้ unique index ตัดสินตอน commit
     if data.short_key and data.short_key != url.short_key:
-        existing = db.query(URLShorten).filter(URLShorten.short_key == data.short_key).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="short_key already exists")
         url.short_key = data.short_key
 
-    url.original_url = data.original_url
+    url.original_url = str(data.original_url)
     url.updated_at = datetime.utcnow()
     url.updated_by = user
-    db.commit()
-    db.refresh(url)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="short_key already exists")
+    # ล้าง cache หลัง commit สำเร็จเท่านั้น (ถ้าล้างก่อน request ที่อ่านแถวเดิมระหว่างนั้นจะใส่ค่าเก่ากลับเข้า cache)
+    # ทั้ง key เดิมและ key ใหม่
+    invalidate_short_key(old_short_key)
+    invalidate_short_key(url.short_key)
+    await db.refresh(url)
 
-    log_audit(db, "UPDATE", user)  
+    await log_audit("UPDATE", user)  
 
-    return url
+    return with_pending_clicks(url)
 
 
 @router.patch("/id/{url_id}/click", response_model=URLShortenResponse)
 async def increment_click(
     url_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    url = db.query(URLShorten).filter(URLShorten.id == url_id).first()
-    if not url:
-        raise HTTPException(status_code=404, detail="URL not found")
+    async with click_counter.reading():
+        url = await db.get(URLShorten, url_id)
+        if not url:
+            raise HTTPException(status_code=404, detail="URL not found")
 
-    url.clicks = (url.clicks or 0) + 1  # เผื่อคลิกเริ่มต้นเป็น None
-    url.updated_at = datetime.utcnow()
-    # url.updated_by = user  # ลบออก เพราะไม่มี user
-    db.commit()
-    db.refresh(url)
-
-    return url
+        # ไม่ UPDATE ทีละครั้ง ให้ click_counter รวมแล้วเขียนเป็นชุด
+        click_counter.add(url.id)
+        return with_pending_clicks(url)
 
 
 @router.delete("/id/{url_id}", status_code=204)
 async def delete_url(
     url_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: str = Depends(get_current_user)
 ):
-    url = db.query(URLShorten).filter(URLShorten.id == url_id).first()
+    url = await db.get(URLShorten, url_id)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
 
     short_key = url.short_key
-    db.delete(url)
-    db.commit()
+    await db.delete(url)
+    await db.commit()
+    invalidate_short_key(short_key)
+    click_counter.discard(url_id)
+
+    await log_audit("DELETE", user)
 
-    log_audit(db, "DELETE", user)
+    return Response(status_code=204)
 
-    return Response(status_code=204)
\ No newline at end of file
+
+@redirect_router.get("/r/{short_key}")
+async def redirect_short_key(short_key: str):
+    """Redirects to the original URL without auth, ORM loading or response-model serialization."""
+    target = redirect_cache.get(short_key)
+    if target is None:
+        cached = url_cache.get(short_key)
+        if cached is not None:
+            target = (cached.id, str(cached.original_url))
+        else:
+            async with engine.connect() as conn:
+                row = (await conn.execute(_redirect_lookup, {"short_key": short_key})).first()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Short URL not found")
+            target = (row.id, row.original_url)
+        redirect_cache.set(short_key, target)
+
+    url_id, original_url = target
+    click_counter.add(url_id)
+    return RedirectResponse(
+        original_url,
+        status_code=REDIRECT_STATUS_CODE,
+        headers={"Cache-Control": f"public, max-age={REDIRECT_CACHE_MAX_AGE}"},
+    )
@@ -1,86 +1,282 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, insert, or_, select, text, tuple_
 from typing import List, Optional
+import csv
 import io
+import json
 import os
+import uuid
 from datetime import datetime
 from typing import Optional, Dict, Any
-from app.db.database import get_db
+from app.core.cache import TTLCache
+from app.core.config import (
+    AVATAR_VARIANT_FORMAT, AVATAR_VARIANT_MAX_QUEUE, AVATAR_VARIANT_WORKERS, MINIO_PUBLIC_URL,
+    USER_COUNT_CACHE_MAX_SIZE, USER_COUNT_CACHE_TTL_SECONDS, USER_IMPORT_CHUNK_SIZE, USER_IMPORT_MAX_ROWS,
+)
+from app.core.pagination import decode_cursor, json_default, next_cursor
+from app.db.avatar_pipeline import AvatarVariantPipeline
+from app.db.database import engine, get_db
 from app.db.user_model import User
-from app.schemas.user import UserOut
-from app.core.minio_config import minio_client, bucket_name
-from minio.error import S3Error
+from app.db.user_search import apply_user_search
+from app.schemas.user import UserCreate, UserOut
+from app.core.storage import avatar_extension, remove_object, storage, upload_avatar
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MINIO_INTERNAL_URL = os.getenv("MINIO_INTERNAL_URL", "http://minio:9000")
-MINIO_PUBLIC_URL = os.getenv("MINIO_PUBLIC_URL", "http://localhost:9000")
 
 
 router = APIRouter(prefix="/api/v1/user", tags=["User"])
 
+# รูปย่อของ avatar สร้างเบื้องหลังหลังอัปโหลด (ตารางรายชื่อใช้ 64px, หน้ารายละเอียดใช้ 256px)
+avatar_pipeline = AvatarVariantPipeline(
+    workers=AVATAR_VARIANT_WORKERS, max_queue=AVATAR_VARIANT_MAX_QUEUE, fmt=AVATAR_VARIANT_FORMAT,
+)
+LIST_AVATAR_SIZE = "64"
+DETAIL_AVATAR_SIZE = "256"
+
+
+def public_object_url(object_name: str) -> str:
+    return storage.public_url(object_name)
+
+
+def to_user_out(user: User, avatar_size: str) -> UserOut:
+    """UserOut whose avatar_url points at the `avatar_size` variant (or the original until it exists)."""
+    out = UserOut.from_orm(user)
+    variants = user.avatar_variants or {}
+    if user.avatar_url:
+        out.avatar_url = public_object_url(variants.get(avatar_size, user.avatar_url))
+    out.avatar_variants = {size: public_object_url(name) for size, name in variants.items()} or None
+    return out
+
+
+# จำนวน user ทั้งหมด/ตามคำค้น ใช้คำนวณ total_pages โดยไม่ต้อง count ทุกครั้งที่เปลี่ยนหน้า
+user_count_cache = TTLCache(maxsize=USER_COUNT_CACHE_MAX_SIZE, ttl=USER_COUNT_CACHE_TTL_SECONDS)
+
 def convert_presigned_url_to_public(url: str) -> str:
     if MINIO_INTERNAL_URL in url:
         return url.replace(MINIO_INTERNAL_URL, MINIO_PUBLIC_URL)
     return url
 
+async def _estimated_user_count(db: AsyncSession) -> Optional[int]:
+    # PostgreSQL เก็บจำนวนแถวโดยประมาณไว้ใน pg_class (อัปเดตตอน VACUUM/ANALYZE) อ่านได้ทันทีไม่ต้อง scan
+    if engine.dialect.name != "postgresql":
+        return None
+    estimate = await db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"))
+    return estimate if estimate is not None and estimate >= 0 else None
+
+
+async def count_users(db: AsyncSession, query, q: Optional[str], approximate: bool = False) -> int:
+    """Total rows for `query`, served from the count cache (or pg_class when approximate and unfiltered)."""
+    if approximate and not q:
+        estimate = await _estimated_user_count(db)
+        if estimate is not None:
+            return estimate
+    cache_key = (q or "").lower()
+    total = user_count_cache.get(cache_key)
+    if total is None:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        user_count_cache.set(cache_key, total)
+    return total
+
+
+def invalidate_user_counts():
+    # มีการเพิ่ม/แก้ไข/ลบ user จำนวนที่ cache ไว้ (รวมผลค้นหา) อาจไม่ถูกต้องแล้ว
+    user_count_cache.clear()
+
+
 @router.get("/", response_model=Dict[str, Any])
-def get_users(
+async def get_users(
     q: Optional[str] = Query(None, description="Search by name or email"),
+    ranked: bool = Query(False, description="Order search results by relevance"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (replaces start)"),
+    approximate_count: bool = Query(False, description="Use the planner's row estimate for total_pages"),
     start: int = 0,
-    limit: int = 10,
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(User)
+    query = select(User)
 
-    # Apply search filter
+    # Apply search filter (ค้นผ่าน search_text ที่มี index แทน ilike ทีละคอลัมน์)
     if q:
-        query = query.filter(
-            or_(
-                User.first_name.ilike(f"%{q}%"),
-                User.last_name.ilike(f"%{q}%"),
-                User.display_name.ilike(f"%{q}%"),
-                User.username.ilike(f"%{q}%"),
-                User.email.ilike(f"%{q}%"),
-                User.citizen_id.ilike(f"%{q}%"),
-                User.mobile_no.ilike(f"%{q}%"),
-                User.address.ilike(f"%{q}%")
-            )
-        )
+        query = apply_user_search(query, engine.dialect.name, q, ranked=ranked)
 
-    # Sort by created_at (oldest first)
-    query = query.order_by(User.created_at.asc())
-
-    total_items = query.count()
+    total_items = await count_users(db, query, q, approximate=approximate_count)
     total_pages = (total_items + limit - 1) // limit
 
-    users = query.offset(start).limit(limit).all()
+    # Sort by created_at (oldest first) แล้วใช้ id ตัดสินเมื่อ created_at เท่ากัน
+    query = query.order_by(User.created_at.asc(), User.id.asc())
+    # ผลค้นหาแบบ ranked เรียงตามคะแนน ใช้ cursor (created_at, id) ไม่ได้ จึงยังใช้ start
+    keyset = not (q and ranked)
+    if cursor and keyset:
+        created_at, user_id = decode_cursor(cursor)
+        query = query.where(tuple_(User.created_at, User.id) > (created_at, user_id))
+    else:
+        query = query.offset(start)
+
+    users = (await db.scalars(query.limit(limit))).all()
 
-    result = []
-    for user in users:
-        if user.avatar_url:
-            user.avatar_url = f"{MINIO_PUBLIC_URL}/{bucket_name}/{user.avatar_url}"
-        result.append(UserOut.from_orm(user))
+    result = [to_user_out(user, LIST_AVATAR_SIZE) for user in users]
 
     return {
         "data": result,
-        "total_pages": total_pages
+        "total_pages": total_pages,
+        "next_cursor": next_cursor(users, limit, "created_at") if keyset else None,
     }
 
 
 
+# avatar อัปโหลดผ่าน create/update เท่านั้น import ไม่รับ avatar_url
+IMPORT_FIELDS = [field for field in UserCreate.__fields__ if field != "avatar_url"]
+EXPORT_FIELDS = ["id", "avatar_url"] + IMPORT_FIELDS + ["created_at", "created_by", "updated_at", "updated_by"]
+_users_table = User.__table__
+
+
+async def _read_import_rows(request: Request) -> List[dict]:
+    # CSV (มีแถวหัวตาราง) หรือ NDJSON (หนึ่ง object ต่อบรรทัด)
+    body = (await request.body()).decode("utf-8-sig")
+    if "csv" in request.headers.get("content-type", ""):
+        return list(csv.DictReader(io.StringIO(body)))
+    rows = []
+    for line in body.splitlines():
+        if line.strip():
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(None)
+    return rows
+
+
+def _validate_import_row(raw) -> UserCreate:
+    if not isinstance(raw, dict):
+        raise ValueError("Row must be a JSON object")
+    # ช่องที่ไม่มีหรือว่าง (เช่น CSV) ถือเป็น None
+    values = {field: (raw.get(field) if raw.get(field) != "" else None) for field in IMPORT_FIELDS}
+    return UserCreate(**values)
+
+
+async def _existing_emails_and_usernames(db: AsyncSession, emails: List[str], usernames: List[str]):
+    """Emails and usernames from the import that already exist, one IN query per chunk instead of one SELECT per row."""
+    taken_emails, taken_usernames = set(), set()
+    for offset in range(0, max(len(emails), len(usernames)), USER_IMPORT_CHUNK_SIZE):
+        email_chunk = emails[offset:offset + USER_IMPORT_CHUNK_SIZE]
+        username_chunk = usernames[offset:offset + USER_IMPORT_CHUNK_SIZE]
+        rows = await db.execute(
+            select(User.email, User.username).where(or_(User.email.in_(email_chunk), User.username.in_(username_chunk)))
+        )
+        for email, username in rows:
+            taken_emails.add(email)
+            taken_usernames.add(username)
+    return taken_emails, taken_usernames
+
+
+@router.post("/import")
+async def import_users(request: Request, db: AsyncSession = Depends(get_db)):
+    """Creates users from CSV or NDJSON in one transaction and streams one NDJSON result per row."""
+    raw_rows = await _read_import_rows(request)
+    if len(raw_rows) > USER_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {USER_IMPORT_MAX_ROWS} rows per request")
+
+    errors = {}
+    valid = []
+    for index, raw in enumerate(raw_rows):
+        try:
+            valid.append((index, _validate_import_row(raw)))
+        except (ValueError, TypeError, ValidationError) as e:
+            errors[index] = str(e)
+
+    taken_emails, taken_usernames = await _existing_emails_and_usernames(
+        db, [item.email for _, item in valid], [item.username for _, item in valid]
+    )
+    now = datetime.utcnow()
+    rows = []
+    for index, item in valid:
+        # ซ้ำกับในฐานข้อมูล หรือซ้ำกับแถวก่อนหน้าในไฟล์เดียวกัน
+        if item.email in taken_emails:
+            errors[index] = "Email already exists"
+            continue
+        if item.username in taken_usernames:
+            errors[index] = "Username already exists"
+            continue
+        taken_emails.add(item.email)
+        taken_usernames.add(item.username)
+        rows.append((index, {
+            **item.dict(), "id": str(uuid.uuid4()), "created_at": now, "updated_at": now,
+            "created_by": "admin", "updated_by": "admin",
+        }))
+
+    try:
+        # Core insert แบบ executemany ทีละชุด ไม่ผ่าน ORM unit of work
+        for offset in range(0, len(rows), USER_IMPORT_CHUNK_SIZE):
+            await db.execute(insert(_users_table), [row for _, row in rows[offset:offset + USER_IMPORT_CHUNK_SIZE]])
+        await db.commit()
+    except IntegrityError as e:
+        # ไม่ผ่าน constraint ของฐานข้อมูล เช่นมีคนสร้าง user ที่ email/username ซ้ำระหว่าง import
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"Import rejected by the database, nothing was saved: {e.orig}")
+    invalidate_user_counts()
+
+    created = {index: row["id"] for index, row in rows}
+
+    def stream():
+        for offset in range(0, len(raw_rows), USER_IMPORT_CHUNK_SIZE):
+            lines = []
+            for index in range(offset, min(offset + USER_IMPORT_CHUNK_SIZE, len(raw_rows))):
+                if index in errors:
+                    lines.append(json.dumps({"index": index, "error": errors[index]}))
+                else:
+                    lines.append(json.dumps({"index": index, "id": created[index]}))
+            yield ("\n".join(lines) + "\n").encode()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _export_values(row) -> dict:
+    values = {field: getattr(row, field) for field in EXPORT_FIELDS}
+    values["avatar_url"] = public_object_url(row.avatar_url) if row.avatar_url else None
+    return values
+
+
+@router.get("/export")
+async def export_users(format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    """Streams every user as CSV or NDJSON without loading the table into memory."""
+    query = select(*(_users_table.c[field] for field in EXPORT_FIELDS)).order_by(User.created_at, User.id)
+
+    async def export():
+        async with engine.connect() as conn:
+            result = await conn.stream(query.execution_options(yield_per=USER_IMPORT_CHUNK_SIZE))
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+                writer.writeheader()
+            async for partition in result.partitions():
+                if format == "csv":
+                    writer.writerows(_export_values(row) for row in partition)
+                    chunk, buffer = buffer.getvalue(), io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+                else:
+                    chunk = "".join(json.dumps(_export_values(row), default=json_default) + "\n" for row in partition)
+                yield chunk.encode()
+            if format == "csv" and buffer.tell():
+                yield buffer.getvalue().encode()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="users.{format}"'}
+    return StreamingResponse(export(), media_type=media_type, headers=headers)
+
+
 @router.get("/{user_id}", response_model=UserOut)
-def get_user_by_id(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user_by_id(user_id: str, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if user.avatar_url:
-        user.avatar_url = f"{MINIO_PUBLIC_URL}/{bucket_name}/{user.avatar_url}"
-
-    return user
+    return to_user_out(user, DETAIL_AVATAR_SIZE)
 
 
 @router.post("/", response_model=UserOut)
@@ -101,38 +297,12 @@ async def create_user(
     gender: Optional[str] = Form(None),
     role: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
 
-    if db.query(User).filter(User.email == email).first():
+    if await db.scalar(select(User.id).where(User.email == email)):
         raise HTTPException(status_code=400, detail="Email already exists")
 
-    avatar_object_name = None
-    if file:
-        ext = file.filename.split('.')[-1].lower()
-        if ext not in ("jpg", "jpeg", "png", "gif"):
-            raise HTTPException(status_code=400, detail="Invalid image type")
-
-        # Always use username as object name (overwrite if exists)
-        object_name = f"{username}.{ext}"
-        contents = await file.read()
-        stream = io.BytesIO(contents)
-
-        # Remove old avatar if exists (for create, usually not needed, but safe)
-        try:
-            minio_client.remove_object(bucket_name, object_name)
-        except S3Error:
-            pass
-
-        try:
-            minio_client.put_object(
-                bucket_name=bucket_name, object_name=object_name,
-                data=stream, length=len(contents), content_type=file.content_type
-            )
-            avatar_object_name = object_name
-        except S3Error as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload image: {e}")
-
     birth_date_dt = None
     if birth_date:
         try:
@@ -140,8 +310,15 @@ async def create_user(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid birth_date format. Use YYYY-MM-DD.")
 
+    # สร้าง id ก่อน เพื่อใช้ตั้งชื่อไฟล์ avatar ให้เหมือนตอน update
+    user_id = str(uuid.uuid4())
+    avatar_object_name = None
+    if file:
+        ext = avatar_extension(file)
+        avatar_object_name = await upload_avatar(file, f"{user_id}.{ext}")
+
     new_user = User(
-        first_name=first_name, last_name=last_name, username=username,
+        id=user_id, first_name=first_name, last_name=last_name, username=username,
         email=email, citizen_id=citizen_id, mobile_no=mobile_no,
         address=address, display_name=display_name, department=department,
         avatar_url=avatar_object_name, title=title, middle_name=middle_name,
@@ -149,13 +326,14 @@ async def create_user(
         role=role, created_by="admin", updated_by="admin"
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
+    await db.commit()
+    invalidate_user_counts()
+    await db.refresh(new_user)
+
     if new_user.avatar_url:
-        new_user.avatar_url = f"{MINIO_PUBLIC_URL}/{bucket_name}/{new_user.avatar_url}"
+        avatar_pipeline.submit(new_user.id, new_user.avatar_url)
 
-    return new_user
+    return to_user_out(new_user, DETAIL_AVATAR_SIZE)
 
 
 @router.put("/{user_id}", response_model=UserOut)
@@ -177,41 +355,28 @@ async def update_user(
     gender: Optional[str] = Form(None),
     role: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if email and email != user.email:
-        if db.query(User).filter(User.email == email).first():
+        if await db.scalar(select(User.id).where(User.email == email)):
             raise HTTPException(status_code=400, detail="Email already exists")
 
+    old_avatar = None
+    old_variants = {}
     if file:
-        ext = file.filename.split('.')[-1].lower()
-        if ext not in ("jpg", "jpeg", "png", "gif"):
-            raise HTTPException(status_code=400, detail="Invalid image type")
-
-        # Always use user.id as object name (overwrite if exists)
-        object_name = f"{user.id}.{ext}"
-        contents = await file.read()
-        stream = io.BytesIO(contents)
-
-        # Remove old avatar if exists
-        if user.avatar_url:
-            try:
-                minio_client.remove_object(bucket_name, user.avatar_url)
-            except S3Error:
-                pass
-
-        try:
-            minio_client.put_object(
-                bucket_name=bucket_name, object_name=object_name,
-                data=stream, length=len(contents), content_type=file.content_type
-            )
-            user.avatar_url = object_name
-        except S3Error as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload image: {e}")
+        ext = avatar_extension(file)
+        # Always use user.id as object name: put ทับไฟล์เดิมได้ในครั้งเดียว ไม่ต้องลบก่อน
+        object_name = await upload_avatar(file, f"{user.id}.{ext}")
+        if user.avatar_url and user.avatar_url != object_name:
+            old_avatar = user.avatar_url
+        user.avatar_url = object_name
+        # รูปย่อชุดเดิมใช้ไม่ได้แล้ว ระหว่างรอสร้างชุดใหม่ให้ใช้รูปต้นฉบับไปก่อน
+        old_variants = user.avatar_variants or {}
+        user.avatar_variants = None
 
     update_data = {
         k: v for k, v in {
@@ -234,28 +399,34 @@ async def update_user(
     
     user.updated_by = "admin"
 
-    db.commit()
-    db.refresh(user)
-    
-    if user.avatar_url:
-        user.avatar_url = f"{MINIO_PUBLIC_URL}/{bucket_name}/{user.avatar_url}"
+    await db.commit()
+    invalidate_user_counts()
+    await db.refresh(user)
 
-    return user
+    # ไฟล์เดิมคนละนามสกุล (หรือตั้งชื่อแบบเก่า) ลบหลังบันทึกไฟล์ใหม่สำเร็จแล้ว
+    if old_avatar:
+        await remove_object(old_avatar)
+    for name in old_variants.values():
+        await remove_object(name)
+    if file:
+        avatar_pipeline.submit(user.id, user.avatar_url)
+
+    return to_user_out(user, DETAIL_AVATAR_SIZE)
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: str, db: Session = Depends(get_db)):
+async def delete_user(user_id: str, db: AsyncSession = Depends(get_db)):
     # ส่วนนี้เหมือนเดิม ไม่ต้องแก้ไข
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if user.avatar_url:
-        try:
-            minio_client.remove_object(bucket_name, user.avatar_url)
-        except S3Error as e:
-            print(f"Error deleting object {user.avatar_url} from MinIO: {e}")
+        await remove_object(user.avatar_url)
+    for name in (user.avatar_variants or {}).values():
+        await remove_object(name)
 
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    invalidate_user_counts()
     return {"message": "User deleted successfully"}
\ No newline at end of file
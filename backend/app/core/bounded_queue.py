@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+OVERFLOW_POLICIES = ("reject", "drop_oldest", "spill")
+
+
+class SpillFile:
+    """FIFO of JSON items appended to a file once the in-memory queue is full.
+
+    Items are read back in order from a moving offset; the file is truncated
+    whenever it has been read to the end, so it only ever holds the backlog.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.size = 0
+        self._read_offset = 0
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            # ไฟล์จากการรันครั้งก่อนไม่มีใครอ่านแล้ว เริ่มใหม่ทุกครั้ง
+            self._file = open(self.path, "w+b")
+        return self._file
+
+    def append(self, item: Any) -> None:
+        f = self._open()
+        f.seek(0, os.SEEK_END)
+        f.write(json.dumps(item, separators=(",", ":")).encode() + b"\n")
+        self.size += 1
+
+    def pop(self) -> Any:
+        f = self._open()
+        f.flush()
+        f.seek(self._read_offset)
+        line = f.readline()
+        self._read_offset = f.tell()
+        self.size -= 1
+        if self.size == 0:
+            self.clear()
+        return json.loads(line)
+
+    def clear(self) -> int:
+        count = self.size
+        if self._file is not None:
+            self._file.truncate(0)
+        self.size = 0
+        self._read_offset = 0
+        return count
+
+
+class BoundedQueue:
+    """asyncio.Queue with a size limit and a policy for what happens when it is full.
+
+    - "reject": `put_nowait()` raises asyncio.QueueFull and the caller tells the client to retry later.
+    - "drop_oldest": the oldest queued item is discarded to make room (counted in `dropped`).
+    - "spill": extra items go to a SpillFile on disk and are moved back as the queue drains.
+
+    Items are wrapped with their enqueue time so `stats()` can report how long they waited.
+    `get()` returns `(receipt, item)` like DurableQueue; the receipt is always None here.
+    """
+
+    durable = False
+
+    def __init__(self, maxsize: int, policy: str = "reject", spill_path: Optional[str] = None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy} (choose from {', '.join(OVERFLOW_POLICIES)})")
+        if policy == "spill" and not spill_path:
+            raise ValueError("spill policy needs a spill_path")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._queue: Optional[asyncio.Queue] = None
+        self._spill = SpillFile(spill_path) if policy == "spill" else None
+        self.enqueued = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.dequeued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        return self._queue
+
+    def qsize(self) -> int:
+        return self.queue.qsize() + (self._spill.size if self._spill else 0)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def put(self, item: Any) -> None:
+        self.put_nowait(item)
+
+    def put_nowait(self, item: Any) -> None:
+        entry = (time.time(), item)
+        queue = self.queue
+        # ถ้ามีของค้างในไฟล์อยู่ ของใหม่ต้องต่อท้ายไฟล์ด้วย ไม่งั้นจะแซงคิว
+        if self._spill is not None and self._spill.size:
+            self._spill.append(entry)
+            self.spilled += 1
+        elif not queue.full():
+            queue.put_nowait(entry)
+        elif self.policy == "reject":
+            self.rejected += 1
+            raise asyncio.QueueFull()
+        elif self.policy == "drop_oldest":
+            queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+            queue.put_nowait(entry)
+        else:
+            self._spill.append(entry)
+            self.spilled += 1
+        self.enqueued += 1
+
+    def _refill(self) -> None:
+        # ย้ายของจากไฟล์กลับเข้าคิวในหน่วยความจำเท่าที่มีที่ว่าง (อ่านไฟล์ต่อเนื่อง ผ่าน page cache)
+        queue = self.queue
+        while self._spill.size and not queue.full():
+            enqueued_at, item = self._spill.pop()
+            queue.put_nowait((enqueued_at, item))
+
+    def _unwrap(self, entry) -> Any:
+        enqueued_at, item = entry
+        wait = max(0.0, time.time() - enqueued_at)
+        self.dequeued += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.last_wait = wait
+        if self._spill is not None and self._spill.size:
+            self._refill()
+        return item
+
+    async def get(self) -> Tuple[None, Any]:
+        return None, self._unwrap(await self.queue.get())
+
+    def task_done(self, receipt: None = None) -> None:
+        self.queue.task_done()
+
+    def release(self, receipt: None, item: Any) -> None:
+        # คิวในหน่วยความจำไม่มีอะไรต้องเก็บไว้ข้าม restart แค่ปิดรายการนี้ (ยังไม่ได้ส่งก็ตาม)
+        self.queue.task_done()
+
+    async def join(self) -> None:
+        await self.queue.join()
+
+    async def clear(self) -> int:
+        """Discards everything queued (in memory and spilled) and returns how many items that was."""
+        count = self._spill.clear() if self._spill is not None else 0
+        queue = self.queue
+        while not queue.empty():
+            queue.get_nowait()
+            queue.task_done()
+            count += 1
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "policy": self.policy,
+            "max_size": self.maxsize,
+            "depth": self.queue.qsize(),
+            "spilled_depth": self._spill.size if self._spill else 0,
+            "enqueued": self.enqueued,
+            "dequeued": self.dequeued,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "average_wait_ms": round(self.total_wait / self.dequeued * 1000, 3) if self.dequeued else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "last_wait_ms": round(self.last_wait * 1000, 3),
+        }
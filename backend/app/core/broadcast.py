@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+OVERFLOW_POLICIES = ("evict", "coalesce")
+
+
+class ClientConnection:
+    """One WebSocket client: its bounded send queue, writer task and health counters."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: Optional[asyncio.Task] = None
+        self.connected_at = time.monotonic()
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_send_ms = 0.0
+        self.max_send_ms = 0.0
+        self.error: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "queue_depth": self.queue.qsize(),
+            "connected_seconds": round(time.monotonic() - self.connected_at, 1),
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "last_send_ms": self.last_send_ms,
+            "max_send_ms": self.max_send_ms,
+        }
+
+
+class ConnectionManager:
+    """Broadcasts JSON messages to WebSocket clients without letting one slow client hold up the rest.
+
+    Each message is serialized once; every client gets the same text on its own bounded
+    queue, drained by its own writer task, so `broadcast_json()` never awaits a socket.
+    When a client's queue is full it is either evicted ("evict") or its queued log batches
+    are merged into fewer frames ("coalesce"; the oldest frames are dropped if that is not
+    enough). A send that takes longer than `send_timeout` disconnects the client.
+    """
+
+    def __init__(self, max_queue: int = 100, overflow: str = "coalesce", send_timeout: float = 5.0,
+                 max_frame_bytes: int = 1024 * 1024):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow} (choose from {', '.join(OVERFLOW_POLICIES)})")
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.send_timeout = send_timeout
+        self.max_frame_bytes = max_frame_bytes
+        # เก็บ client ที่เชื่อมต่ออยู่ (key = WebSocket)
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.broadcasts = 0
+        self.bytes_serialized = 0
+        self.evicted = 0
+        self.send_errors = 0
+        self.total_connections = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        # เมื่อมี client ใหม่เชื่อมต่อเข้ามา: สร้างคิวและ task สำหรับส่งข้อมูลของ client นี้
+        await websocket.accept()
+        client = ClientConnection(websocket, self.max_queue)
+        client.task = asyncio.create_task(self._writer(client))
+        self.clients[websocket] = client
+        self.total_connections += 1
+
+    def disconnect(self, websocket: WebSocket):
+        # เมื่อ client ตัดการเชื่อมต่อ (เรียกซ้ำได้ เช่น หลังจากถูก evict ไปแล้ว)
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def _writer(self, client: ClientConnection):
+        try:
+            while True:
+                text = await client.queue.get()
+                start = time.perf_counter()
+                await asyncio.wait_for(client.websocket.send_text(text), timeout=self.send_timeout)
+                elapsed = round((time.perf_counter() - start) * 1000, 3)
+                client.sent += 1
+                client.bytes_sent += len(text)
+                client.last_send_ms = elapsed
+                client.max_send_ms = max(client.max_send_ms, elapsed)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # ส่งไม่ได้หรือช้าเกิน send_timeout: ถือว่า client นี้ใช้ไม่ได้แล้ว
+            client.error = repr(e)
+            self.send_errors += 1
+        finally:
+            self.disconnect(client.websocket)
+            try:
+                await client.websocket.close()
+            except Exception:
+                pass
+
+    def _evict(self, client: ClientConnection) -> None:
+        self.evicted += 1
+        if client.task is not None:
+            client.task.cancel()
+        self.clients.pop(client.websocket, None)
+
+    def _coalesce(self, client: ClientConnection, text: str) -> None:
+        # รวม frame ที่เป็น list ของ log ที่ติดกันเข้าเป็น frame เดียว (ไม่เกิน max_frame_bytes)
+        frames = []
+        while not client.queue.empty():
+            frames.append(client.queue.get_nowait())
+        frames.append(text)
+        merged: List[str] = []
+        for frame in frames:
+            last = merged[-1] if merged else None
+            if (last is not None and last.startswith("[") and frame.startswith("[") and len(last) > 2
+                    and len(frame) > 2 and len(last) + len(frame) <= self.max_frame_bytes):
+                merged[-1] = last[:-1] + "," + frame[1:]
+                client.coalesced += 1
+            else:
+                merged.append(frame)
+        # ถ้ารวมแล้วยังเกินคิว ทิ้ง frame เก่าสุด
+        while len(merged) > self.max_queue:
+            merged.pop(0)
+            client.dropped += 1
+        for frame in merged:
+            client.queue.put_nowait(frame)
+
+    async def broadcast_json(self, data):
+        # แปลงเป็น JSON ครั้งเดียว แล้วใส่คิวของทุก client (ไม่รอการส่งจริง)
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self.broadcasts += 1
+        self.bytes_serialized += len(text)
+        for client in list(self.clients.values()):
+            try:
+                client.queue.put_nowait(text)
+            except asyncio.QueueFull:
+                if self.overflow == "evict":
+                    self._evict(client)
+                else:
+                    self._coalesce(client, text)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.clients),
+            "total_connections": self.total_connections,
+            "overflow": self.overflow,
+            "max_queue": self.max_queue,
+            "broadcasts": self.broadcasts,
+            "bytes_serialized": self.bytes_serialized,
+            "evicted": self.evicted,
+            "send_errors": self.send_errors,
+            "clients": [client.stats() for client in self.clients.values()],
+        }
@@ -1,7 +1,5 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
 
 load_dotenv()
 
@@ -9,6 +7,125 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
 SECRET_KEY = "delta"
 ALGORITHM = "HS256"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+
+# ขนาดและอายุของ cache สำหรับ short_key (ใช้ใน app/api/urlshorten.py)
+URL_CACHE_MAX_SIZE = int(os.getenv("URL_CACHE_MAX_SIZE", "10000"))
+URL_CACHE_TTL_SECONDS = float(os.getenv("URL_CACHE_TTL_SECONDS", "300"))
+
+# รอบเวลาในการเขียน clicks ที่สะสมไว้ลงฐานข้อมูล (วินาที)
+CLICK_FLUSH_INTERVAL_SECONDS = float(os.getenv("CLICK_FLUSH_INTERVAL_SECONDS", "5"))
+
+# GET /r/{short_key}: 302 ให้ทุก click ผ่าน server, 301 ให้ browser/CDN จำ redirect ไว้เลย
+REDIRECT_STATUS_CODE = int(os.getenv("REDIRECT_STATUS_CODE", "302"))
+REDIRECT_CACHE_MAX_AGE = int(os.getenv("REDIRECT_CACHE_MAX_AGE", "60"))
+
+# วิธีสร้าง short_key: random (ค่าเริ่มต้น เดาไม่ได้), block (จอง id เป็นช่วงจากฐานข้อมูล) หรือ snowflake
+# block และ snowflake ได้ key เรียงต่อกันซึ่งเดาลำดับได้ จึงต้องเลือกเอง
+SHORT_KEY_STRATEGY = os.getenv("SHORT_KEY_STRATEGY", "random")
+# worker id ของ snowflake (0-255) ต้องไม่ซ้ำกันในทุก process ทุกเครื่อง บังคับตั้งเมื่อใช้ snowflake
+SHORT_KEY_WORKER_ID = int(os.environ["SHORT_KEY_WORKER_ID"]) if os.getenv("SHORT_KEY_WORKER_ID") else None
+SHORT_KEY_BLOCK_SIZE = int(os.getenv("SHORT_KEY_BLOCK_SIZE", "1000"))
+
+# POST /api/v1/urlshorten/bulk: จำนวนรายการสูงสุดต่อ request และขนาดชุดของแต่ละ INSERT
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "100000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# คิว audit log: ขนาดคิว, ขนาด batch, รอบเวลา flush และนโยบายเมื่อคิวเต็ม (block / drop)
+AUDIT_QUEUE_MAX_SIZE = int(os.getenv("AUDIT_QUEUE_MAX_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+AUDIT_QUEUE_POLICY = os.getenv("AUDIT_QUEUE_POLICY", "block")
+
+# cache จำนวน user สำหรับ total_pages ของ GET /api/v1/user/ (ล้างเมื่อมีการเพิ่ม/แก้ไข/ลบ user)
+USER_COUNT_CACHE_MAX_SIZE = int(os.getenv("USER_COUNT_CACHE_MAX_SIZE", "1024"))
+USER_COUNT_CACHE_TTL_SECONDS = float(os.getenv("USER_COUNT_CACHE_TTL_SECONDS", "60"))
+
+# POST /api/v1/user/import: จำนวนแถวสูงสุดต่อ request และขนาดชุดของการตรวจซ้ำ/INSERT
+USER_IMPORT_MAX_ROWS = int(os.getenv("USER_IMPORT_MAX_ROWS", "100000"))
+USER_IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "1000"))
+
+# ที่เก็บไฟล์ (avatar): minio หรือ local (โฟลเดอร์ในเครื่อง เสิร์ฟที่ /media ใช้ตอนรันเครื่องตัวเองโดยไม่มี MinIO)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio")
+MINIO_PUBLIC_URL = os.getenv("MINIO_PUBLIC_URL", "http://localhost:9000")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+LOCAL_STORAGE_PUBLIC_URL = os.getenv("LOCAL_STORAGE_PUBLIC_URL", "http://localhost:8000/media")
+# เตรียม storage เบื้องหลังหลังแอปเริ่ม (สร้าง bucket): จำนวนครั้งที่ลอง และเวลารอสูงสุดต่อครั้ง (วินาที)
+STORAGE_INIT_RETRIES = int(os.getenv("STORAGE_INIT_RETRIES", "3"))
+STORAGE_INIT_TIMEOUT_SECONDS = float(os.getenv("STORAGE_INIT_TIMEOUT_SECONDS", "5"))
+
+# รูป avatar: ขนาดไฟล์สูงสุด และขนาดแต่ละ part ตอนอัปโหลดแบบ multipart (MinIO กำหนดขั้นต่ำ 5 MiB)
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_PART_SIZE = int(os.getenv("AVATAR_PART_SIZE", str(5 * 1024 * 1024)))
+
+# สร้างรูปย่อของ avatar เบื้องหลัง: จำนวน thread, ขนาดคิว และรูปแบบไฟล์ (webp / jpeg)
+AVATAR_VARIANT_WORKERS = int(os.getenv("AVATAR_VARIANT_WORKERS", "2"))
+AVATAR_VARIANT_MAX_QUEUE = int(os.getenv("AVATAR_VARIANT_MAX_QUEUE", "100"))
+AVATAR_VARIANT_FORMAT = os.getenv("AVATAR_VARIANT_FORMAT", "webp")
+
+# algorithm ของ rate limit ของ Echo Service (fixed_window, token_bucket, gcra, sliding_log, sliding_counter)
+ECHO_RATE_LIMIT_ALGORITHM = os.getenv("ECHO_RATE_LIMIT_ALGORITHM", "gcra")
+
+# Throttle Service: จำนวน request ที่ส่งต่อไป Echo พร้อมกันได้สูงสุด (in-flight)
+THROTTLE_CONCURRENCY = int(os.getenv("THROTTLE_CONCURRENCY", "32"))
+
+# HTTP client ที่ใช้ร่วมกันของ simulation (Caller และ Throttle): จำนวน connection สูงสุดรวม / ต่อ host,
+# เวลาที่เก็บ connection ว่างไว้ใช้ซ้ำ (ต้องน้อยกว่า keep-alive ของ server; uvicorn = 5 วินาที), อายุ DNS cache และ timeout
+HTTP_CLIENT_MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "300"))
+HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST", "256"))
+HTTP_CLIENT_KEEPALIVE_SECONDS = float(os.getenv("HTTP_CLIENT_KEEPALIVE_SECONDS", "4"))
+HTTP_CLIENT_DNS_TTL_SECONDS = int(os.getenv("HTTP_CLIENT_DNS_TTL_SECONDS", "300"))
+HTTP_CLIENT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CLIENT_TIMEOUT_SECONDS", "30"))
+# Caller: จำนวน request ที่ยิงไป Throttle Service พร้อมกันได้สูงสุด
+# (รวมกับ THROTTLE_CONCURRENCY แล้วไม่ควรเกิน HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST)
+SIMULATION_CALLER_CONCURRENCY = int(os.getenv("SIMULATION_CALLER_CONCURRENCY", "200"))
+
+# ส่งซ้ำเมื่อ Echo ตอบ 429/5xx หรือเชื่อมต่อไม่ได้: จำนวนครั้งสูงสุด, backoff (วินาที) และขนาด dead-letter queue
+THROTTLE_MAX_RETRIES = int(os.getenv("THROTTLE_MAX_RETRIES", "5"))
+THROTTLE_RETRY_BASE_SECONDS = float(os.getenv("THROTTLE_RETRY_BASE_SECONDS", "0.5"))
+THROTTLE_RETRY_MAX_SECONDS = float(os.getenv("THROTTLE_RETRY_MAX_SECONDS", "30"))
+THROTTLE_DEAD_LETTER_MAX = int(os.getenv("THROTTLE_DEAD_LETTER_MAX", "10000"))
+# อัตราสูงสุดของการส่งซ้ำ (ครั้ง/นาที) ควรเท่ากับที่ Echo รับได้: รายการที่รอส่งซ้ำได้ช่องเวลาคนละช่อง
+# ยิ่งรอมากยิ่งต้องรอนาน แทนที่จะกลับมาพร้อมกันหลัง Retry-After แล้วใช้จำนวนครั้งหมดในไม่กี่วินาที
+THROTTLE_RETRY_RATE_PER_MINUTE = float(os.getenv("THROTTLE_RETRY_RATE_PER_MINUTE", "512"))
+
+# คิวของ Throttle Service: ขนาดสูงสุด และสิ่งที่ทำเมื่อคิวเต็ม (reject, drop_oldest, spill ลงไฟล์)
+THROTTLE_QUEUE_MAX_SIZE = int(os.getenv("THROTTLE_QUEUE_MAX_SIZE", "10000"))
+THROTTLE_QUEUE_OVERFLOW = os.getenv("THROTTLE_QUEUE_OVERFLOW", "reject")
+THROTTLE_QUEUE_SPILL_PATH = os.getenv("THROTTLE_QUEUE_SPILL_PATH", "throttle_spill.ndjson")
+# memory = คิวในหน่วยความจำ (หายเมื่อ restart), sqlite = คิวบนดิสก์ (SQLite WAL) ส่งต่อรายการที่ค้างหลัง restart
+THROTTLE_QUEUE_BACKEND = os.getenv("THROTTLE_QUEUE_BACKEND", "memory")
+THROTTLE_DURABLE_QUEUE_PATH = os.getenv("THROTTLE_DURABLE_QUEUE_PATH", "throttle_queue.db")
+THROTTLE_DURABLE_QUEUE_MAX_SIZE = int(os.getenv("THROTTLE_DURABLE_QUEUE_MAX_SIZE", "1000000"))
+# หน้าต่างรวม put ที่เข้ามาใกล้ๆ กันเป็น commit (fsync) เดียว: ยาวขึ้น = batch ใหญ่ขึ้น แต่ 202 ตอบช้าลงเท่านั้น
+THROTTLE_DURABLE_QUEUE_COMMIT_WINDOW_MS = float(os.getenv("THROTTLE_DURABLE_QUEUE_COMMIT_WINDOW_MS", "20"))
+
+# log ของ simulation: ขนาดคิว (เกินแล้วทิ้ง), รอบการส่ง log เป็นชุดทาง WebSocket และ level ของแต่ละปลายทาง
+LOG_QUEUE_MAX_SIZE = int(os.getenv("LOG_QUEUE_MAX_SIZE", "10000"))
+LOG_WS_BATCH_INTERVAL_MS = int(os.getenv("LOG_WS_BATCH_INTERVAL_MS", "100"))
+LOG_WS_MAX_PENDING = int(os.getenv("LOG_WS_MAX_PENDING", "5000"))
+LOG_CONSOLE_LEVEL = os.getenv("LOG_CONSOLE_LEVEL", "INFO").upper()
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "INFO").upper()
+LOG_WS_LEVEL = os.getenv("LOG_WS_LEVEL", "INFO").upper()
+# หมุนไฟล์ simulation.log เมื่อใหญ่เกินขนาดนี้ และเก็บไฟล์เก่าไว้กี่ไฟล์
+LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_FILE_BACKUP_COUNT = int(os.getenv("LOG_FILE_BACKUP_COUNT", "3"))
+# สัดส่วนของ log ระดับต่ำกว่า WARNING ที่ส่งทาง /ws/logs (1.0 = ทั้งหมด)
+LOG_WS_SAMPLE_RATE = float(os.getenv("LOG_WS_SAMPLE_RATE", "1.0"))
+# รอบการส่งสรุป metrics ทาง /ws/metrics
+METRICS_INTERVAL_MS = int(os.getenv("METRICS_INTERVAL_MS", "1000"))
+
+# WebSocket: ขนาดคิวส่งของแต่ละ client, สิ่งที่ทำเมื่อคิวเต็ม (evict, coalesce) และเวลาสูงสุดที่รอส่ง 1 frame
+WS_CLIENT_QUEUE_MAX = int(os.getenv("WS_CLIENT_QUEUE_MAX", "100"))
+WS_CLIENT_OVERFLOW = os.getenv("WS_CLIENT_OVERFLOW", "coalesce")
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", str(1024 * 1024)))
+
+# connection pool ของฐานข้อมูล (ต่อ 1 process ของ uvicorn: workers x (pool + overflow) ต้องไม่เกิน max_connections)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# cache ของ SQL ที่ compile แล้วใน SQLAlchemy และ prepared statement ต่อ connection ของ asyncpg (0 = ปิด เช่นเมื่อใช้ pgbouncer)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.bounded_queue import BoundedQueue
+
+
+class DurableQueue:
+    """Persistent FIFO in an SQLite database in WAL mode, with the same interface as BoundedQueue.
+
+    - `put()` returns only after the item is committed (and fsynced). The first put after a
+      commit opens a batch window: puts (and acks) that keep arriving go into the same
+      transaction until `flush_interval` seconds have passed, `batch_size` items are
+      waiting, or nothing new arrives for `quiet_interval` seconds.
+    - `get()` returns `(receipt, item)`. The row stays in the database until
+      `task_done(receipt)`; acks are deleted in the next group commit. `release(receipt, item)`
+      hands an item that was taken but not processed back to the front of the queue.
+    - `start()` replays every row left from a previous run: anything that was not acked
+      (including items that were in flight when the process died) is delivered again.
+
+    All SQLite calls run on one dedicated thread, so the event loop never blocks on disk.
+    """
+
+    durable = True
+
+    def __init__(self, path: str, maxsize: int = 0, flush_interval: float = 0.02, batch_size: int = 1000,
+                 buffer_size: int = 1000, quiet_interval: float = 0.002):
+        self.path = os.path.abspath(path)
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.quiet_interval = quiet_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = False
+        # รอ commit: (id, enqueued_at, payload, future) และ id ที่ ack แล้วรอลบ
+        self._pending: List[Tuple[int, float, str, asyncio.Future]] = []
+        self._pending_acks: List[int] = []
+        self._has_pending = asyncio.Event()
+        self._not_empty = asyncio.Event()
+        # รายการที่อ่านจาก DB มาพักไว้ในหน่วยความจำ (ไม่เกิน buffer_size)
+        self._buffer: deque = deque()
+        self._next_id = 1
+        self._committed_id = 0
+        self._read_cursor = 0
+        self._size = 0
+        # รายการที่ get() ไปแล้วแต่ยังไม่ ack: id -> (enqueued_at, generation ตอน get)
+        self._leased: Dict[int, Tuple[float, int]] = {}
+        # เพิ่มทุกครั้งที่ clear() ผลของ write/read ที่เริ่มก่อนหน้านั้นจะไม่ถูกนับ
+        self._generation = 0
+        self.replayed = 0
+        self.enqueued = 0
+        self.dequeued = 0
+        self.rejected = 0
+        self.commits = 0
+        self.put_commits = 0
+        self.committed_rows = 0
+        self.last_commit_ms = 0.0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    # --- ทำงานใน thread ของ SQLite เท่านั้น ---
+
+    def _open(self) -> Tuple[int, int]:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: fsync WAL ทุกครั้งที่ commit (ครั้งละหลายรายการ จึงไม่ช้า)
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY, enqueued_at REAL NOT NULL, payload TEXT NOT NULL)")
+        self._conn = conn
+        count, max_id = conn.execute("SELECT count(*), coalesce(max(id), 0) FROM queue").fetchone()
+        return count, max_id
+
+    def _write(self, rows: List[Tuple[int, float, str]], acks: List[int]) -> None:
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            if rows:
+                conn.executemany("INSERT INTO queue (id, enqueued_at, payload) VALUES (?, ?, ?)", rows)
+            if acks:
+                conn.executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in acks])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _read(self, after_id: int, limit: int) -> List[Tuple[int, float, str]]:
+        return self._conn.execute(
+            "SELECT id, enqueued_at, payload FROM queue WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        ).fetchall()
+
+    def _delete_all(self) -> None:
+        self._conn.execute("DELETE FROM queue")
+
+    def _close(self) -> None:
+        self._conn.close()
+        self._conn = None
+
+    # --- ฝั่ง event loop ---
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def start(self) -> None:
+        if self._flusher is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="durable-queue")
+        count, max_id = await self._run(self._open)
+        self._size = self.replayed = count
+        self._committed_id = max_id
+        self._next_id = max_id + 1
+        self._read_cursor = 0
+        self._has_pending = asyncio.Event()
+        self._not_empty = asyncio.Event()
+        self._stopping = False
+        if count:
+            print(f"🔁 Durable queue: replaying {count} unacknowledged items from {self.path}")
+            self._not_empty.set()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is None:
+            return
+        # ไม่ cancel กลางการเขียน: ให้ flush loop จบรอบของตัวเอง แล้วเขียนรายการและ ack ที่เหลือให้หมด
+        self._stopping = True
+        self._has_pending.set()
+        await self._flusher
+        self._flusher = None
+        await self._flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        acks, self._pending_acks = self._pending_acks, []
+        if not pending and not acks:
+            return
+        start = time.perf_counter()
+        generation = self._generation
+        try:
+            await self._run(self._write, [(i, t, payload) for i, t, payload, _ in pending], acks)
+        except Exception as e:
+            for *_, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            # ack ที่ยังไม่ได้ลบ ลองใหม่รอบหน้า (ถ้าไม่สำเร็จเลย รายการจะถูกส่งซ้ำหลัง restart)
+            self._pending_acks = acks + self._pending_acks
+            self._has_pending.set()
+            return
+        self.commits += 1
+        if pending:
+            self.put_commits += 1
+        self.committed_rows += len(pending)
+        self.last_commit_ms = round((time.perf_counter() - start) * 1000, 3)
+        if pending and generation == self._generation:
+            self._committed_id = max(self._committed_id, pending[-1][0])
+            self._size += len(pending)
+            self._not_empty.set()
+        for *_, future in pending:
+            if not future.done():
+                future.set_result(None)
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            # รอจนมีอะไรให้เขียน แล้วเปิดหน้าต่างรวม put/ack ที่ตามมาให้อยู่ใน commit เดียวกัน
+            await self._has_pending.wait()
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.flush_interval
+            while not self._stopping and len(self._pending) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._has_pending.clear()
+                try:
+                    await asyncio.wait_for(self._has_pending.wait(), timeout=min(self.quiet_interval, remaining))
+                except asyncio.TimeoutError:
+                    # ไม่มี put ใหม่มาช่วงหนึ่งแล้ว (เช่น ผู้เรียกทุกตัวรอ commit อยู่) เขียนเลยไม่ต้องรอจนหมดหน้าต่าง
+                    break
+            self._has_pending.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                print(f"❌ Durable queue flush failed: {e}")
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    async def put(self, item: Any) -> None:
+        """Stores `item` and returns once it has been committed to disk."""
+        if self._flusher is None:
+            raise RuntimeError("DurableQueue.start() has not been called")
+        if self.maxsize and self._size + len(self._pending) >= self.maxsize:
+            self.rejected += 1
+            raise asyncio.QueueFull()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((self._next_id, time.time(), json.dumps(item, separators=(",", ":")), future))
+        self._next_id += 1
+        self.enqueued += 1
+        self._has_pending.set()
+        await future
+
+    async def _refill(self) -> None:
+        generation = self._generation
+        rows = await self._run(self._read, self._read_cursor, self.buffer_size - len(self._buffer))
+        if generation != self._generation:
+            return
+        for row_id, enqueued_at, payload in rows:
+            self._buffer.append((row_id, enqueued_at, json.loads(payload)))
+        if rows:
+            self._read_cursor = rows[-1][0]
+
+    async def get(self) -> Tuple[int, Any]:
+        while not self._buffer:
+            if self._read_cursor < self._committed_id:
+                await self._refill()
+                if self._buffer:
+                    break
+                # ไม่มีแถวเหลือเกิน cursor (ถูก clear ไปแล้ว)
+                self._read_cursor = self._committed_id
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        row_id, enqueued_at, item = self._buffer.popleft()
+        wait = max(0.0, time.time() - enqueued_at)
+        self._size -= 1
+        self._leased[row_id] = (enqueued_at, self._generation)
+        self.dequeued += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.last_wait = wait
+        return row_id, item
+
+    def task_done(self, receipt: int = None) -> None:
+        # ack: ลบแถวออกใน group commit ถัดไป
+        if self._leased.pop(receipt, None) is not None:
+            self._pending_acks.append(receipt)
+            self._has_pending.set()
+
+    def release(self, receipt: int, item: Any) -> None:
+        # ยังไม่ได้ส่ง: ไม่ลบออกจาก DB และส่งกลับไปหัวคิว (ถ้า process ปิดก่อน จะถูกส่งใหม่หลัง restart)
+        lease = self._leased.pop(receipt, None)
+        # รายการที่ get ไปก่อน clear() ถูกลบไปแล้ว ไม่ต้องคืน
+        if lease is not None and lease[1] == self._generation:
+            self._buffer.appendleft((receipt, lease[0], item))
+            self._size += 1
+            self._not_empty.set()
+
+    async def clear(self) -> int:
+        """Discards everything queued (buffered, on disk and waiting to be written)."""
+        count = self._size + len(self._pending)
+        for *_, future in self._pending:
+            if not future.done():
+                future.set_result(None)
+        self._pending = []
+        self._buffer.clear()
+        self._generation += 1
+        # แถวที่กำลังส่งอยู่ถูกลบด้วย ack/release ของมันจึงไม่ต้องทำอะไร (ล้างก่อน await ไม่ให้ release แทรกได้)
+        self._leased.clear()
+        await self._run(self._delete_all)
+        self._size = 0
+        self._read_cursor = self._committed_id
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "max_size": self.maxsize,
+            "depth": self._size,
+            "buffered": len(self._buffer),
+            "unacked": len(self._leased),
+            "pending_writes": len(self._pending),
+            "pending_acks": len(self._pending_acks),
+            "replayed": self.replayed,
+            "enqueued": self.enqueued,
+            "dequeued": self.dequeued,
+            "rejected": self.rejected,
+            "commits": self.commits,
+            # จำนวน put ต่อ commit (ไม่นับ commit ที่มีแต่ ack)
+            "average_batch": round(self.committed_rows / self.put_commits, 1) if self.put_commits else 0.0,
+            "last_commit_ms": self.last_commit_ms,
+            "average_wait_ms": round(self.total_wait / self.dequeued * 1000, 3) if self.dequeued else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "last_wait_ms": round(self.last_wait * 1000, 3),
+        }
+
+
+def create_request_queue(backend: str, maxsize: int, overflow: str, spill_path: str, durable_path: str, durable_maxsize: int,
+                         durable_commit_window: float = 0.02):
+    if backend == "memory":
+        return BoundedQueue(maxsize, overflow, spill_path)
+    if backend == "sqlite":
+        return DurableQueue(durable_path, durable_maxsize, flush_interval=durable_commit_window)
+    raise ValueError(f"Unknown queue backend: {backend}")
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, Coroutine, Dict, Optional, Set
+
+import aiohttp
+
+
+class PoolTracer:
+    """Counts connection-pool events of a ClientSession through aiohttp's TraceConfig hooks."""
+
+    def __init__(self):
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_request_start)
+        self.trace_config.on_request_end.append(self._on_request_done)
+        self.trace_config.on_request_exception.append(self._on_request_done)
+        self.trace_config.on_connection_queued_start.append(self._on_queued_start)
+        self.trace_config.on_connection_queued_end.append(self._on_queued_end)
+        self.trace_config.on_connection_create_end.append(self._on_create_end)
+        self.trace_config.on_connection_reuseconn.append(self._on_reuse)
+        self.trace_config.on_dns_cache_hit.append(self._on_dns_hit)
+        self.trace_config.on_dns_cache_miss.append(self._on_dns_miss)
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.waiting = 0
+        self.waits = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    async def _on_request_start(self, session, ctx: SimpleNamespace, params) -> None:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    async def _on_request_done(self, session, ctx: SimpleNamespace, params) -> None:
+        self.in_flight -= 1
+        if getattr(ctx, "queued_at", None) is not None:
+            # request ถูกยกเลิก (เช่น timeout) ระหว่างรอ connection จึงไม่มี queued_end
+            ctx.queued_at = None
+            self.waiting -= 1
+
+    async def _on_queued_start(self, session, ctx: SimpleNamespace, params) -> None:
+        # ทุก connection ใน pool ถูกใช้อยู่ ต้องรอให้มีตัวว่าง
+        self.waiting += 1
+        ctx.queued_at = time.perf_counter()
+
+    async def _on_queued_end(self, session, ctx: SimpleNamespace, params) -> None:
+        waited = (time.perf_counter() - ctx.queued_at) * 1000
+        ctx.queued_at = None
+        self.waiting -= 1
+        self.waits += 1
+        self.total_wait_ms += waited
+        self.max_wait_ms = max(self.max_wait_ms, waited)
+
+    async def _on_create_end(self, session, ctx: SimpleNamespace, params) -> None:
+        self.connections_created += 1
+
+    async def _on_reuse(self, session, ctx: SimpleNamespace, params) -> None:
+        self.connections_reused += 1
+
+    async def _on_dns_hit(self, session, ctx: SimpleNamespace, params) -> None:
+        self.dns_hits += 1
+
+    async def _on_dns_miss(self, session, ctx: SimpleNamespace, params) -> None:
+        self.dns_misses += 1
+
+
+class HttpClient:
+    """One shared aiohttp ClientSession with a bounded, keep-alive connection pool.
+
+    `limit` caps open connections in total and `limit_per_host` per host (0 = no cap);
+    requests beyond that wait for a free connection instead of opening new sockets. Idle
+    connections are kept for `keepalive_timeout` seconds, which should stay below the
+    server's own keep-alive (uvicorn closes idle connections after 5 s), and resolved
+    hosts are cached for `dns_ttl` seconds. The session is created inside the running event
+    loop (by `start()` or on first use), never at import time.
+    """
+
+    def __init__(self, limit: int = 300, limit_per_host: int = 0, keepalive_timeout: float = 4.0,
+                 dns_ttl: int = 300, timeout: float = 30.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.tracer = PoolTracer()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True, ttl_dns_cache=self.dns_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self.tracer.trace_config],
+            )
+        return self._session
+
+    async def start(self) -> None:
+        # สร้าง session ไว้ตั้งแต่ startup แทนที่จะรอ request แรก
+        self._session = self.session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        t = self.tracer
+        capacity = min(c for c in (self.limit, self.limit_per_host) if c) if self.limit or self.limit_per_host else 0
+        acquired = t.connections_created + t.connections_reused
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "requests": t.requests,
+            "in_flight": t.in_flight,
+            "max_in_flight": t.max_in_flight,
+            # สัดส่วนของ pool ที่ถูกใช้อยู่ (simulation ส่งไป host เดียว จึงเทียบกับ limit ที่เล็กกว่า)
+            "utilization": round(t.in_flight / capacity, 3) if capacity else None,
+            "peak_utilization": round(t.max_in_flight / capacity, 3) if capacity else None,
+            "connections_created": t.connections_created,
+            "connections_reused": t.connections_reused,
+            "reuse_ratio": round(t.connections_reused / acquired, 3) if acquired else 0.0,
+            "waiting_for_connection": t.waiting,
+            "connection_waits": t.waits,
+            "average_wait_ms": round(t.total_wait_ms / t.waits, 3) if t.waits else 0.0,
+            "max_wait_ms": round(t.max_wait_ms, 3),
+            "dns_cache_hits": t.dns_hits,
+            "dns_cache_misses": t.dns_misses,
+        }
+
+
+class BoundedSpawner:
+    """Runs coroutines as tasks, at most `limit` at a time.
+
+    `spawn()` waits for a free slot before creating the task, so a producer looping over
+    many calls is held back instead of creating all of its tasks (and sockets) up front.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._slots = asyncio.Semaphore(limit)
+        self._tasks: Set[asyncio.Task] = set()
+        self.spawned = 0
+        self.max_active = 0
+
+    @property
+    def active(self) -> int:
+        return len(self._tasks)
+
+    async def spawn(self, coro: Coroutine) -> asyncio.Task:
+        await self._slots.acquire()
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        self.spawned += 1
+        self.max_active = max(self.max_active, len(self._tasks))
+        return task
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def join(self) -> None:
+        # รอ task ที่ยังทำงานอยู่ทั้งหมด (ไม่ยกเลิก)
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "active": self.active, "max_active": self.max_active, "spawned": self.spawned}
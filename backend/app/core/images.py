@@ -0,0 +1,35 @@
+import hashlib
+import io
+from typing import Dict, Iterable, Tuple
+
+from PIL import Image, ImageOps
+
+# ขนาด (px) ของรูป avatar ที่สร้างไว้ให้: 64 สำหรับตาราง/รายการ, 256 สำหรับหน้ารายละเอียด
+AVATAR_VARIANT_SIZES = (64, 256)
+VARIANT_FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+
+
+def render_variants(data: bytes, sizes: Iterable[int] = AVATAR_VARIANT_SIZES, fmt: str = "webp", quality: int = 80) -> Dict[int, Tuple[bytes, str]]:
+    """Resizes an image to square thumbnails; returns {size: (encoded bytes, content type)}.
+
+    CPU-bound, so callers run it in a worker thread.
+    """
+    pil_format, content_type = VARIANT_FORMATS[fmt]
+    with Image.open(io.BytesIO(data)) as source:
+        # หมุนตาม EXIF ของรูปจากมือถือ แล้วแปลงเป็นโหมดที่ encode ได้
+        image = ImageOps.exif_transpose(source)
+        if pil_format == "JPEG" or image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if pil_format == "WEBP" and "A" in image.getbands() else "RGB")
+        variants = {}
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, format=pil_format, quality=quality)
+            variants[size] = (buffer.getvalue(), content_type)
+    return variants
+
+
+def content_hashed_name(prefix: str, size: int, data: bytes, fmt: str = "webp") -> str:
+    # ชื่อไฟล์เปลี่ยนตามเนื้อหา จึงให้ CDN/browser cache ได้นานโดยไม่ต้องกลัวได้รูปเก่า
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    return f"{prefix}/{size}-{digest}.{'jpg' if fmt == 'jpeg' else fmt}"
@@ -0,0 +1,139 @@
+import asyncio
+import secrets
+import string
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional
+
+BASE62_ALPHABET = string.digits + string.ascii_letters
+
+
+def base62_encode(number: int) -> str:
+    if number < 0:
+        raise ValueError("number must be non-negative")
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    chars = []
+    while number:
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+class KeyGenerator:
+    """Base class for short-key strategies (async because some strategies reserve ids in the database)."""
+
+    async def next_key(self) -> str:
+        raise NotImplementedError
+
+    async def generate_many(self, count: int) -> List[str]:
+        return [await self.next_key() for _ in range(count)]
+
+
+class RandomKeyGenerator(KeyGenerator):
+    """Random base62 keys (the original behaviour); uniqueness relies on the unique index."""
+
+    def __init__(self, length: int = 8):
+        self.length = length
+
+    async def next_key(self) -> str:
+        return "".join(secrets.choice(BASE62_ALPHABET) for _ in range(self.length))
+
+
+class SnowflakeKeyGenerator(KeyGenerator):
+    """Time-ordered ids (timestamp | worker | sequence) encoded as base62.
+
+    41 bits of milliseconds + 8 bits of worker id + 10 bits of sequence keeps every id
+    below 2**59, so the key never exceeds 10 characters (the size of `short_key`).
+    """
+
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+    WORKER_BITS = 8
+    SEQUENCE_BITS = 10
+    MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+    def __init__(self, worker_id: int = 0, clock: Callable[[], float] = time.time):
+        if not 0 <= worker_id <= self.MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {self.MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _now_ms(self) -> int:
+        return int(self._clock() * 1000) - self.EPOCH_MS
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = self._now_ms()
+            # นาฬิกาถอยหลัง ให้ใช้เวลาล่าสุดต่อไป เพื่อไม่ให้ id ซ้ำ
+            if now < self._last_ms:
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & self.MAX_SEQUENCE
+                if self._sequence == 0:
+                    # sequence เต็มในมิลลิวินาทีนี้ รอมิลลิวินาทีถัดไป
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (
+                (now << (self.WORKER_BITS + self.SEQUENCE_BITS))
+                | (self.worker_id << self.SEQUENCE_BITS)
+                | self._sequence
+            )
+
+    async def next_key(self) -> str:
+        return base62_encode(self.next_id())
+
+    async def generate_many(self, count: int) -> List[str]:
+        return [base62_encode(self.next_id()) for _ in range(count)]
+
+
+class BlockKeyGenerator(KeyGenerator):
+    """Hands out base62 keys from blocks of ids reserved up front by `await allocator(block_size)`.
+
+    `allocator` must atomically reserve `block_size` consecutive ids and return the first one,
+    so each worker only touches the database once per block.
+    """
+
+    def __init__(self, allocator: Callable[[int], Awaitable[int]], block_size: int = 1000):
+        self.allocator = allocator
+        self.block_size = block_size
+        self._lock = asyncio.Lock()
+        self._next = 0
+        self._end = 0
+
+    async def next_key(self) -> str:
+        if self._next >= self._end:
+            # จองช่วงใหม่ทีละ request เดียว request อื่นรอ lock แล้วใช้ช่วงเดียวกัน
+            async with self._lock:
+                if self._next >= self._end:
+                    start = await self.allocator(self.block_size)
+                    self._next, self._end = start, start + self.block_size
+        value = self._next
+        self._next += 1
+        return base62_encode(value)
+
+
+def create_key_generator(
+    strategy: str,
+    allocator: Optional[Callable[[int], Awaitable[int]]] = None,
+    block_size: int = 1000,
+    worker_id: Optional[int] = None,
+) -> KeyGenerator:
+    if strategy == "snowflake":
+        # เดา worker id จาก pid ไม่ได้ เพราะชนกันได้ทั้งข้าม process และข้ามเครื่อง
+        if worker_id is None:
+            raise ValueError("snowflake strategy requires SHORT_KEY_WORKER_ID, unique per process across all hosts")
+        return SnowflakeKeyGenerator(worker_id=worker_id)
+    if strategy == "block":
+        if allocator is None:
+            raise ValueError("block strategy requires an allocator")
+        return BlockKeyGenerator(allocator, block_size=block_size)
+    if strategy == "random":
+        return RandomKeyGenerator()
+    raise ValueError(f"Unknown short key strategy: {strategy}")
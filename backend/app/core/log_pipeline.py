@@ -0,0 +1,177 @@
+import asyncio
+import copy
+import logging
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the logging call: when the queue is full the record is dropped and counted."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # ฝั่งผู้เรียกทำแค่รวม args เข้ากับข้อความ การ format เวลา/บรรทัด และเขียนไฟล์ไปทำใน listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingHandler(logging.Handler):
+    """Collects records as JSON-ready dicts and hands them to `send` as one list every `interval` seconds.
+
+    `emit()` runs on the listener thread; `run()` runs on the event loop, so the two only
+    share the pending list (under a lock). At most `max_pending` records wait for the next
+    batch; beyond that new records are dropped and counted.
+
+    Records are skipped entirely while `has_receivers()` is false, and below WARNING only a
+    `sample_rate` fraction of them is kept.
+    """
+
+    def __init__(self, send: Callable[[List[Dict[str, Any]]], Awaitable[None]], interval: float = 0.1,
+                 max_pending: int = 5000, level: int = logging.NOTSET, sample_rate: float = 1.0,
+                 has_receivers: Optional[Callable[[], bool]] = None):
+        super().__init__(level)
+        self.send = send
+        self.interval = interval
+        self.max_pending = max_pending
+        self.sample_rate = sample_rate
+        self.has_receivers = has_receivers
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches_sent = 0
+        self.records_sent = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.has_receivers is not None and not self.has_receivers():
+            return
+        if record.levelno < logging.WARNING and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        formatter = self.formatter or logging.Formatter()
+        entry = {
+            "timestamp": formatter.formatTime(record, formatter.datefmt),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        with self._pending_lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(entry)
+
+    def take(self) -> List[Dict[str, Any]]:
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        return batch
+
+    async def flush_batch(self) -> None:
+        batch = self.take()
+        if batch:
+            await self.send(batch)
+            self.batches_sent += 1
+            self.records_sent += len(batch)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_batch()
+            except Exception as e:
+                print(f"❌ Log batch send failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush_batch()
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener whose stop() still flushes and joins when the queue is full."""
+
+    def enqueue_sentinel(self) -> None:
+        # ของเดิมใช้ put_nowait ถ้าคิวเต็มตอนปิดแอปจะ raise queue.Full และไม่ได้ join thread
+        # รอให้ thread เขียน record ออกไปจนมีที่ว่าง (เว้นแต่ thread ไม่ทำงานแล้ว)
+        while True:
+            try:
+                self.queue.put(self._sentinel, timeout=1.0)
+                return
+            except queue.Full:
+                if self._thread is None or not self._thread.is_alive():
+                    return
+
+
+class LogPipeline:
+    """Routes loggers through a bounded queue to `handlers` running on a QueueListener thread.
+
+    The logging call only copies the record onto the queue; each handler keeps its own
+    level (respect_handler_level), and BatchingHandlers are flushed from the event loop.
+    """
+
+    def __init__(self, handlers: Sequence[logging.Handler], max_queue: int = 10000):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.handlers = list(handlers)
+        self.listener = FlushingQueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self._started = False
+
+    def attach(self, logger: logging.Logger) -> None:
+        logger.addHandler(self.handler)
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        self.listener.start()
+        for handler in self.handlers:
+            if isinstance(handler, BatchingHandler):
+                handler.start()
+
+    async def stop(self) -> None:
+        if not self._started:
+            return
+        self._started = False
+        # QueueListener.stop() รอให้ record ที่ค้างในคิวถูกเขียนหมด (blocking) จึงรันใน thread
+        await asyncio.to_thread(self.listener.stop)
+        for handler in self.handlers:
+            if isinstance(handler, BatchingHandler):
+                await handler.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        batching = [h for h in self.handlers if isinstance(h, BatchingHandler)]
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_max": self.queue.maxsize,
+            "dropped": self.handler.dropped,
+            "batch_dropped": sum(h.dropped for h in batching),
+            "sampled_out": sum(h.sampled_out for h in batching),
+            "sample_rate": [h.sample_rate for h in batching],
+            "batches_sent": sum(h.batches_sent for h in batching),
+            "records_sent": sum(h.records_sent for h in batching),
+            "levels": {type(h).__name__: logging.getLevelName(h.level) for h in self.handlers},
+        }
@@ -0,0 +1,109 @@
+import os
+import re
+from typing import Callable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+LineFilter = Optional[Callable[[bytes], bool]]
+
+
+def line_filter(level: Optional[str] = None, call_id: Optional[int] = None) -> LineFilter:
+    """Matches lines written with '%(asctime)s - %(levelname)s - %(message)s' by level and/or "ID <call_id>"."""
+    checks = []
+    if level:
+        marker = f" - {level.upper()} - ".encode()
+        checks.append(lambda line: marker in line)
+    if call_id is not None:
+        pattern = re.compile(rb"\bID %d\b" % call_id)
+        checks.append(lambda line: pattern.search(line) is not None)
+    if not checks:
+        return None
+    return lambda line: all(check(line) for check in checks)
+
+
+def complete_end(path: str, offset: int, max_bytes: Optional[int]) -> Tuple[int, int]:
+    """Returns (start, end) of the byte range to serve: both on line boundaries, end never past the file.
+
+    `start` moves forward to the next line if `offset` falls inside a line, and back to 0 if
+    the file is now shorter than `offset` (it was rotated or cleared). A line that is still
+    being written (no trailing newline yet) is left for the next request.
+    """
+    size = os.path.getsize(path)
+    if offset > size:
+        offset = 0
+    end = size if max_bytes is None else min(size, offset + max_bytes)
+    with open(path, "rb") as f:
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                if not f.readline().endswith(b"\n"):
+                    # offset อยู่กลางบรรทัดที่ยังเขียนไม่จบ ยังไม่มีอะไรให้ส่ง
+                    return offset, offset
+                offset = min(f.tell(), end)
+        # ถอย end กลับไปที่ท้ายบรรทัดที่สมบูรณ์บรรทัดสุดท้าย
+        position = end
+        while position > offset:
+            step = min(CHUNK_SIZE, position - offset)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                return offset, position - step + newline + 1
+            position -= step
+    return offset, offset
+
+
+def iter_range(path: str, start: int, end: int, match: LineFilter = None) -> Iterator[bytes]:
+    """Yields the lines between `start` and `end` in chunks of about CHUNK_SIZE bytes."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        pending = b""
+        while remaining > 0:
+            data = f.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            data = pending + data
+            cut = data.rfind(b"\n") + 1
+            pending = data[cut:]
+            lines = data[:cut]
+            if match is not None:
+                lines = b"".join(line for line in lines.splitlines(keepends=True) if match(line))
+            if lines:
+                yield lines
+
+
+def tail_lines(path: str, count: int, match: LineFilter = None) -> Tuple[List[bytes], int]:
+    """Returns the last `count` complete (and matching) lines, reading the file backwards, and the end offset."""
+    size = os.path.getsize(path)
+    found: List[bytes] = []
+    end = None
+    with open(path, "rb") as f:
+        position = size
+        partial = b""
+        while position > 0 and len(found) < count:
+            step = min(CHUNK_SIZE, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + partial
+            if end is None:
+                # บรรทัดสุดท้ายที่ยังไม่มี newline (กำลังเขียนอยู่) ไม่นับ
+                newline = data.rfind(b"\n")
+                if newline == -1:
+                    partial = data
+                    continue
+                end = position + newline + 1
+                data = data[:newline + 1]
+            lines = data.split(b"\n")
+            lines.pop()
+            # บรรทัดแรกของ chunk อาจยังไม่ครบ เก็บไว้ต่อกับ chunk ก่อนหน้า (ยกเว้นถึงต้นไฟล์แล้ว)
+            partial = lines.pop(0) + b"\n" if position > 0 else b""
+            for line in reversed(lines):
+                line += b"\n"
+                if match is None or match(line):
+                    found.append(line)
+                    if len(found) >= count:
+                        break
+    found.reverse()
+    return found, end or 0
@@ -0,0 +1,133 @@
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram: log-linear buckets, O(1) record, fixed memory.
+
+    Values are stored in microseconds. Below 2**sub_bucket_bits every value has its own
+    bucket; above that each power of two is split into 2**(sub_bucket_bits - 1) buckets, so
+    percentiles are within ~1/2**(sub_bucket_bits - 1) of the true value (<1% by default).
+    """
+
+    def __init__(self, max_value_ms: float = 60000, sub_bucket_bits: int = 8):
+        self.sub_bits = sub_bucket_bits
+        self.sub_count = 1 << sub_bucket_bits
+        self.half = self.sub_count >> 1
+        self.max_value = int(max_value_ms * 1000)
+        self.counts = [0] * (self._index(self.max_value) + 1)
+        self.reset()
+
+    def _index(self, value: int) -> int:
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + ((value >> shift) - self.half)
+
+    def _value(self, index: int) -> int:
+        # ค่ากลางของช่อง (ใช้เป็นตัวแทนของทุกค่าในช่องนั้น)
+        if index < self.sub_count:
+            return index
+        shift = (index - self.sub_count) // self.half + 1
+        mantissa = (index - self.sub_count) % self.half + self.half
+        return (mantissa << shift) + (1 << shift) // 2
+
+    def reset(self) -> None:
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_ms: float) -> None:
+        value = min(max(0, int(value_ms * 1000)), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= target:
+                return min(self._value(index), self.max) / 1000
+        return self.max / 1000
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count / 1000, 3) if self.count else 0.0,
+            "p50": round(self.percentile(50), 3),
+            "p90": round(self.percentile(90), 3),
+            "p99": round(self.percentile(99), 3),
+            "p999": round(self.percentile(99.9), 3),
+            "max": round(self.max / 1000, 3),
+        }
+
+
+class MetricsPublisher:
+    """Sends a compact metrics snapshot every `interval` seconds.
+
+    `collect()` returns {"counters": {...cumulative totals...}, ...}; the publisher adds the
+    per-second rate of each counter since the previous snapshot and passes everything else
+    (gauges, latency percentiles) through unchanged.
+    """
+
+    def __init__(self, collect: Callable[[], Dict[str, Any]], send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 interval: float = 1.0):
+        self.collect = collect
+        self.send = send
+        self.interval = interval
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+        self._last_counters: Dict[str, float] = {}
+        self._last_time = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        data = self.collect()
+        counters = data.pop("counters", {})
+        elapsed = max(now - self._last_time, 1e-9)
+        rates = {}
+        for name, value in counters.items():
+            previous = self._last_counters.get(name, value)
+            # ตัวนับถูก reset (เช่น เริ่ม simulation ใหม่) ให้นับจากศูนย์
+            delta = value - previous if value >= previous else value
+            rates[name] = round(delta / elapsed, 1)
+        self._last_counters = counters
+        self._last_time = now
+        return {
+            "timestamp": time.time(),
+            "interval_seconds": round(elapsed, 3),
+            "totals": counters,
+            "per_second": rates,
+            **data,
+        }
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.last_snapshot = self.snapshot()
+                await self.send(self.last_snapshot)
+            except Exception as e:
+                print(f"❌ Metrics publish failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._last_time = time.monotonic()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
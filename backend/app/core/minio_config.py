@@ -1,8 +1,10 @@
 import os
 import json
 from dotenv import load_dotenv
+from typing import Optional
+
+import urllib3
 from minio import Minio
-from minio.error import S3Error
 
 # โหลดค่าจากไฟล์ .env
 load_dotenv()
@@ -15,14 +17,38 @@ MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 
 MINIO_FULL = f"{MINIO_ENDPOINT}:{MINIO_PORT}"
 
-minio_client = Minio(
-    endpoint=MINIO_FULL,
-    access_key=MINIO_ACCESS_KEY,
-    secret_key=MINIO_SECRET_KEY,
-    secure=False
-)
 bucket_name = "user-profile"
 
+_minio_client: Optional[Minio] = None
+
+
+def get_minio_client() -> Minio:
+    # สร้าง client ตอนใช้งานครั้งแรก (การสร้าง Minio ไม่ต่อ network จึงไม่ทำให้ import ช้า)
+    global _minio_client
+    if _minio_client is None:
+        _minio_client = Minio(
+            endpoint=MINIO_FULL,
+            access_key=MINIO_ACCESS_KEY,
+            secret_key=MINIO_SECRET_KEY,
+            secure=False
+        )
+    return _minio_client
+
+
+def create_probe_client(timeout: float) -> Minio:
+    # client แยกสำหรับเตรียม bucket: จำกัดเวลาต่อครั้งและปิด retry ของ urllib3
+    # ถ้า MinIO ล่ม thread จะคืนภายใน timeout แทนที่จะค้างอยู่หลังผู้เรียกเลิกรอไปแล้ว
+    http_client = urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=timeout, read=timeout), retries=urllib3.Retry(total=0),
+    )
+    return Minio(
+        endpoint=MINIO_FULL,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=False,
+        http_client=http_client,
+    )
+
 # public read policy JSON
 public_read_policy = {
     "Version": "2012-10-17",
@@ -36,16 +62,14 @@ public_read_policy = {
     ]
 }
 
-# ตรวจสอบและสร้าง bucket + ตั้ง policy
-try:
-    found = minio_client.bucket_exists(bucket_name)
+def ensure_bucket(client: Optional[Minio] = None) -> None:
+    """Creates the bucket and sets its public read policy (blocking; run by the storage initializer)."""
+    client = client or get_minio_client()
+    found = client.bucket_exists(bucket_name)
     if not found:
-        minio_client.make_bucket(bucket_name)
+        client.make_bucket(bucket_name)
         print(f"✅ Created bucket: {bucket_name}")
 
     # ตั้ง policy ให้ public read ทุกกรณี
-    minio_client.set_bucket_policy(bucket_name, json.dumps(public_read_policy))
+    client.set_bucket_policy(bucket_name, json.dumps(public_read_policy))
     print(f"✅ Set public read policy on: {bucket_name}")
-
-except S3Error as e:
-    print(f"❌ MinIO error: {e}")
@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """Opaque keyset cursor for the last row of a page: (sort column value, id)."""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, parse_datetime: bool = True) -> Tuple[Any, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if parse_datetime and sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def next_cursor(rows: list, limit: int, sort_attr: str) -> Optional[str]:
+    # มีหน้าถัดไปเมื่อได้แถวครบ limit พอดี
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, sort_attr), last.id)
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def json_array_stream(rows: AsyncIterable[Any], to_dict: Callable[[Any], dict], batch_size: int = 500) -> AsyncIterator[bytes]:
+    """Streams rows as one JSON array without building the whole list in memory."""
+    yield b"["
+    first = True
+    parts = []
+    async for row in rows:
+        parts.append(("" if first else ",") + json.dumps(to_dict(row), default=json_default))
+        first = False
+        if len(parts) >= batch_size:
+            yield "".join(parts).encode()
+            parts = []
+    if parts:
+        yield "".join(parts).encode()
+    yield b"]"
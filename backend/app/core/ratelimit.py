@@ -0,0 +1,241 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    # วินาทีที่ควรรอก่อนลองใหม่ (0 เมื่อผ่าน)
+    retry_after: float
+
+
+class RateLimiter:
+    """Allows `limit` requests per `period` seconds for each key.
+
+    `allow()` is synchronous and O(1): it never awaits, so on the event loop a check can't
+    be interleaved with another one, and the lock makes it safe from threads as well.
+    State is kept per key in an LRU of at most `max_keys` entries; an evicted (idle) key
+    simply starts again with a full allowance.
+    """
+
+    algorithm = ""
+
+    def __init__(self, limit: int, period: float, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        if limit <= 0 or period <= 0:
+            raise ValueError("limit and period must be positive")
+        self.limit = limit
+        self.period = period
+        self.max_keys = max_keys
+        self._clock = clock
+        self._state: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _new_state(self, now: float) -> Any:
+        raise NotImplementedError
+
+    def _check(self, state: Any, now: float, cost: int):
+        """Returns (decision, new state) — subclasses implement the algorithm here."""
+        raise NotImplementedError
+
+    def allow(self, key: Hashable = "default", cost: int = 1) -> Decision:
+        with self._lock:
+            now = self._clock()
+            state = self._state.get(key)
+            if state is None:
+                state = self._new_state(now)
+            else:
+                self._state.move_to_end(key)
+            decision, state = self._check(state, now, cost)
+            self._state[key] = state
+            if len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        if decision.allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return decision
+
+    def reset(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._state.clear()
+            else:
+                self._state.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "algorithm": self.algorithm,
+            "limit": self.limit,
+            "period_seconds": self.period,
+            "keys": len(self._state),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+class FixedWindowLimiter(RateLimiter):
+    """Counter reset every `period` (the original echo behaviour; allows 2x bursts at window edges)."""
+
+    algorithm = "fixed_window"
+
+    def _new_state(self, now):
+        return (now, 0)
+
+    def _check(self, state, now, cost):
+        window_start, count = state
+        if now - window_start >= self.period:
+            window_start, count = now, 0
+        if count + cost > self.limit:
+            return Decision(False, self.limit - count, window_start + self.period - now), (window_start, count)
+        count += cost
+        return Decision(True, self.limit - count, 0.0), (window_start, count)
+
+
+class TokenBucketLimiter(RateLimiter):
+    """Bucket of `burst` tokens refilled continuously at limit/period tokens per second."""
+
+    algorithm = "token_bucket"
+
+    def __init__(self, limit, period, burst: Optional[int] = None, **kwargs):
+        super().__init__(limit, period, **kwargs)
+        self.burst = burst or limit
+        self.rate = limit / period
+
+    def _new_state(self, now):
+        return (float(self.burst), now)
+
+    def _check(self, state, now, cost):
+        tokens, last = state
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < cost:
+            return Decision(False, int(tokens), (cost - tokens) / self.rate), (tokens, now)
+        tokens -= cost
+        return Decision(True, int(tokens), 0.0), (tokens, now)
+
+
+class GCRALimiter(RateLimiter):
+    """Generic cell rate algorithm: one float per key (the theoretical arrival time)."""
+
+    algorithm = "gcra"
+
+    def __init__(self, limit, period, burst: Optional[int] = None, **kwargs):
+        super().__init__(limit, period, **kwargs)
+        self.burst = burst or limit
+        # ระยะห่างระหว่าง request ที่อัตราคงที่ และความคลาดเคลื่อนที่ยอมให้ (= ขนาด burst)
+        self.interval = period / limit
+        self.tolerance = self.interval * self.burst
+
+    def _new_state(self, now):
+        return now
+
+    def _check(self, tat, now, cost):
+        tat = max(tat, now)
+        new_tat = tat + self.interval * cost
+        allow_at = new_tat - self.tolerance
+        if allow_at > now:
+            remaining = int((now - (tat - self.tolerance)) / self.interval)
+            return Decision(False, max(0, remaining), allow_at - now), tat
+        remaining = int((now - allow_at) / self.interval)
+        return Decision(True, remaining, 0.0), new_tat
+
+
+class SlidingWindowLogLimiter(RateLimiter):
+    """Exact sliding window: keeps a timestamp per request (amortised O(1), O(limit) memory per key)."""
+
+    algorithm = "sliding_log"
+
+    def _new_state(self, now):
+        return deque()
+
+    def _check(self, log, now, cost):
+        boundary = now - self.period
+        while log and log[0] <= boundary:
+            log.popleft()
+        if len(log) + cost > self.limit:
+            retry_after = log[len(log) + cost - self.limit - 1] + self.period - now if cost <= self.limit else self.period
+            return Decision(False, self.limit - len(log), retry_after), log
+        log.extend([now] * cost)
+        return Decision(True, self.limit - len(log), 0.0), log
+
+
+class SlidingWindowCounterLimiter(RateLimiter):
+    """Approximate sliding window from the previous and current fixed-window counts."""
+
+    algorithm = "sliding_counter"
+
+    def _new_state(self, now):
+        return (math.floor(now / self.period), 0, 0)
+
+    def _check(self, state, now, cost):
+        window, previous, current = state
+        now_window = math.floor(now / self.period)
+        if now_window != window:
+            # ขยับหน้าต่าง: ถ้าข้ามไปมากกว่า 1 หน้าต่าง ค่าเดิมไม่เหลือน้ำหนักแล้ว
+            previous = current if now_window == window + 1 else 0
+            current = 0
+            window = now_window
+        elapsed = now / self.period - window
+        estimated = previous * (1 - elapsed) + current
+        if estimated + cost > self.limit:
+            # รอจนน้ำหนักของหน้าต่างก่อนหน้าลดลงพอ หรือจนหน้าต่างใหม่เริ่ม
+            if previous:
+                needed = (estimated + cost - self.limit) / previous * self.period
+                retry_after = min(needed, (1 - elapsed) * self.period)
+            else:
+                retry_after = (1 - elapsed) * self.period
+            return Decision(False, max(0, int(self.limit - estimated)), retry_after), (window, previous, current)
+        current += cost
+        return Decision(True, max(0, int(self.limit - estimated - cost)), 0.0), (window, previous, current)
+
+
+ALGORITHMS = {
+    cls.algorithm: cls
+    for cls in (FixedWindowLimiter, TokenBucketLimiter, GCRALimiter, SlidingWindowLogLimiter, SlidingWindowCounterLimiter)
+}
+
+
+def create_rate_limiter(algorithm: str, limit: int, period: float, **kwargs) -> RateLimiter:
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown rate limit algorithm: {algorithm} (choose from {', '.join(ALGORITHMS)})")
+    cls = ALGORITHMS[algorithm]
+    if "burst" in kwargs and cls not in (TokenBucketLimiter, GCRALimiter):
+        kwargs.pop("burst")
+    return cls(limit, period, **kwargs)
+
+
+class LeakyBucketPacer:
+    """Spaces events evenly at `rate` per second instead of bursting and then sleeping.
+
+    Each `wait()` reserves the next free slot (synchronously, so concurrent callers get
+    distinct slots) and sleeps until it. Idle time does not build up credit, so the
+    output never exceeds `rate` even right after a pause.
+    """
+
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.interval = 1.0 / rate
+        self._clock = clock
+        self._next_slot = 0.0
+
+    def reserve(self) -> float:
+        """Reserves the next slot and returns how long to wait for it."""
+        now = self._clock()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        return slot - now
+
+    def reset(self) -> None:
+        """Forgets every reserved slot (the next one is free immediately)."""
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,63 @@
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, List, Optional
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: Callable[[], float] = random.random) -> float:
+    """Exponential backoff with full jitter: a random delay in [0, min(cap, base * 2**(attempt - 1))]."""
+    return rng() * min(cap, base * 2 ** max(0, attempt - 1))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None if absent/invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class DelayQueue:
+    """Items that become available at a due time, kept in a heap ordered by that time.
+
+    Meant for a single consumer on the event loop: `pop_due()` never blocks and
+    `next_delay()` tells the consumer how long it may wait before something is due.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._heap: List[tuple] = []
+        # ลำดับการใส่ ใช้ตัดสินเมื่อเวลาครบกำหนดเท่ากัน (item เองอาจเปรียบเทียบกันไม่ได้)
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: Any, delay: float) -> None:
+        heapq.heappush(self._heap, (self._clock() + max(0.0, delay), next(self._seq), item))
+
+    def pop_due(self) -> Optional[Any]:
+        if self._heap and self._heap[0][0] <= self._clock():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def next_delay(self) -> Optional[float]:
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
+
+    def drain(self) -> List[Any]:
+        items = [entry[2] for entry in sorted(self._heap)]
+        self._heap.clear()
+        return items
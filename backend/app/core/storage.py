@@ -0,0 +1,292 @@
+import asyncio
+import io
+import os
+import shutil
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from minio.error import S3Error
+from urllib3.exceptions import HTTPError
+
+from app.core.config import (
+    AVATAR_MAX_BYTES, AVATAR_PART_SIZE, LOCAL_STORAGE_DIR, LOCAL_STORAGE_PUBLIC_URL, MINIO_PUBLIC_URL,
+    STORAGE_BACKEND, STORAGE_INIT_RETRIES, STORAGE_INIT_TIMEOUT_SECONDS,
+)
+from app.core.minio_config import bucket_name, create_probe_client, ensure_bucket, get_minio_client
+
+AVATAR_EXTENSIONS = ("jpg", "jpeg", "png", "gif")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class LimitedReader:
+    """File wrapper that raises UploadTooLarge once more than `limit` bytes have been read."""
+
+    def __init__(self, raw: BinaryIO, limit: int):
+        self.raw = raw
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(size)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self.limit:
+            raise UploadTooLarge()
+        return chunk
+
+
+def avatar_extension(file: UploadFile) -> str:
+    ext = (file.filename or "").split('.')[-1].lower()
+    if ext not in AVATAR_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid image type")
+    return ext
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectStorage:
+    """Blocking object-store operations; callers run them in a thread (see upload_avatar / remove_object)."""
+
+    def ensure_ready(self, timeout: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def put_stream(self, object_name: str, data: BinaryIO, length: int, content_type: Optional[str]) -> None:
+        raise NotImplementedError
+
+    def read(self, object_name: str) -> bytes:
+        raise NotImplementedError
+
+    def write(self, object_name: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def remove(self, object_name: str) -> None:
+        raise NotImplementedError
+
+    def public_url(self, object_name: str) -> str:
+        raise NotImplementedError
+
+
+class MinioStorage(ObjectStorage):
+    def __init__(self, public_base_url: str = MINIO_PUBLIC_URL):
+        self.public_base_url = public_base_url.rstrip("/")
+
+    def ensure_ready(self, timeout: Optional[float] = None) -> None:
+        ensure_bucket(create_probe_client(timeout) if timeout else None)
+
+    def put_stream(self, object_name: str, data: BinaryIO, length: int, content_type: Optional[str]) -> None:
+        # length = -1 (ไม่รู้ขนาด) MinIO จะอัปโหลดแบบ multipart ทีละ part_size
+        # num_parallel_uploads=1 ให้มี part อยู่ในหน่วยความจำครั้งละ part เดียว
+        try:
+            get_minio_client().put_object(
+                bucket_name=bucket_name, object_name=object_name, data=data, length=length,
+                content_type=content_type or "application/octet-stream",
+                part_size=AVATAR_PART_SIZE, num_parallel_uploads=1,
+            )
+        except (S3Error, HTTPError) as e:
+            raise StorageError(e)
+
+    def read(self, object_name: str) -> bytes:
+        try:
+            response = get_minio_client().get_object(bucket_name, object_name)
+        except (S3Error, HTTPError) as e:
+            raise StorageError(e)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def write(self, object_name: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+        try:
+            get_minio_client().put_object(
+                bucket_name=bucket_name, object_name=object_name, data=io.BytesIO(data), length=len(data),
+                content_type=content_type, metadata={"Cache-Control": cache_control} if cache_control else None,
+            )
+        except (S3Error, HTTPError) as e:
+            raise StorageError(e)
+
+    def remove(self, object_name: str) -> None:
+        try:
+            get_minio_client().remove_object(bucket_name, object_name)
+        except (S3Error, HTTPError) as e:
+            raise StorageError(e)
+
+    def public_url(self, object_name: str) -> str:
+        return f"{self.public_base_url}/{bucket_name}/{object_name}"
+
+
+class LocalStorage(ObjectStorage):
+    """Stores objects as files under `root` (for local runs without MinIO); served by the app at /media."""
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR, public_base_url: str = LOCAL_STORAGE_PUBLIC_URL):
+        self.root = os.path.abspath(root)
+        self.public_base_url = public_base_url.rstrip("/")
+
+    def _path(self, object_name: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, object_name))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"Invalid object name: {object_name}")
+        return path
+
+    def ensure_ready(self, timeout: Optional[float] = None) -> None:
+        os.makedirs(self.root, exist_ok=True)
+
+    def _replace(self, object_name: str, copy) -> None:
+        # เขียนลงไฟล์ชั่วคราวก่อนแล้ว rename ทับ ผู้อ่านจะไม่เห็นไฟล์ที่เขียนไม่ครบ
+        path = self._path(object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                copy(f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            raise StorageError(e)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_stream(self, object_name: str, data: BinaryIO, length: int, content_type: Optional[str]) -> None:
+        self._replace(object_name, lambda f: shutil.copyfileobj(data, f, 1024 * 1024))
+
+    def read(self, object_name: str) -> bytes:
+        try:
+            with open(self._path(object_name), "rb") as f:
+                return f.read()
+        except OSError as e:
+            raise StorageError(e)
+
+    def write(self, object_name: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+        self._replace(object_name, lambda f: f.write(data))
+
+    def remove(self, object_name: str) -> None:
+        try:
+            os.remove(self._path(object_name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise StorageError(e)
+
+    def public_url(self, object_name: str) -> str:
+        return f"{self.public_base_url}/{object_name}"
+
+
+def create_storage(backend: str) -> ObjectStorage:
+    if backend == "minio":
+        return MinioStorage()
+    if backend == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage(STORAGE_BACKEND)
+
+
+class StorageInitializer:
+    """Prepares the storage backend (e.g. creates the MinIO bucket) in a background task.
+
+    Startup does not wait for it: until it succeeds uploads fail with 500, and `stats()`
+    shows the progress on /api/v1/system/storage. Each attempt waits for its worker thread
+    to return (the client itself times out after `timeout`), so an unreachable MinIO never
+    leaves abandoned threads behind.
+    """
+
+    def __init__(self, storage: ObjectStorage, retries: int = STORAGE_INIT_RETRIES,
+                 timeout: float = STORAGE_INIT_TIMEOUT_SECONDS):
+        self.storage = storage
+        self.retries = retries
+        self.timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+        self.status = "pending"
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.ready_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        self.status = "initializing"
+        for attempt in range(1, self.retries + 1):
+            self.attempts = attempt
+            try:
+                await run_in_threadpool(self.storage.ensure_ready, self.timeout)
+            except (StorageError, S3Error, HTTPError, OSError) as e:
+                self.last_error = repr(e)
+                print(f"❌ Storage init failed (attempt {attempt}/{self.retries}): {e!r}")
+                if attempt < self.retries:
+                    await asyncio.sleep(min(2 ** (attempt - 1), 5))
+                continue
+            self.status = "ready"
+            self.last_error = None
+            self.ready_at = time.time()
+            return
+        self.status = "failed"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": STORAGE_BACKEND,
+            "status": self.status,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "last_error": self.last_error,
+            "ready_at": self.ready_at,
+        }
+
+
+storage_initializer = StorageInitializer(storage)
+
+
+async def upload_avatar(file: UploadFile, object_name: str) -> str:
+    """Streams an uploaded avatar to object storage (overwriting `object_name`) off the event loop."""
+    if file.size is not None and file.size > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar exceeds {AVATAR_MAX_BYTES} bytes")
+
+    # UploadFile เก็บข้อมูลไว้ใน SpooledTemporaryFile อยู่แล้ว ส่ง file object ให้ MinIO อ่านทีละส่วน ไม่ต้อง read() ทั้งก้อน
+    data = LimitedReader(file.file, AVATAR_MAX_BYTES)
+    length = file.size if file.size is not None else -1
+    try:
+        await run_in_threadpool(storage.put_stream, object_name, data, length, file.content_type)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"Avatar exceeds {AVATAR_MAX_BYTES} bytes")
+    except StorageError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to upload image: {e}")
+    return object_name
+
+
+def read_object(object_name: str) -> bytes:
+    # เรียกจาก worker thread เท่านั้น (blocking)
+    return storage.read(object_name)
+
+
+def write_object(object_name: str, data: bytes, content_type: str, cache_control: Optional[str] = None) -> None:
+    # เรียกจาก worker thread เท่านั้น (blocking)
+    storage.write(object_name, data, content_type, cache_control=cache_control)
+
+
+async def remove_object(object_name: str) -> None:
+    try:
+        await run_in_threadpool(storage.remove, object_name)
+    except StorageError as e:
+        print(f"Error deleting object {object_name} from storage: {e}")
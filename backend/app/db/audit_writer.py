@@ -0,0 +1,150 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.db.database import engine
+from app.db.url_models import URLShortenAudit
+
+_insert_audit = insert(URLShortenAudit.__table__)
+# ใส่ท้ายคิวตอน stop() เพื่อบอก writer ให้เขียน batch ที่ค้างให้เสร็จแล้วจบเอง (แทนการ cancel กลาง flush)
+_STOP = object()
+
+
+class AuditWriter:
+    """Bounded in-process queue of audit events written to the database in batches.
+
+    `policy` decides what happens when the queue is full: "block" makes the request
+    wait for space (backpressure), "drop" discards the event and counts it.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1.0, policy: str = "block"):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown audit queue policy: {policy}")
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # batch ที่กำลังสะสมอยู่ เก็บไว้ที่ instance เพื่อให้ stop() flush ต่อได้แม้ถูก cancel กลางทาง
+        self._batch: List[dict] = []
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # สร้างคิวตอนใช้งานครั้งแรก เพื่อให้ผูกกับ event loop ที่รันอยู่จริง
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+
+    async def submit(self, action: str, user: str, short_key: Optional[str] = None) -> None:
+        event = {"action": action, "performed_by": user, "performed_at": datetime.utcnow(), "short_key": short_key}
+        if self.policy == "drop":
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                return
+        else:
+            await self.queue.put(event)
+        self.enqueued += 1
+
+    async def _write(self, batch: List[dict]) -> None:
+        async with engine.begin() as conn:
+            await conn.execute(_insert_audit, batch)
+
+    async def _flush(self, batch: List[dict]) -> None:
+        start = time.perf_counter()
+        for attempt in range(3):
+            try:
+                await self._write(batch)
+                break
+            except Exception as e:
+                print(f"❌ Audit flush failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(0.5 * (attempt + 1))
+        else:
+            self.failed += len(batch)
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.written += len(batch)
+        self.batches += 1
+        self.last_flush_ms = round(elapsed_ms, 3)
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        self._total_flush_ms += elapsed_ms
+
+    async def _run(self) -> None:
+        queue = self.queue
+        stopping = False
+        while not stopping:
+            # รอ event แรก แล้วเก็บต่อจนครบ batch_size หรือครบเวลา flush_interval
+            event = await queue.get()
+            stopping = event is _STOP
+            if not stopping:
+                self._batch.append(event)
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(self._batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is _STOP:
+                    stopping = True
+                else:
+                    self._batch.append(event)
+            batch, self._batch = self._batch, []
+            if batch:
+                await self._flush(batch)
+
+    def _drain(self) -> List[dict]:
+        batch, self._batch = self._batch, []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return batch
+            if event is not _STOP:
+                batch.append(event)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # ให้ writer เขียน batch ที่กำลังเขียนอยู่ให้เสร็จแล้วจบเอง จากนั้นเขียน event ที่เหลือในคิวให้หมดก่อนปิดแอป
+        if self._task is not None:
+            if not self._task.done():
+                await self.queue.put(_STOP)
+                await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        remaining = self._drain()
+        for offset in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[offset:offset + self.batch_size])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "policy": self.policy,
+            "queue_depth": self.queue.qsize(),
+            "batch_pending": len(self._batch),
+            "max_queue": self.max_queue,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 3) if self.batches else 0.0,
+        }
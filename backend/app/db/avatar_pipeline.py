@@ -0,0 +1,139 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.images import AVATAR_VARIANT_SIZES, content_hashed_name, render_variants
+from app.core.storage import read_object, remove_object, write_object
+from app.db.database import engine
+from app.db.user_model import User
+
+# ชื่อไฟล์ variant มี hash ของเนื้อหาอยู่แล้ว cache ได้ไม่มีวันหมดอายุ
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+async def ensure_avatar_variants_column(conn: AsyncConnection) -> None:
+    """Adds users.avatar_variants to databases created before the column existed (safe to run on every startup)."""
+    # create_all ไม่เพิ่ม column ให้ตารางที่มีอยู่แล้ว ถ้าไม่มี column นี้ทุก SELECT ของ User จะ error
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        await conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_variants JSON"))
+    elif dialect == "sqlite":
+        columns = (await conn.execute(text("PRAGMA table_info(users)"))).all()
+        if not any(row[1] == "avatar_variants" for row in columns):
+            await conn.execute(text("ALTER TABLE users ADD COLUMN avatar_variants JSON"))
+
+
+class AvatarVariantPipeline:
+    """Generates resized avatar variants in the background on a bounded thread pool.
+
+    Jobs wait in a queue of at most `max_queue` entries (extra jobs are dropped and
+    counted; the user keeps the original avatar) and run on `workers` dedicated
+    threads, so bursts of uploads never take threads from request handling.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 100, fmt: str = "webp", sizes=AVATAR_VARIANT_SIZES):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.fmt = fmt
+        self.sizes = tuple(sizes)
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_job_ms = 0.0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+
+    def submit(self, user_id: str, object_name: str) -> bool:
+        """Queues variant generation for the avatar stored at `object_name`."""
+        try:
+            self.queue.put_nowait((user_id, object_name))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _render(self, user_id: str, object_name: str) -> Dict[str, str]:
+        # ทำงานใน worker thread: ดึงรูปต้นฉบับ ย่อขนาด แล้วอัปโหลดทุก variant
+        variants = {}
+        for size, (data, content_type) in render_variants(read_object(object_name), self.sizes, self.fmt).items():
+            name = content_hashed_name(f"variants/{user_id}", size, data, self.fmt)
+            write_object(name, data, content_type, cache_control=VARIANT_CACHE_CONTROL)
+            variants[str(size)] = name
+        return variants
+
+    async def _process(self, job: Tuple[str, str]) -> None:
+        user_id, object_name = job
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        variants = await loop.run_in_executor(self._executor, self._render, user_id, object_name)
+        async with engine.begin() as conn:
+            # บันทึกเฉพาะเมื่อ avatar ยังเป็นไฟล์เดิม (ถ้าระหว่างนี้มีการอัปโหลดใหม่ งานใหม่จะเขียนแทน)
+            result = await conn.execute(
+                update(User.__table__)
+                .where(User.__table__.c.id == user_id, User.__table__.c.avatar_url == object_name)
+                .values(avatar_variants=variants)
+            )
+        if result.rowcount == 0:
+            # avatar ถูกเปลี่ยนหรือ user ถูกลบไปแล้ว variant ชุดนี้ไม่มีใครใช้
+            for name in variants.values():
+                await remove_object(name)
+        self.completed += 1
+        self.last_job_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    async def _run(self) -> None:
+        queue = self.queue
+        while True:
+            job = await queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Avatar variants failed for {job[1]}: {e}")
+            finally:
+                queue.task_done()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="avatar-variants")
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # ให้งานที่ค้างในคิวเสร็จก่อน (ไม่เกิน timeout) แล้วปิด worker
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Avatar variants: {self.queue.qsize()} jobs left unprocessed at shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_job_ms": self.last_job_ms,
+        }
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from sqlalchemy import bindparam, func
+
+from app.db.database import engine
+from app.db.url_models import URLShorten
+
+_url_table = URLShorten.__table__
+
+# UPDATE url_shorten SET clicks = clicks + :delta WHERE id = :url_id (รันแบบ executemany)
+_increment_clicks = (
+    _url_table.update()
+    .where(_url_table.c.id == bindparam("url_id"))
+    .values(clicks=func.coalesce(_url_table.c.clicks, 0) + bindparam("delta"))
+)
+
+
+class ClickCounter:
+    """Accumulates clicks in memory and writes them periodically as batched atomic increments."""
+
+    def __init__(self, flush_interval: float = 5.0, on_flush: Optional[Callable[[Dict[int, int]], None]] = None):
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        # clicks ที่ยังไม่ถูกเขียน และ clicks ที่กำลังเขียนอยู่ใน flush รอบปัจจุบัน
+        self._pending: Dict[int, int] = {}
+        self._inflight: Dict[int, int] = {}
+        # flush กับการอ่าน clicks จากฐานข้อมูล (reading()) ห้ามซ้อนกัน: อ่านพร้อมกันหลายตัวได้ แต่ flush ต้องรอให้อ่านเสร็จ
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._flushing = False
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_clicks = 0
+        self.last_flush_ms = 0.0
+
+    # ทุก method ทำงานบน event loop เดียวกัน ไม่มี await คั่นระหว่างอ่าน/เขียน dict จึงไม่ต้องใช้ lock
+    def add(self, url_id: int, n: int = 1) -> None:
+        self._pending[url_id] = self._pending.get(url_id, 0) + n
+
+    def pending(self, url_id: int) -> int:
+        return self._pending.get(url_id, 0) + self._inflight.get(url_id, 0)
+
+    def discard(self, url_id: int) -> None:
+        self._pending.pop(url_id, None)
+
+    @asynccontextmanager
+    async def reading(self) -> AsyncIterator[None]:
+        """Holds off flushes while the caller reads clicks from the database.
+
+        Inside the block a DB value plus `pending()` counts every click exactly once; without
+        it a read that lands after a flush commits, but before the flush clears its in-flight
+        batch, would count that batch twice.
+        """
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._flushing)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    async def flush(self) -> int:
+        """Writes all pending clicks in one transaction and returns the number of rows touched."""
+        if not self._pending:
+            return 0
+        async with self._cond:
+            # กัน reader ใหม่ก่อน แล้วรอ reader ที่อ่านอยู่ให้เสร็จ (flush จึงไม่ถูกอ่านแทรกจนรอไม่จบ)
+            await self._cond.wait_for(lambda: not self._flushing)
+            self._flushing = True
+            await self._cond.wait_for(lambda: self._readers == 0)
+        try:
+            return await self._flush_pending()
+        finally:
+            async with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+
+    async def _flush_pending(self) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        self._inflight = batch
+
+        start = time.perf_counter()
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(_increment_clicks, [{"url_id": k, "delta": v} for k, v in batch.items()])
+        except BaseException:
+            # เขียนไม่สำเร็จ (หรือถูก cancel ตอนปิดแอป) คืน clicks กลับเข้า pending เพื่อเขียนใหม่รอบหน้า
+            for url_id, n in batch.items():
+                self._pending[url_id] = self._pending.get(url_id, 0) + n
+            self._inflight = {}
+            self.failed_flushes += 1
+            raise
+
+        if self.on_flush:
+            self.on_flush(batch)
+        self._inflight = {}
+        self.flushes += 1
+        self.flushed_clicks += sum(batch.values())
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Click flush failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # หยุด loop แล้ว flush รอบสุดท้ายก่อนปิดแอป
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        pending_clicks = sum(self._pending.values()) + sum(self._inflight.values())
+        pending_urls = len(self._pending.keys() | self._inflight.keys())
+        return {
+            "flush_interval_seconds": self.flush_interval,
+            "pending_urls": pending_urls,
+            "pending_clicks": pending_clicks,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flushed_clicks": self.flushed_clicks,
+            "last_flush_ms": self.last_flush_ms,
+        }
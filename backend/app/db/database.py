@@ -1,8 +1,20 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 
+from app.core.config import (
+    DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_QUERY_CACHE_SIZE, DB_STATEMENT_CACHE_SIZE,
+)
+
 # โหลดค่าจากไฟล์ .env ที่อยู่ในโฟลเดอร์เดียวกัน
 load_dotenv()
 
@@ -17,17 +29,103 @@ print(f"กำลังเชื่อมต่อฐานข้อมูลด
 print("="*60)
 
 
-# สร้าง Engine ด้วย URL ที่ได้มา
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# driver แบบ async ที่ใช้แทน driver ปกติของแต่ละฐานข้อมูล
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str):
+    """Rewrites e.g. postgresql:// or postgresql+psycopg2:// to the matching asyncio driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    return parsed
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that also records how long callers waited to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            # เวลารอรวมทั้งรอ connection ว่างในคิวและเปิด connection ใหม่ (overflow)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait_ms += elapsed_ms
+                self.max_wait_ms = max(self.max_wait_ms, elapsed_ms)
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL) -> AsyncEngine:
+    """Builds the application's async engine with pool settings taken from app.core.config."""
+    async_url = to_async_url(url)
+    kwargs: Dict[str, Any] = {"query_cache_size": DB_QUERY_CACHE_SIZE}
+    if async_url.get_backend_name() == "sqlite" and async_url.database in (None, "", ":memory:"):
+        # SQLite แบบ in-memory ต้องใช้ connection เดียวร่วมกัน (StaticPool ค่าเริ่มต้นของ SQLAlchemy)
+        return create_async_engine(async_url, **kwargs)
+    if async_url.get_backend_name() == "postgresql":
+        # prepared statement cache ต่อ connection ของ asyncpg
+        async_url = async_url.update_query_dict({"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)})
+    return create_async_engine(
+        async_url,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        **kwargs,
+    )
+
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, Any]:
+    pool = engine.pool
+    stats: Dict[str, Any] = {"pid": os.getpid(), "pool_class": type(pool).__name__}
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+            "recycle_seconds": pool._recycle,
+            "pre_ping": pool._pre_ping,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            # overflow ติดลบหมายถึงยังเปิด connection ไม่ครบ pool_size
+            "overflow": pool.overflow(),
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "avg_wait_ms": round(pool.total_wait_ms / pool.checkouts, 3) if pool.checkouts else 0.0,
+            "max_wait_ms": round(pool.max_wait_ms, 3),
+        })
+    return stats
+
+
+# engine เดียวของทั้งแอป (ทุก module import จากที่นี่)
+engine = create_db_engine()
 
 # สร้าง SessionLocal และ Base สำหรับใช้งานในส่วนอื่นๆ
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False เพื่อให้อ่าน attribute หลัง commit ได้โดยไม่ต้อง query ซ้ำ (lazy load ใช้ไม่ได้ใน async)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # ฟังก์ชันสำหรับ Dependency Injection ใน FastAPI
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
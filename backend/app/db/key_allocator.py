@@ -0,0 +1,32 @@
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import engine
+from app.db.url_models import ShortKeyBlock
+
+# เริ่มนับที่ 62^5 เพื่อให้ key ที่ได้ยาวอย่างน้อย 6 ตัวอักษร
+FIRST_KEY_VALUE = 62 ** 5
+_COUNTER_ID = 1
+
+
+async def allocate_key_block(size: int) -> int:
+    """Atomically reserves `size` consecutive ids and returns the first one."""
+    stmt = (
+        update(ShortKeyBlock)
+        .where(ShortKeyBlock.id == _COUNTER_ID)
+        .values(next_value=ShortKeyBlock.next_value + size)
+        .returning(ShortKeyBlock.next_value)
+    )
+    for _ in range(2):
+        async with engine.begin() as conn:
+            end = (await conn.execute(stmt)).scalar()
+        if end is not None:
+            return end - size
+        # ยังไม่มีแถวตัวนับ สร้างแถวแรก (ถ้า worker อื่นสร้างไปก่อนก็วนไป UPDATE ใหม่)
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(insert(ShortKeyBlock).values(id=_COUNTER_ID, next_value=FIRST_KEY_VALUE + size))
+            return FIRST_KEY_VALUE
+        except IntegrityError:
+            continue
+    raise RuntimeError("Could not allocate a short key block")
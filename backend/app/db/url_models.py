@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Index, Integer, String, DateTime
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -13,10 +13,27 @@ class URLShorten(Base):
     created_by = Column(String, nullable=True)
     updated_by = Column(String, nullable=True)
 
+    # index สำหรับ keyset pagination และการกรองตามผู้สร้าง
+    __table_args__ = (
+        Index("ix_url_shorten_created_at_id", "created_at", "id"),
+        Index("ix_url_shorten_created_by_created_at_id", "created_by", "created_at", "id"),
+    )
+
 class URLShortenAudit(Base):
     __tablename__ = "url_shorten_audit"
     id = Column(Integer, primary_key=True, index=True)
     action = Column(String, nullable=False)  # เช่น "CREATE", "UPDATE", "DELETE"
     performed_by = Column(String, nullable=False)
     performed_at = Column(DateTime(timezone=False), server_default=func.now())  # เปลี่ยน timezone=True -> False
-    short_key = Column(String(20), nullable=True) 
+    short_key = Column(String(20), nullable=True)
+
+    __table_args__ = (
+        Index("ix_url_shorten_audit_performed_at_id", "performed_at", "id"),
+        Index("ix_url_shorten_audit_action_performed_at_id", "action", "performed_at", "id"),
+    )
+
+class ShortKeyBlock(Base):
+    # ตัวนับกลางสำหรับจอง id เป็นช่วง ๆ ให้แต่ละ worker (ใช้กับ SHORT_KEY_STRATEGY=block)
+    __tablename__ = "short_key_block"
+    id = Column(Integer, primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
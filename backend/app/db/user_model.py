@@ -1,12 +1,20 @@
 from sqlalchemy import Column, String, DateTime
 from app.db.database import Base
 import uuid
-from sqlalchemy import Column, DateTime, func
+from sqlalchemy import JSON, Column, Computed, DateTime, Index, Text, func
+
+# ฟิลด์ที่ค้นหาได้ใน GET /api/v1/user/?q=... รวมเป็นข้อความตัวพิมพ์เล็กก้อนเดียวเพื่อทำ index
+SEARCH_FIELDS = ("first_name", "last_name", "display_name", "username", "email", "citizen_id", "mobile_no", "address")
+SEARCH_TEXT_EXPRESSION = "lower(" + " || ' ' || ".join(f"coalesce({name}, '')" for name in SEARCH_FIELDS) + ")"
+
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     avatar_url = Column(String, nullable=True)
+    # รูปย่อที่สร้างจาก avatar {"64": object_name, "256": object_name} (None ระหว่างรอสร้าง)
+    avatar_variants = Column(JSON, nullable=True)
     display_name = Column(String, nullable=True)
     title = Column(String, nullable=True)
     first_name = Column(String, nullable=False)
@@ -26,3 +34,10 @@ class User(Base):
     created_by = Column(String, nullable=True)
     updated_at = Column(DateTime(timezone=False), server_default=func.now(), onupdate=func.now(), nullable=False)
     updated_by = Column(String, nullable=False)
+    # คำนวณโดยฐานข้อมูลเอง (generated column) จึงไม่ต้องดูแลในโค้ดตอน create/update
+    search_text = Column(Text, Computed(SEARCH_TEXT_EXPRESSION, persisted=True))
+
+    __table_args__ = (
+        # keyset pagination ของ GET /api/v1/user/ เรียงตาม (created_at, id)
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
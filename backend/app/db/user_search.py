@@ -0,0 +1,85 @@
+from sqlalchemy import Select, column, func, literal_column, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db.user_model import SEARCH_TEXT_EXPRESSION, User
+
+# PostgreSQL: GIN trigram index บน search_text ใช้ได้กับ LIKE '%q%' โดยไม่ต้อง scan ทั้งตาราง
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"ALTER TABLE users ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS ({SEARCH_TEXT_EXPRESSION}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_users_search_text_trgm ON users USING gin (search_text gin_trgm_ops)",
+]
+
+# SQLite เพิ่ม STORED generated column ด้วย ALTER ไม่ได้ ตารางที่สร้างก่อนมี search_text จึงได้เป็น VIRTUAL
+# (คำนวณตอนอ่าน ค่าเหมือนกัน และ FTS5 ด้านล่างเก็บ index ของมันไว้อยู่แล้ว)
+_SQLITE_ADD_SEARCH_TEXT = f"ALTER TABLE users ADD COLUMN search_text TEXT GENERATED ALWAYS AS ({SEARCH_TEXT_EXPRESSION}) VIRTUAL"
+
+# SQLite: ตาราง FTS5 (trigram tokenizer) ที่อ่านข้อความจาก users.search_text และ trigger คอย sync ให้
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "search_text, content='users', content_rowid='rowid', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts(rowid, search_text) VALUES (new.rowid, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, search_text) VALUES ('delete', old.rowid, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE ON users BEGIN "
+    "INSERT INTO users_fts(users_fts, rowid, search_text) VALUES ('delete', old.rowid, old.search_text); "
+    "INSERT INTO users_fts(rowid, search_text) VALUES (new.rowid, new.search_text); END",
+]
+
+# trigram ต้องมีอย่างน้อย 3 ตัวอักษร คำค้นที่สั้นกว่านี้ใช้ index ไม่ได้
+MIN_INDEXED_TERM_LENGTH = 3
+
+
+async def ensure_user_search_index(conn: AsyncConnection) -> None:
+    """Creates the search index for the current dialect (safe to run on every startup)."""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            await conn.execute(text(statement))
+    elif dialect == "sqlite":
+        # table_xinfo (ไม่ใช่ table_info) จึงจะเห็น generated column
+        columns = (await conn.execute(text("PRAGMA table_xinfo(users)"))).all()
+        if not any(row[1] == "search_text" for row in columns):
+            await conn.execute(text(_SQLITE_ADD_SEARCH_TEXT))
+        exists = await conn.scalar(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"))
+        for statement in _SQLITE_DDL:
+            await conn.execute(text(statement))
+        if not exists:
+            # สร้าง index ครั้งแรก เติมข้อมูลจากแถวที่มีอยู่แล้ว
+            await conn.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+
+def _fts_match(term: str) -> str:
+    # ครอบคำค้นเป็น phrase ของ FTS5 เพื่อไม่ให้ตัวอักษรพิเศษถูกตีความเป็น operator
+    return '"' + term.replace('"', '""') + '"'
+
+
+def apply_user_search(query: Select, dialect: str, q: str, ranked: bool = False) -> Select:
+    """Filters `query` (a select of User) to rows whose search text contains `q`.
+
+    With `ranked`, the best matches come first (trigram word similarity on PostgreSQL,
+    bm25 on SQLite); callers add their own ordering after it as a tie-breaker.
+    """
+    term = q.lower()
+    pattern = f"%{term}%"
+    if dialect == "sqlite":
+        if ranked and len(term) >= MIN_INDEXED_TERM_LENGTH:
+            matches = (
+                text("SELECT rowid, bm25(users_fts) AS rank FROM users_fts WHERE users_fts MATCH :match")
+                .bindparams(match=_fts_match(term))
+                .columns(column("rowid"), column("rank"))
+                .subquery("fts")
+            )
+            return query.join(matches, matches.c.rowid == literal_column("users.rowid")).order_by(matches.c.rank)
+        return query.where(
+            literal_column("users.rowid").in_(
+                text("SELECT rowid FROM users_fts WHERE search_text LIKE :pattern")
+                .bindparams(pattern=pattern)
+                .columns(column("rowid"))
+            )
+        )
+    query = query.where(User.search_text.like(pattern))
+    if ranked and dialect == "postgresql":
+        query = query.order_by(func.word_similarity(term, User.search_text).desc())
+    return query
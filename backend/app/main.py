@@ -1,20 +1,58 @@
 # main.py หรือ app.py
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter
 from slowapi.middleware import SlowAPIMiddleware
 from slowapi.util import get_remote_address
 
+from app.core.storage import LocalStorage, storage, storage_initializer
+from app.db.avatar_pipeline import ensure_avatar_variants_column
 from app.db.database import Base, engine
-from app.api.urlshorten import router as urlshorten_router
+from app.db.user_search import ensure_user_search_index
+from app.api.urlshorten import router as urlshorten_router, redirect_router, click_counter, audit_writer
 from app.api.auth import router as auth_router  
-from app.api.simulation import router as simulation_router  
-from app.api.user import router as user_router
+from app.api.simulation import router as simulation_router, http_client, log_pipeline, metrics_publisher, request_queue, shutdown_simulation
+from app.api.user import router as user_router, avatar_pipeline
+from app.api.system import router as system_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_avatar_variants_column(conn)
+        await ensure_user_search_index(conn)
+    # เตรียม bucket ของ MinIO เบื้องหลัง แอปเริ่มรับ request ได้ทันทีแม้ MinIO ยังไม่พร้อม
+    storage_initializer.start()
+    click_counter.start()
+    audit_writer.start()
+    avatar_pipeline.start()
+    # เริ่ม thread เขียน log และการส่ง log เป็นชุดทาง WebSocket
+    log_pipeline.start()
+    metrics_publisher.start()
+    # เปิดคิวของ Throttle Service (คิวบนดิสก์จะโหลดรายการที่ค้างจากรอบก่อนกลับมา)
+    await request_queue.start()
+    # connection pool ของ HTTP client ที่ simulation ใช้ร่วมกัน
+    await http_client.start()
+    yield
+    # หยุด simulation ก่อนอย่างอื่น (server ปิดรับ connection แล้ว ส่งต่อไปยัง Echo ไม่ได้อีก)
+    # และรอ Throttle Processor จบก่อนปิดคิวและ HTTP client ที่มันใช้อยู่
+    await shutdown_simulation()
+    await request_queue.stop()
+    await http_client.close()
+    # flush clicks และ audit log ที่ค้างอยู่ก่อนปิดแอป
+    await click_counter.stop()
+    await audit_writer.stop()
+    await avatar_pipeline.stop()
+    await storage_initializer.stop()
+    await metrics_publisher.stop()
+    await log_pipeline.stop()
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -23,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset"],
 )
 
 # Rate limiter
@@ -33,7 +72,14 @@ app.state.limiter = limiter
 # รวม router ต่าง ๆ
 app.include_router(auth_router)
 app.include_router(urlshorten_router)
+app.include_router(redirect_router)
 
 # เพิ่ม prefix /simulation สำหรับ simulation router
 app.include_router(simulation_router)
 app.include_router(user_router)
+app.include_router(system_router)
+
+# STORAGE_BACKEND=local: เสิร์ฟไฟล์ที่อัปโหลดจากโฟลเดอร์ในเครื่อง
+if isinstance(storage, LocalStorage):
+    storage.ensure_ready()
+    app.mount("/media", StaticFiles(directory=storage.root), name="media")
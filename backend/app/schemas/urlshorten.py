@@ -23,6 +23,7 @@ class URLShortenResponse(URLShortenBase):
 
     class Config:
         orm_mode = True
+        from_attributes = True
         
 #   getlog      
 class URLShortenAuditResponse(BaseModel):
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 
@@ -29,6 +29,7 @@ class UserUpdate(UserBase):
 
 class UserOut(UserBase):
     id: str
+    avatar_variants: Optional[Dict[str, str]] = None
     created_at: Optional[datetime] = None
     created_by: Optional[str] = None
     updated_at: Optional[datetime] = None
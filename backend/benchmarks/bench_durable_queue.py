@@ -0,0 +1,60 @@
+"""Enqueue and dequeue+ack throughput of DurableQueue (SQLite WAL, group commit) vs. the in-memory queue.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_durable_queue --items 65536 --producers 512
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.core.bounded_queue import BoundedQueue
+from app.core.durable_queue import DurableQueue
+
+
+async def run(queue, items: int, producers: int):
+    await queue.start()
+    try:
+        # ผู้ผลิตพร้อมกันหลายตัว เหมือน request ที่เข้ามาที่ POST /throttle พร้อมกัน
+        async def produce(offset: int):
+            for i in range(offset, items, producers):
+                await queue.put({"id": i, "data": f"This is call number {i}"})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(produce(p) for p in range(producers)))
+        put_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(items):
+            receipt, _item = await queue.get()
+            queue.task_done(receipt)
+        get_time = time.perf_counter() - start
+        stats = queue.stats()
+    finally:
+        await queue.stop()
+    return put_time, get_time, stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=65536)
+    parser.add_argument("--producers", type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queues = {
+            "memory": BoundedQueue(args.items),
+            "sqlite": DurableQueue(os.path.join(tmp, "queue.db")),
+        }
+        for name, queue in queues.items():
+            put_time, get_time, stats = await run(queue, args.items, args.producers)
+            print(
+                f"{name:<7} put={args.items / put_time:>10,.0f}/s  get+ack={args.items / get_time:>10,.0f}/s  "
+                f"commits={stats.get('commits', '-')} average_batch={stats.get('average_batch', '-')}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""Create latency as the url_shorten table grows, per short-key strategy.
+
+`legacy` reproduces the old SELECT-until-unused loop with random keys; its retries
+grow as the keyspace fills, which `--legacy-length` makes visible at small table
+sizes.  Run from the backend directory:
+
+    python -m benchmarks.bench_keygen --rows 20000 --step 2000 --legacy-length 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import select
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench_keygen.db")
+
+from app.api import urlshorten  # noqa: E402
+from app.core.keygen import KeyGenerator, RandomKeyGenerator, create_key_generator  # noqa: E402
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.db.key_allocator import allocate_key_block  # noqa: E402
+from app.db.url_models import URLShorten  # noqa: E402
+from app.schemas.urlshorten import URLShortenCreate  # noqa: E402
+
+
+class LegacyLoopGenerator(KeyGenerator):
+    """SELECT-before-INSERT loop that `create_url` used before pluggable strategies."""
+
+    def __init__(self, db, length: int):
+        self.db = db
+        self.random = RandomKeyGenerator(length)
+        self.retries = 0
+
+    async def next_key(self) -> str:
+        key = await self.random.next_key()
+        while await self.db.scalar(select(URLShorten.id).where(URLShorten.short_key == key)):
+            self.retries += 1
+            key = await self.random.next_key()
+        return key
+
+
+async def run(strategy: str, rows: int, step: int, legacy_length: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    # audit ของแต่ละ create ต้องมี writer คอยเขียนออก ไม่อย่างนั้นคิวจะเต็มแล้ว block
+    urlshorten.audit_writer.start()
+    db = SessionLocal()
+    if strategy == "legacy":
+        generator = LegacyLoopGenerator(db, legacy_length)
+    else:
+        # benchmark รันใน process เดียว จึงใช้ worker id 0 ได้
+        generator = create_key_generator(strategy, allocator=allocate_key_block, worker_id=0)
+    urlshorten.key_generator = generator
+    data = URLShortenCreate(original_url="https://example.com/bench")
+
+    print(f"--- {strategy}")
+    try:
+        for bucket_start in range(0, rows, step):
+            latencies = []
+            for _ in range(step):
+                start = time.perf_counter()
+                await urlshorten.create_url(data, db=db, user="bench")
+                latencies.append((time.perf_counter() - start) * 1000)
+            extra = f" retries={generator.retries}" if strategy == "legacy" else ""
+            print(
+                f"rows={bucket_start + step:>8} mean={statistics.mean(latencies):.3f}ms "
+                f"max={max(latencies):.3f}ms creates/s={step / (sum(latencies) / 1000):.0f}{extra}"
+            )
+    finally:
+        await db.close()
+        await urlshorten.audit_writer.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--step", type=int, default=2000)
+    parser.add_argument("--legacy-length", type=int, default=8)
+    parser.add_argument("--strategies", default="legacy,random,snowflake,block")
+    args = parser.parse_args()
+    for strategy in args.strategies.split(","):
+        await run(strategy, args.rows, args.step, args.legacy_length)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Time spent in logger.info() on the caller (event loop) with direct handlers vs. the queued LogPipeline.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_log_pipeline --records 100000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from app.core.log_pipeline import BatchingHandler, LogPipeline
+
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+async def discard(batch):
+    pass
+
+
+class TaskPerRecordHandler(logging.Handler):
+    """The previous WebSocket handler: one asyncio task per record."""
+
+    def emit(self, record):
+        entry = {"timestamp": self.formatter.formatTime(record), "level": record.levelname, "message": record.getMessage()}
+        asyncio.create_task(discard(entry))
+
+
+def make_handlers(directory: str):
+    formatter = logging.Formatter(FORMAT)
+    # console จำลองด้วยไฟล์ เพื่อไม่ให้ผลขึ้นกับความเร็วของ terminal
+    console = logging.StreamHandler(open(os.path.join(directory, "console.log"), "w"))
+    file_handler = logging.FileHandler(os.path.join(directory, "simulation.log"))
+    for handler in (console, file_handler):
+        handler.setFormatter(formatter)
+    return console, file_handler, formatter
+
+
+async def log_records(logger: logging.Logger, records: int) -> float:
+    start = time.perf_counter()
+    for i in range(records):
+        logger.info(f"[Throttle] Forwarding ID {i} to Echo Service.")
+        if i % 1000 == 0:
+            # ให้ event loop ได้ทำงานอื่น (เช่น ส่ง batch) เหมือนตอนรันจริง
+            await asyncio.sleep(0)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        console, file_handler, formatter = make_handlers(tmp)
+        direct = logging.getLogger("bench_direct")
+        direct.propagate = False
+        direct.setLevel(logging.INFO)
+        direct.addHandler(console)
+        direct.addHandler(file_handler)
+        per_record = TaskPerRecordHandler()
+        per_record.setFormatter(formatter)
+        direct.addHandler(per_record)
+        elapsed = await log_records(direct, args.records)
+        print(f"direct    {args.records / elapsed:>10,.0f} records/s on the caller")
+
+        console, file_handler, formatter = make_handlers(tmp)
+        batching = BatchingHandler(discard, 0.1, args.records)
+        batching.setFormatter(formatter)
+        pipeline = LogPipeline([console, file_handler, batching], max_queue=args.records)
+        queued = logging.getLogger("bench_pipeline")
+        queued.propagate = False
+        queued.setLevel(logging.INFO)
+        pipeline.attach(queued)
+        pipeline.start()
+        elapsed = await log_records(queued, args.records)
+        drain_start = time.perf_counter()
+        await pipeline.stop()
+        stats = pipeline.stats()
+        print(f"pipeline  {args.records / elapsed:>10,.0f} records/s on the caller  "
+              f"(drain {time.perf_counter() - drain_start:.2f}s, dropped={stats['dropped']}, batches={stats['batches_sent']})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
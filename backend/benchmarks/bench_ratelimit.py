@@ -0,0 +1,56 @@
+"""Checks per second and memory per key for each rate limit algorithm in app.core.ratelimit.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_ratelimit --checks 500000 --keys 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from app.core.ratelimit import ALGORITHMS, create_rate_limiter
+
+
+def checks_per_second(algorithm: str, checks: int, keys: int, limit: int) -> float:
+    limiter = create_rate_limiter(algorithm, limit, 60, max_keys=keys)
+    key_names = [f"client-{i}" for i in range(keys)]
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.allow(key_names[i % keys])
+    return checks / (time.perf_counter() - start)
+
+
+def bytes_per_key(algorithm: str, keys: int, limit: int, requests_per_key: int) -> float:
+    key_names = [f"client-{i}" for i in range(keys)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    limiter = create_rate_limiter(algorithm, limit, 60, max_keys=keys)
+    for name in key_names:
+        for _ in range(requests_per_key):
+            limiter.allow(name)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return used / keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=500000)
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=512)
+    parser.add_argument("--requests-per-key", type=int, default=10)
+    args = parser.parse_args()
+
+    for algorithm in ALGORITHMS:
+        hot = checks_per_second(algorithm, args.checks, 1, args.limit)
+        spread = checks_per_second(algorithm, args.checks, args.keys, args.limit)
+        memory = bytes_per_key(algorithm, min(args.keys, 20000), args.limit, args.requests_per_key)
+        print(
+            f"{algorithm:<16} single-key={hot:>10,.0f} checks/s  {args.keys}-keys={spread:>10,.0f} checks/s  "
+            f"memory={memory:,.0f} B/key ({args.requests_per_key} requests/key)"
+        )
+
+
+if __name__ == "__main__":
+    main()
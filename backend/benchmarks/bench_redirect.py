@@ -0,0 +1,48 @@
+"""Requests per second of GET /r/{short_key} compared with the JSON lookup endpoint.
+
+Start the backend first (e.g. `uvicorn app.main:app --port 8000`), then run:
+
+    python -m benchmarks.bench_redirect --base-url http://localhost:8000 --concurrency 50 --duration 10
+"""
+import argparse
+import asyncio
+
+import aiohttp
+
+from benchmarks.loadgen import print_result, run_load
+
+
+async def create_short_url(session: aiohttp.ClientSession, base_url: str) -> str:
+    async with session.post(f"{base_url}/api/v1/token", json={"keyword": "bench"}) as response:
+        token = (await response.json())["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    async with session.post(
+        f"{base_url}/api/v1/urlshorten/", json={"original_url": "https://example.com/bench"}, headers=headers
+    ) as response:
+        return (await response.json())["short_key"]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    base_url = args.base_url.rstrip("/")
+
+    async with aiohttp.ClientSession() as session:
+        short_key = await create_short_url(session, base_url)
+        json_result = await run_load(
+            session, "GET", lambda _: f"{base_url}/api/v1/urlshorten/{short_key}",
+            concurrency=args.concurrency, duration=args.duration, expected_status=200,
+        )
+        print_result("GET /api/v1/urlshorten/{key}", json_result)
+        redirect_result = await run_load(
+            session, "GET", lambda _: f"{base_url}/r/{short_key}",
+            concurrency=args.concurrency, duration=args.duration,
+        )
+        print_result("GET /r/{key}", redirect_result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
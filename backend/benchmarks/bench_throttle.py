@@ -0,0 +1,51 @@
+"""Forwarding throughput of the throttle service (POST /throttle -> /echo) against its quota.
+
+Start the backend first (e.g. `uvicorn app.main:app --port 8000`), then run:
+
+    python -m benchmarks.bench_throttle --base-url http://localhost:8000 --calls 1024
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--calls", type=int, default=1024)
+    args = parser.parse_args()
+    api = f"{args.base_url.rstrip('/')}/api/v1/simulation"
+
+    async with aiohttp.ClientSession() as session:
+        # mode ที่ไม่มีในตาราง = ไม่ยิง request เอง แค่เปิด throttle processor
+        async with session.post(f"{api}/start-simulation", params={"mode": -1}) as response:
+            response.raise_for_status()
+        async with session.get(f"{api}/throttle/stats") as response:
+            sent_before = (await response.json())["sent"]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            session.post(f"{api}/throttle", json={"id": i, "data": f"bench {i}"}) for i in range(args.calls)
+        ))
+        while True:
+            async with session.get(f"{api}/throttle/stats") as response:
+                stats = await response.json()
+            if stats["sent"] - sent_before >= args.calls and stats["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - start
+
+        await session.post(f"{api}/stop-simulation")
+
+    rate = args.calls / elapsed * 60
+    print(
+        f"calls={args.calls} time={elapsed:.2f}s achieved={rate:,.0f}/min quota={stats['quota_per_minute']}/min "
+        f"({rate / stats['quota_per_minute']:.0%}) max_in_flight={stats['max_in_flight']} "
+        f"latency={stats['average_latency_ms']}ms rejected={stats['rejected']} failed={stats['failed']}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+"""Latency of GET /api/v1/urlshorten/{short_key} with and without the short-key cache.
+
+Keys are drawn from a Zipf distribution so a few popular links take most of the
+traffic.  Run from the backend directory:
+
+    python -m benchmarks.bench_url_cache --urls 10000 --lookups 20000 --skew 1.1
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import delete, insert
+
+# ใช้ SQLite ชั่วคราวถ้าไม่ได้กำหนด DATABASE_URL มาเอง
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench_url_cache.db")
+
+from app.api import urlshorten  # noqa: E402
+from app.core.cache import TTLCache  # noqa: E402
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.db.url_models import URLShorten  # noqa: E402
+
+
+async def seed(num_urls: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(URLShorten))
+        await conn.execute(insert(URLShorten), [
+            {"original_url": f"https://example.com/{i}", "short_key": f"k{i:07d}", "clicks": 0}
+            for i in range(num_urls)
+        ])
+    return [f"k{i:07d}" for i in range(num_urls)]
+
+
+def zipf_sample(keys, count: int, skew: float):
+    weights = [1.0 / (rank ** skew) for rank in range(1, len(keys) + 1)]
+    return random.choices(keys, weights=weights, k=count)
+
+
+async def run(sample, maxsize: int):
+    urlshorten.url_cache = TTLCache(maxsize=maxsize, ttl=urlshorten.url_cache.ttl)
+    latencies = []
+    async with SessionLocal() as db:
+        for key in sample:
+            start = time.perf_counter()
+            await urlshorten.get_url_by_short_key(key, db=db)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, latencies, stats=None):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<12} mean={statistics.mean(latencies):.3f}ms p50={p50:.3f}ms p99={p99:.3f}ms")
+    if stats:
+        print(f"{'':<12} {stats}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--cache-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    keys = await seed(args.urls)
+    sample = zipf_sample(keys, args.lookups, args.skew)
+
+    report("no cache", await run(sample, maxsize=0))
+    report("cache", await run(sample, maxsize=args.cache_size), urlshorten.url_cache.stats())
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
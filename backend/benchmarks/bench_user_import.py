@@ -0,0 +1,58 @@
+"""Wall time of POST /api/v1/user/import and GET /api/v1/user/export for N users.
+
+Start the backend first (e.g. `uvicorn app.main:app --port 8000`), then run:
+
+    python -m benchmarks.bench_user_import --base-url http://localhost:8000 --users 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import aiohttp
+
+
+def ndjson_users(count: int) -> bytes:
+    # ใช้ run id ต่อท้าย เพื่อให้รันซ้ำได้โดย email/username ไม่ชนกับรอบก่อน
+    run_id = uuid.uuid4().hex[:8]
+    return "\n".join(
+        json.dumps({
+            "first_name": f"First{i}", "last_name": "Bench", "username": f"bench{run_id}{i}",
+            "email": f"bench{run_id}{i}@example.com", "mobile_no": f"08{i:08d}", "address": "Bangkok",
+        })
+        for i in range(count)
+    ).encode()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=100000)
+    args = parser.parse_args()
+    base_url = args.base_url.rstrip("/")
+    body = ndjson_users(args.users)
+
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        start = time.perf_counter()
+        async with session.post(
+            f"{base_url}/api/v1/user/import", data=body, headers={"Content-Type": "application/x-ndjson"}
+        ) as response:
+            lines = (await response.read()).splitlines()
+        elapsed = time.perf_counter() - start
+        errors = sum(1 for line in lines if b'"error"' in line)
+        print(f"import  status={response.status} rows={args.users} errors={errors} "
+              f"time={elapsed:.2f}s rows/s={args.users / elapsed:.0f}")
+
+        for fmt in ("csv", "ndjson"):
+            start = time.perf_counter()
+            size = 0
+            async with session.get(f"{base_url}/api/v1/user/export", params={"format": fmt}) as response:
+                async for chunk in response.content.iter_any():
+                    size += len(chunk)
+            print(f"export  format={fmt:<6} status={response.status} bytes={size} time={time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
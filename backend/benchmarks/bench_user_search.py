@@ -0,0 +1,97 @@
+"""Latency of the user directory search: eight ORed ilike predicates vs the search index.
+
+Seeds `--users` rows (on SQLite unless DATABASE_URL is set), then times each search
+term with the legacy filter and with `apply_user_search`, both plain and ranked.
+Run from the backend directory:
+
+    python -m benchmarks.bench_user_search --users 1000000 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+_tmpdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/bench_user_search.db")
+
+from sqlalchemy import func, insert, or_, select  # noqa: E402
+
+from app.db.database import Base, SessionLocal, engine  # noqa: E402
+from app.db.user_model import User  # noqa: E402
+from app.db.user_search import apply_user_search, ensure_user_search_index  # noqa: E402
+
+FIRST_NAMES = ["somchai", "somsak", "malee", "suda", "anan", "preecha", "nattaya", "kittipong", "wanida", "john"]
+LAST_NAMES = ["srisuk", "wongsa", "chaiyaporn", "rattanakorn", "boonmee", "saetang", "smith", "kaewmanee"]
+CITIES = ["Bangkok", "Chiang Mai", "Khon Kaen", "Phuket", "Hat Yai", "Nakhon Ratchasima"]
+
+
+async def seed(num_users: int, batch_size: int = 10000):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_user_search_index(conn)
+    rng = random.Random(42)
+    for offset in range(0, num_users, batch_size):
+        rows = []
+        for i in range(offset, min(offset + batch_size, num_users)):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            rows.append({
+                "id": str(uuid.uuid4()), "first_name": first, "last_name": last,
+                "username": f"{first}.{last}{i}", "email": f"{first}.{last}{i}@example.com",
+                "mobile_no": f"08{rng.randrange(10**8):08d}", "address": rng.choice(CITIES), "updated_by": "bench",
+            })
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), rows)
+
+
+def legacy_query(q: str):
+    return select(User).where(or_(
+        User.first_name.ilike(f"%{q}%"), User.last_name.ilike(f"%{q}%"),
+        User.display_name.ilike(f"%{q}%"), User.username.ilike(f"%{q}%"),
+        User.email.ilike(f"%{q}%"), User.citizen_id.ilike(f"%{q}%"),
+        User.mobile_no.ilike(f"%{q}%"), User.address.ilike(f"%{q}%"),
+    ))
+
+
+async def time_search(query, repeat: int, limit: int = 10):
+    # เหมือน get_users: นับจำนวนทั้งหมด แล้วดึงหน้าแรก
+    latencies = []
+    async with SessionLocal() as db:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await db.scalar(select(func.count()).select_from(query.subquery()))
+            (await db.scalars(query.order_by(User.created_at.asc()).limit(limit))).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--terms", default="kittipong.saetang12,chaiyaporn,example.com,0812345")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    await seed(args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - started:.1f}s ({engine.dialect.name})")
+
+    dialect = engine.dialect.name
+    for term in args.terms.split(","):
+        for label, query in (
+            ("legacy ilike", legacy_query(term)),
+            ("search", apply_user_search(select(User), dialect, term)),
+            ("search ranked", apply_user_search(select(User), dialect, term, ranked=True)),
+        ):
+            p50, p95 = await time_search(query, args.repeat)
+            print(f"{term:<22} {label:<14} p50={p50:.2f}ms p95={p95:.2f}ms")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""Small closed-loop HTTP load generator shared by the benchmarks."""
+import asyncio
+import statistics
+import time
+from typing import Callable, Dict, Optional
+
+import aiohttp
+
+
+async def run_load(
+    session: aiohttp.ClientSession,
+    method: str,
+    url_factory: Callable[[int], str],
+    concurrency: int = 50,
+    duration: float = 10.0,
+    expected_status: Optional[int] = None,
+    **request_kwargs,
+) -> Dict[str, float]:
+    """Keeps `concurrency` requests in flight for `duration` seconds and returns throughput/latency."""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    counter = 0
+
+    async def worker():
+        nonlocal errors, counter
+        while time.perf_counter() < deadline:
+            counter += 1
+            url = url_factory(counter)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, allow_redirects=False, **request_kwargs) as response:
+                    await response.read()
+                    if expected_status is not None and response.status != expected_status:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)], 2) if latencies else 0.0,
+    }
+
+
+def print_result(label: str, result: Dict[str, float]):
+    print(
+        f"{label:<28} rps={result['rps']:<10} p50={result['p50_ms']}ms "
+        f"p99={result['p99_ms']}ms requests={result['requests']} errors={result['errors']}"
+    )
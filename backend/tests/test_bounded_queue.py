@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+from app.core.bounded_queue import BoundedQueue
+
+
+def test_spill_drain_and_clear(tmp_path):
+    async def run():
+        path = tmp_path / "spill.ndjson"
+        queue = BoundedQueue(2, "spill", str(path))
+        for i in range(5):
+            await queue.put({"id": i})
+        assert queue.stats()["spilled_depth"] == 3
+
+        # อ่านออกตามลำดับเดิม และไฟล์ถูกตัดทิ้งเมื่ออ่านหมด
+        drained = []
+        for _ in range(5):
+            _, item = await queue.get()
+            queue.task_done()
+            drained.append(item["id"])
+        assert drained == [0, 1, 2, 3, 4]
+        assert os.path.getsize(path) == 0
+
+        # spill อีกรอบแล้ว clear: นับทั้งในหน่วยความจำและในไฟล์
+        for i in range(4):
+            await queue.put({"id": i})
+        assert await queue.clear() == 4
+        assert queue.qsize() == 0
+        assert os.path.getsize(path) == 0
+
+        # หลัง clear ใช้ต่อได้ตามปกติ
+        await queue.put({"id": 9})
+        assert (await queue.get())[1] == {"id": 9}
+
+    asyncio.run(run())
@@ -0,0 +1,97 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.db import click_counter as cc
+from app.db.click_counter import ClickCounter
+
+
+class FakeEngine:
+    """Stands in for the async engine: applies increments to `rows` when the transaction commits."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fail = False
+        # ถ้าตั้งไว้ commit จะค้างอยู่หลังเขียนแล้ว จนกว่าจะ set (จำลองช่วงก่อน flush เคลียร์ in-flight)
+        self.after_commit = None
+
+    @asynccontextmanager
+    async def begin(self):
+        updates = []
+
+        class Conn:
+            async def execute(_, statement, params):
+                if self.fail:
+                    raise OSError("database is down")
+                updates.extend(params)
+
+        yield Conn()
+        for p in updates:
+            self.rows[p["url_id"]] = self.rows.get(p["url_id"], 0) + p["delta"]
+        if self.after_commit is not None:
+            await self.after_commit.wait()
+
+
+def test_reading_counts_every_click_once(monkeypatch):
+    async def run():
+        engine = FakeEngine({1: 10})
+        monkeypatch.setattr(cc, "engine", engine)
+        counter = ClickCounter()
+        counter.add(1, 5)
+
+        # flush ที่เริ่มระหว่างอ่านต้องรอให้อ่านเสร็จก่อน
+        async with counter.reading():
+            flush = asyncio.create_task(counter.flush())
+            await asyncio.sleep(0.01)
+            assert engine.rows[1] == 10
+            assert engine.rows[1] + counter.pending(1) == 15
+        await flush
+        assert engine.rows[1] == 15 and counter.pending(1) == 0
+
+        # reader ที่มาหลัง commit แต่ก่อน flush เคลียร์ in-flight ต้องรอ ไม่อย่างนั้นจะนับซ้ำ
+        counter.add(1, 2)
+        engine.after_commit = asyncio.Event()
+        flush = asyncio.create_task(counter.flush())
+        await asyncio.sleep(0.01)
+        assert engine.rows[1] == 17 and counter.pending(1) == 2
+
+        seen = []
+
+        async def read():
+            async with counter.reading():
+                seen.append(engine.rows[1] + counter.pending(1))
+
+        reader = asyncio.create_task(read())
+        await asyncio.sleep(0.01)
+        assert seen == []
+        engine.after_commit.set()
+        await asyncio.gather(flush, reader)
+        assert seen == [17]
+
+    asyncio.run(run())
+
+
+def test_failed_flush_restores_clicks(monkeypatch):
+    async def run():
+        engine = FakeEngine({})
+        monkeypatch.setattr(cc, "engine", engine)
+        counter = ClickCounter()
+        counter.add(1, 3)
+        counter.add(2, 1)
+
+        engine.fail = True
+        with pytest.raises(OSError):
+            await counter.flush()
+        assert counter.pending(1) == 3 and counter.pending(2) == 1
+        assert counter.stats()["failed_flushes"] == 1
+        assert engine.rows == {}
+
+        # clicks ที่เข้ามาหลัง flush ล้มรวมกับของเดิม แล้วเขียนได้ครบในรอบถัดไป
+        counter.add(1, 2)
+        engine.fail = False
+        assert await counter.flush() == 2
+        assert engine.rows == {1: 5, 2: 1}
+        assert counter.stats()["pending_clicks"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,74 @@
+import asyncio
+
+from app.core.durable_queue import DurableQueue
+
+
+def test_replay_ack_and_release_across_restart(tmp_path):
+    async def run():
+        path = str(tmp_path / "queue.db")
+        queue = DurableQueue(path)
+        await queue.start()
+        for i in range(5):
+            await queue.put({"id": i})
+
+        receipt, item = await queue.get()
+        assert item == {"id": 0}
+        queue.task_done(receipt)
+        # รายการที่ 1 ค้างอยู่ระหว่างส่ง (ไม่ ack) ตอน process ปิด
+        _, item = await queue.get()
+        assert item == {"id": 1}
+        # release คืนกลับหัวคิว get ถัดไปได้รายการเดิมพร้อม receipt เดิม
+        receipt, item = await queue.get()
+        queue.release(receipt, item)
+        assert queue.qsize() == 3
+        assert await queue.get() == (receipt, {"id": 2})
+        queue.release(receipt, {"id": 2})
+        await queue.stop()
+
+        # รอบใหม่: ทุกอย่างที่ยังไม่ ack ถูกส่งซ้ำตามลำดับเดิม
+        queue = DurableQueue(path)
+        await queue.start()
+        assert queue.replayed == 4 and queue.qsize() == 4
+        drained = []
+        for _ in range(4):
+            receipt, item = await queue.get()
+            queue.task_done(receipt)
+            drained.append(item["id"])
+        assert drained == [1, 2, 3, 4]
+        await queue.stop()
+
+        queue = DurableQueue(path)
+        await queue.start()
+        assert queue.replayed == 0 and queue.empty()
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_clear_survives_restart(tmp_path):
+    async def run():
+        path = str(tmp_path / "queue.db")
+        queue = DurableQueue(path)
+        await queue.start()
+        for i in range(3):
+            await queue.put({"id": i})
+        leased, item = await queue.get()
+
+        assert await queue.clear() == 2
+        # รายการที่ get ไปก่อน clear ถูกลบไปด้วย release/ack ภายหลังไม่มีผล
+        queue.release(leased, item)
+        queue.task_done(leased)
+        assert queue.qsize() == 0 and queue.stats()["unacked"] == 0
+
+        await queue.put({"id": 9})
+        await queue.stop()
+
+        queue = DurableQueue(path)
+        await queue.start()
+        assert queue.replayed == 1
+        receipt, item = await queue.get()
+        assert item == {"id": 9}
+        queue.task_done(receipt)
+        await queue.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,73 @@
+import pytest
+
+from app.core.keygen import SnowflakeKeyGenerator, create_key_generator
+
+SEQUENCE_BITS = SnowflakeKeyGenerator.SEQUENCE_BITS
+WORKER_BITS = SnowflakeKeyGenerator.WORKER_BITS
+
+
+class FakeClock:
+    """Returns `ms` (milliseconds since the Unix epoch) as seconds, like time.time."""
+
+    def __init__(self, ms: int):
+        self.ms = ms
+        self.calls = 0
+        self.on_call = None
+
+    def __call__(self) -> float:
+        self.calls += 1
+        if self.on_call:
+            self.on_call(self)
+        # +0.5 ms กัน int(seconds * 1000) ปัดลงผิดมิลลิวินาทีจาก float
+        return (self.ms + 0.5) / 1000
+
+
+def split(snowflake_id: int):
+    return (
+        snowflake_id >> (WORKER_BITS + SEQUENCE_BITS),
+        (snowflake_id >> SEQUENCE_BITS) & SnowflakeKeyGenerator.MAX_WORKER_ID,
+        snowflake_id & SnowflakeKeyGenerator.MAX_SEQUENCE,
+    )
+
+
+def test_ids_are_monotonic_even_when_the_clock_steps_back():
+    clock = FakeClock(SnowflakeKeyGenerator.EPOCH_MS + 1000)
+    generator = SnowflakeKeyGenerator(worker_id=7, clock=clock)
+    ids = []
+    for step in (0, 1, 1, -5, 0, 10):
+        clock.ms += step
+        ids.append(generator.next_id())
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    # นาฬิกาถอยหลังยังใช้มิลลิวินาทีล่าสุดต่อไป แค่เลื่อน sequence
+    assert [split(i)[0] for i in ids] == [1000, 1001, 1002, 1002, 1002, 1007]
+    assert {split(i)[1] for i in ids} == {7}
+
+    real = SnowflakeKeyGenerator(worker_id=1)
+    ids = [real.next_id() for _ in range(5000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+
+
+def test_sequence_overflow_waits_for_the_next_millisecond():
+    clock = FakeClock(SnowflakeKeyGenerator.EPOCH_MS + 42)
+    generator = SnowflakeKeyGenerator(worker_id=3, clock=clock)
+    ids = [generator.next_id() for _ in range(SnowflakeKeyGenerator.MAX_SEQUENCE + 1)]
+    assert [split(i)[2] for i in ids] == list(range(SnowflakeKeyGenerator.MAX_SEQUENCE + 1))
+
+    # sequence เต็มแล้ว: next_id ต้องวนอ่านนาฬิกาจนกว่าจะขึ้นมิลลิวินาทีใหม่
+    def tick_later(c):
+        if c.calls >= clock_calls + 3:
+            c.ms = SnowflakeKeyGenerator.EPOCH_MS + 43
+
+    clock_calls = clock.calls
+    clock.on_call = tick_later
+    overflow = generator.next_id()
+    assert split(overflow) == (43, 3, 0)
+    assert overflow > ids[-1]
+
+
+def test_snowflake_requires_an_explicit_worker_id():
+    with pytest.raises(ValueError, match="SHORT_KEY_WORKER_ID"):
+        create_key_generator("snowflake")
+    assert isinstance(create_key_generator("snowflake", worker_id=5), SnowflakeKeyGenerator)
+    with pytest.raises(ValueError):
+        SnowflakeKeyGenerator(worker_id=SnowflakeKeyGenerator.MAX_WORKER_ID + 1)
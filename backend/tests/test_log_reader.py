@@ -0,0 +1,69 @@
+from app.core import log_reader
+from app.core.log_reader import complete_end, iter_range, line_filter, tail_lines
+
+CHUNK = 16
+
+
+def make_lines():
+    # ความยาวต่าง ๆ รอบ CHUNK: ตรงขอบพอดี สั้นกว่า และยาวกว่าหลาย chunk
+    lines = []
+    for i, length in enumerate([16, 5, 15, 17, 32, 40, 1, 16, 16, 33]):
+        level = "ERROR" if i % 3 == 0 else "INFO"
+        text = f"{level} - ID {i} "
+        lines.append((text + "x" * max(0, length - len(text) - 1))[:length - 1].encode() + b"\n")
+    return lines
+
+
+def write(tmp_path, data):
+    path = tmp_path / "simulation.log"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_tail_lines_across_chunk_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader, "CHUNK_SIZE", CHUNK)
+    lines = make_lines()
+    data = b"".join(lines)
+    path = write(tmp_path, data)
+
+    for count in range(1, len(lines) + 3):
+        found, end = tail_lines(path, count)
+        assert found == lines[-count:]
+        assert end == len(data)
+
+    match = line_filter("error")
+    found, _ = tail_lines(path, 2, match)
+    assert found == [line for line in lines if match(line)][-2:]
+
+    # บรรทัดสุดท้ายที่ยังเขียนไม่จบ (ยาวกว่า chunk) ไม่ถูกนับ และ end หยุดก่อนหน้ามัน
+    path = write(tmp_path, data + b"INFO - ID 99 still being written")
+    found, end = tail_lines(path, 3)
+    assert found == lines[-3:] and end == len(data)
+
+
+def test_range_reads_only_complete_lines_at_chunk_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader, "CHUNK_SIZE", CHUNK)
+    lines = make_lines()
+    data = b"".join(lines)
+    path = write(tmp_path, data + b"partial")
+    starts = {0}
+    for line in lines:
+        starts.add(max(starts) + len(line))
+
+    for offset in range(0, len(data) + 8):
+        for max_bytes in (None, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK):
+            start, end = complete_end(path, offset, max_bytes)
+            # ทั้งสองฝั่งอยู่บนขอบบรรทัด และไม่เกินบรรทัดที่สมบูรณ์บรรทัดสุดท้าย
+            # (offset ที่อยู่ในบรรทัดที่ยังเขียนไม่จบได้ช่วงว่าง)
+            assert start <= end
+            if end > start:
+                assert start in starts and end in starts and end <= len(data)
+            if max_bytes is not None:
+                assert end <= max(start, offset) + max_bytes
+            assert b"".join(iter_range(path, start, end)) == data[start:end]
+
+    # ไฟล์สั้นกว่า offset (ถูก rotate) เริ่มอ่านใหม่จากต้นไฟล์
+    assert complete_end(path, len(data) + 100, None) == (0, len(data))
+
+    match = line_filter(call_id=4)
+    assert b"".join(iter_range(path, 0, len(data), match)) == lines[4]
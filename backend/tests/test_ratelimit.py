@@ -0,0 +1,78 @@
+from app.core.ratelimit import create_rate_limiter
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def allow_many(limiter, n, key="default"):
+    return [limiter.allow(key).allowed for _ in range(n)]
+
+
+def test_gcra_bursts_then_spaces_requests_evenly():
+    clock = FakeClock(100.0)
+    limiter = create_rate_limiter("gcra", 4, 1.0, clock=clock)
+
+    first = limiter.allow("a")
+    assert first.allowed and first.remaining == 3
+    assert allow_many(limiter, 3, "a") == [True, True, True]
+    denied = limiter.allow("a")
+    assert not denied.allowed and denied.retry_after == 0.25
+    # key อื่นมีโควตาของตัวเอง
+    assert limiter.allow("b").allowed
+
+    # หลัง burst หมด ผ่านได้ทีละ 1 ทุก period / limit วินาที
+    clock.now = 100.25
+    assert allow_many(limiter, 2, "a") == [True, False]
+    clock.now = 100.5
+    assert allow_many(limiter, 2, "a") == [True, False]
+
+    # พักนานพอ burst กลับมาเต็ม แต่ไม่เกิน limit
+    clock.now = 110.0
+    assert allow_many(limiter, 5, "a") == [True, True, True, True, False]
+    assert limiter.stats()["rejected"] == 4
+
+
+def test_sliding_log_has_no_burst_at_the_window_edge():
+    clock = FakeClock(10.0)
+    sliding = create_rate_limiter("sliding_log", 3, 1.0, clock=clock)
+    fixed = create_rate_limiter("fixed_window", 3, 1.0, clock=clock)
+    assert fixed.allow().allowed and sliding.allow().allowed
+
+    # fixed window ยอมให้เกือบ 2 เท่าของ limit ตรงรอยต่อหน้าต่าง sliding log ไม่ยอม
+    clock.now = 10.9
+    assert allow_many(fixed, 2) == [True, True]
+    assert allow_many(sliding, 2) == [True, True]
+    clock.now = 11.0
+    assert allow_many(fixed, 3) == [True] * 3
+    assert sliding.allow().allowed  # request ที่ 10.0 หลุดออกจากหน้าต่างพอดี
+    denied = sliding.allow()
+    assert not denied.allowed and denied.remaining == 0
+    assert abs(denied.retry_after - 0.9) < 1e-9
+
+    clock.now = 11.9
+    assert allow_many(sliding, 3) == [True, True, False]
+
+
+def test_sliding_counter_weights_the_previous_window():
+    clock = FakeClock(10.0)
+    limiter = create_rate_limiter("sliding_counter", 4, 1.0, clock=clock)
+    assert allow_many(limiter, 4) == [True] * 4
+    clock.now = 10.5
+    denied = limiter.allow()
+    assert not denied.allowed and denied.retry_after == 0.5
+
+    # ผ่านหน้าต่างใหม่ไป 1/4: หน้าต่างก่อนหน้ายังนับ 4 * 0.75 = 3
+    clock.now = 11.25
+    assert allow_many(limiter, 2) == [True, False]
+    assert limiter.allow().retry_after == 0.25
+    clock.now = 11.5
+    assert allow_many(limiter, 2) == [True, False]
+
+    # ข้ามไปมากกว่า 1 หน้าต่าง ไม่เหลือน้ำหนักจากของเดิม
+    clock.now = 20.0
+    assert allow_many(limiter, 5) == [True, True, True, True, False]
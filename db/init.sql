@@ -9,6 +9,14 @@ CREATE TABLE url_shorten (
     updated_by VARCHAR(255)
 );
 
+CREATE INDEX ix_url_shorten_created_at_id ON url_shorten (created_at, id);
+CREATE INDEX ix_url_shorten_created_by_created_at_id ON url_shorten (created_by, created_at, id);
+
+CREATE TABLE short_key_block (
+    id INTEGER PRIMARY KEY,
+    next_value BIGINT NOT NULL
+);
+
 CREATE TABLE url_shorten_audit (
     id SERIAL PRIMARY KEY,
     action VARCHAR(10) NOT NULL,           
@@ -17,9 +25,13 @@ CREATE TABLE url_shorten_audit (
     short_key VARCHAR(20) NOT NULL
 );
 
+CREATE INDEX ix_url_shorten_audit_performed_at_id ON url_shorten_audit (performed_at, id);
+CREATE INDEX ix_url_shorten_audit_action_performed_at_id ON url_shorten_audit (action, performed_at, id);
+
 CREATE TABLE IF NOT EXISTS users (
     id VARCHAR(36) PRIMARY KEY, 
     avatar_url VARCHAR(255) NULL,
+    avatar_variants JSON NULL,
     display_name VARCHAR(100) NULL,
     title VARCHAR(20) NULL,
     first_name VARCHAR(50) NOT NULL,
@@ -38,5 +50,11 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP NULL,
     created_by VARCHAR(50) NULL,
     updated_at TIMESTAMP NULL,
-    updated_by VARCHAR(50) NULL
+    updated_by VARCHAR(50) NULL,
+    search_text TEXT GENERATED ALWAYS AS (lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(display_name, '') || ' ' || coalesce(username, '') || ' ' || coalesce(email, '') || ' ' || coalesce(citizen_id, '') || ' ' || coalesce(mobile_no, '') || ' ' || coalesce(address, ''))) STORED
 );
+
+CREATE INDEX ix_users_created_at_id ON users (created_at, id);
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX ix_users_search_text_trgm ON users USING gin (search_text gin_trgm_ops);
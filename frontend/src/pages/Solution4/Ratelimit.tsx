@@ -12,8 +12,23 @@ interface LogEntry {
   message: string;
 }
 
+interface MetricsSnapshot {
+  timestamp: number;
+  totals: Record<string, number>;
+  per_second: Record<string, number>;
+  gauges: Record<string, number>;
+  latency_ms: { count: number; mean: number; p50: number; p90: number; p99: number; p999: number; max: number };
+}
+
 type SimulationStatus = 'IDLE' | 'RUNNING' | 'FINISHED' | 'STOPPING' | 'STOPPED';
 
+// Status after the backend reports that the simulation ended (the message may arrive on both channels)
+const endedStatus = (prev: SimulationStatus): SimulationStatus => {
+  if (prev === 'STOPPING') return 'STOPPED';
+  if (prev === 'RUNNING') return 'FINISHED';
+  return prev;
+};
+
 // --- Constants ---
 const SIMULATION_MODES = [
   { label: 'Full Test (All 4 Minutes)', value: 0 },
@@ -45,10 +60,15 @@ export const Ratelimit: React.FC = () => {
   const [mode, setMode] = useState<number>(0);
   const [logs, setLogs] = useState<LogEntry[]>([]);
   const [status, setStatus] = useState<SimulationStatus>('IDLE');
+  const [metrics, setMetrics] = useState<MetricsSnapshot | null>(null);
+  // Raw log streaming is opt-in: the metrics channel is enough to follow the simulation
+  const [streamLogs, setStreamLogs] = useState<boolean>(false);
   const ws = useRef<WebSocket | null>(null);
+  const metricsWs = useRef<WebSocket | null>(null);
   const logContainerRef = useRef<HTMLDivElement>(null);
   const backendUrl = useRef(process.env.REACT_APP_API_URL || 'http://localhost:8000');
   const wsUrl = useRef(`${process.env.REACT_APP_WS_URL || 'ws://localhost:8000'}/api/v1/simulation/ws/logs`);
+  const metricsWsUrl = useRef(`${process.env.REACT_APP_WS_URL || 'ws://localhost:8000'}/api/v1/simulation/ws/metrics`);
 
 
   // WebSocket connection logic
@@ -61,12 +81,20 @@ export const Ratelimit: React.FC = () => {
 
     ws.current.onmessage = (event) => {
       try {
-        const logData: LogEntry = JSON.parse(event.data);
-        // Special message from backend to signal the end of the simulation
-        if (logData.level === 'SYSTEM' && logData.message === 'SIMULATION_ENDED') {
-          setStatus(prev => (prev === 'STOPPING' ? 'STOPPED' : 'FINISHED'));
-        } else {
-          setLogs(prevLogs => [...prevLogs, logData]);
+        const data: LogEntry | LogEntry[] = JSON.parse(event.data);
+        // Logs arrive in batches (one array per frame); system messages arrive as single objects
+        const entries = Array.isArray(data) ? data : [data];
+        const newLogs: LogEntry[] = [];
+        for (const logData of entries) {
+          // Special message from backend to signal the end of the simulation
+          if (logData.level === 'SYSTEM' && logData.message === 'SIMULATION_ENDED') {
+            setStatus(endedStatus);
+          } else {
+            newLogs.push(logData);
+          }
+        }
+        if (newLogs.length > 0) {
+          setLogs(prevLogs => [...prevLogs, ...newLogs]);
         }
       } catch (error) {
         console.error("Failed to parse log data:", event.data);
@@ -82,13 +110,38 @@ export const Ratelimit: React.FC = () => {
     };
   }, []);
 
-  // Effect to establish and close WebSocket connection
+  // Effect to establish and close the raw log WebSocket (only while log streaming is enabled)
   useEffect(() => {
+    if (!streamLogs) return;
     connectWebSocket();
     return () => {
       ws.current?.close();
+      ws.current = null;
     };
-  }, [connectWebSocket]);
+  }, [connectWebSocket, streamLogs]);
+
+  // Effect to subscribe to the aggregated metrics channel (one snapshot per interval)
+  useEffect(() => {
+    metricsWs.current = new WebSocket(metricsWsUrl.current);
+    metricsWs.current.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.level === 'SYSTEM' && data.message === 'SIMULATION_ENDED') {
+          setStatus(endedStatus);
+        } else {
+          setMetrics(data as MetricsSnapshot);
+        }
+      } catch (error) {
+        console.error("Failed to parse metrics:", event.data);
+      }
+    };
+    metricsWs.current.onerror = (error) => {
+      console.error('Metrics WebSocket Error:', error);
+    };
+    return () => {
+      metricsWs.current?.close();
+    };
+  }, []);
 
   // Effect to auto-scroll log container
   useEffect(() => {
@@ -100,6 +153,7 @@ export const Ratelimit: React.FC = () => {
   // Function to start the simulation via API call
   const startSimulation = async () => {
     setLogs([]); // Clear old logs
+    setMetrics(null);
     setStatus('RUNNING');
     try {
       const res = await fetch(`${backendUrl.current}/api/v1/simulation/start-simulation?mode=${mode}`, {
@@ -221,6 +275,37 @@ export const Ratelimit: React.FC = () => {
                    <span className="status-text">{t(`ratelimit.status.${status.toLowerCase()}`, status)}</span>
                  </div>
               </div>
+
+              <div className="form-group">
+                <h3 style={{fontSize: '0.875rem', fontWeight: 600, color: '#9ca3af', marginBottom: '0.5rem'}}>{t('ratelimit.metrics', 'Live Metrics')}</h3>
+                <div className="metrics-grid">
+                  {[
+                    [t('ratelimit.metrics.queued', 'Queued/s'), metrics?.per_second.queued],
+                    [t('ratelimit.metrics.forwarded', 'Forwarded/s'), metrics?.per_second.forwarded],
+                    [t('ratelimit.metrics.ok', '200/s'), metrics?.per_second.status_200],
+                    [t('ratelimit.metrics.limited', '429/s'), metrics?.per_second.status_429],
+                    [t('ratelimit.metrics.queueDepth', 'Queue depth'), metrics?.gauges.queue_depth],
+                    [t('ratelimit.metrics.inFlight', 'In flight'), metrics?.gauges.in_flight],
+                    [t('ratelimit.metrics.p50', 'p50 (ms)'), metrics?.latency_ms.p50],
+                    [t('ratelimit.metrics.p99', 'p99 (ms)'), metrics?.latency_ms.p99],
+                    [t('ratelimit.metrics.lastMinute', 'Sent last min'), metrics ? `${metrics.gauges.sent_last_minute}/${metrics.gauges.quota_per_minute}` : undefined],
+                  ].map(([label, value]) => (
+                    <div className="metric" key={String(label)}>
+                      <span className="metric-label">{label}</span>
+                      <span className="metric-value">{value ?? '-'}</span>
+                    </div>
+                  ))}
+                </div>
+              </div>
+
+              <label className="stream-toggle">
+                <input
+                  type="checkbox"
+                  checked={streamLogs}
+                  onChange={e => setStreamLogs(e.target.checked)}
+                />
+                {t('ratelimit.streamLogs', 'Stream raw logs (sampled)')}
+              </label>
             </div>
           </div>
           
@@ -238,7 +323,9 @@ export const Ratelimit: React.FC = () => {
                 logs.slice(-10000).map((log, index) => <LogLine key={index} log={log} />)
               ) : (
                 <div className="log-placeholder">
-                  <p>{t('ratelimit.logEmpty', 'Logs will appear here once the simulation starts.')}</p>
+                  <p>{streamLogs
+                    ? t('ratelimit.logEmpty', 'Logs will appear here once the simulation starts.')
+                    : t('ratelimit.logDisabled', 'Raw log streaming is off. Enable it in the controls to see individual log lines.')}</p>
                 </div>
               )}
             </div>
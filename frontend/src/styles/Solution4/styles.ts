@@ -230,6 +230,52 @@ const styles = `
     color: #111827;
   }
 
+  .metrics-grid {
+    display: grid;
+    grid-template-columns: repeat(3, minmax(0, 1fr));
+    gap: 0.5rem;
+  }
+
+  .metric {
+    display: flex;
+    flex-direction: column;
+    padding: 0.5rem 0.75rem;
+    border-radius: 0.5rem;
+    transition: background 0.2s;
+  }
+  [data-theme='dark'] .metric {
+    background-color: #374151;
+  }
+  [data-theme='light'] .metric {
+    background-color: #f3f4f6;
+  }
+
+  .metric-label {
+    font-size: 0.75rem;
+    color: #9ca3af;
+  }
+
+  .metric-value {
+    font-family: monospace;
+    font-size: 1rem;
+    font-weight: 600;
+  }
+  [data-theme='dark'] .metric-value {
+    color: #ffffff;
+  }
+  [data-theme='light'] .metric-value {
+    color: #111827;
+  }
+
+  .stream-toggle {
+    display: flex;
+    align-items: center;
+    gap: 0.5rem;
+    font-size: 0.875rem;
+    color: #9ca3af;
+    cursor: pointer;
+  }
+
   .status-icon-running {
     color: #facc15;
     animation: pulse 2s cubic-bezier(0.4, 0, 0.6, 1) infinite;